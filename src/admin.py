@@ -7,12 +7,24 @@ This module contains functions for administrative tasks.
 
 import os
 from .picklist import import_picklists_from_csv
+from .backup import handle_backup_menu_option, handle_restore_menu_option
+from .backup_store import handle_snapshot_menu_option, handle_snapshot_restore_menu_option
+from .maintenance import handle_optimize_menu_option
+from .db_stats import handle_stats_menu_option
+from .in_memory import handle_save_menu_option
 
 def display_admin_menu():
     """Displays the admin menu options."""
     print("\n--- Admin Menu ---")
     print("1. Import Picklists from CSV")
-    print("2. Back to Main Menu")
+    print("2. Back Up Database Now")
+    print("3. Restore Database from Backup")
+    print("4. Snapshot Database (deduplicated store)")
+    print("5. Restore Database from Snapshot")
+    print("6. Optimize Database Now")
+    print("7. Database Statistics")
+    print("8. Save In-Memory Session to Disk")
+    print("9. Back to Main Menu")
     print("------------------")
 
 def handle_picklist_import():
@@ -64,7 +76,21 @@ def handle_admin_menu():
             
             if choice == '1':  # Import Picklists from CSV
                 handle_picklist_import()
-            elif choice == '2':  # Back to Main Menu
+            elif choice == '2':  # Back Up Database Now
+                handle_backup_menu_option()
+            elif choice == '3':  # Restore Database from Backup
+                handle_restore_menu_option()
+            elif choice == '4':  # Snapshot Database
+                handle_snapshot_menu_option()
+            elif choice == '5':  # Restore Database from Snapshot
+                handle_snapshot_restore_menu_option()
+            elif choice == '6':  # Optimize Database Now
+                handle_optimize_menu_option()
+            elif choice == '7':  # Database Statistics
+                handle_stats_menu_option()
+            elif choice == '8':  # Save In-Memory Session to Disk
+                handle_save_menu_option()
+            elif choice == '9':  # Back to Main Menu
                 break
             else:
                 print("Invalid choice. Please try again.")
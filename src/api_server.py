@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""
+Local JSON HTTP API for CRM Application
+
+This module serves the CRM data over HTTP so other tools on the same host can
+read and write it without opening crm.db themselves. It is built on the
+standard library only.
+
+- Reads are served concurrently, each on a connection borrowed from a shared
+  pool of read-only connections.
+- Writes go through a group-commit WriteQueue (see write_queue.py): one
+  writer connection commits concurrent writes together in small groups.
+- List endpoints are paginated with ?limit=&offset=, and so are searches (?q=),
+  which return the best matches first. Searches match the start of names
+  unless ?mode=substring is given or q contains a '*' wildcard; ?mode=fuzzy
+  tolerates typos.
+- GET responses carry an ETag; a matching If-None-Match returns 304.
+
+Endpoints:
+    GET    /accounts                      list (paginated) or search with ?q= (&mode=prefix|substring|fuzzy)
+    POST   /accounts                      create
+    GET    /accounts/<id>                 get
+    PATCH  /accounts/<id>                 update (PUT is accepted too)
+    DELETE /accounts/<id>                 delete
+    GET    /accounts/<id>/contacts        contacts linked to an account
+    GET    /accounts/<id>/opportunities   opportunities linked to an account
+    ...the same for /contacts and /opportunities
+    GET    /picklists/<name>              active values of a picklist
+
+Usage:
+    python -m src.main --serve 8080
+"""
+
+import io
+import os
+import sys
+import json
+import queue
+import sqlite3
+import hashlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, quote
+
+from . import database
+from . import crm_dal
+from .batch import execute_command, BatchCommandError, CREATE_DEFAULTS
+from .picklist import get_picklist_values
+from .write_queue import WriteQueue
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8080
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+
+# URL collection name -> batch entity name
+COLLECTIONS = {
+    'accounts': 'account',
+    'contacts': 'contact',
+    'opportunities': 'opportunity',
+}
+
+# Related collections available under /accounts/<id>/...
+ACCOUNT_CHILDREN = {
+    'contacts': crm_dal.get_contacts_by_account,
+    'opportunities': crm_dal.get_opportunities_by_account,
+}
+
+class _ThreadLocalStdout:
+    """
+    sys.stdout replacement that lets a request thread capture what the DAL
+    prints (its error messages) without affecting other threads.
+    """
+
+    def __init__(self, target):
+        self._target = target
+        self._local = threading.local()
+
+    def capture(self):
+        self._local.buffer = io.StringIO()
+
+    def release(self):
+        buffer = getattr(self._local, 'buffer', None)
+        self._local.buffer = None
+        return buffer.getvalue() if buffer else ''
+
+    def write(self, text):
+        buffer = getattr(self._local, 'buffer', None)
+        return (buffer or self._target).write(text)
+
+    def flush(self):
+        self._target.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+class ConnectionPool:
+    """A fixed-size pool of read-only connections shared by the request threads."""
+
+    def __init__(self, path, size):
+        self._pool = queue.Queue()
+        self._all = []
+        for _ in range(size):
+            conn = sqlite3.connect(f"file:{quote(os.path.abspath(path))}?mode=ro", uri=True, check_same_thread=False,
+                                   timeout=database.BUSY_TIMEOUT_MS / 1000)
+            self._all.append(conn)
+            self._pool.put(conn)
+
+    def acquire(self):
+        return self._pool.get()
+
+    def release(self, conn):
+        self._pool.put(conn)
+
+    def close(self):
+        for conn in self._all:
+            conn.close()
+
+class CRMServer(ThreadingHTTPServer):
+    """Threaded HTTP server holding the read pool and the write queue."""
+
+    daemon_threads = True
+
+    def __init__(self, address, pool_size=8):
+        super().__init__(address, CRMRequestHandler)
+        self.read_pool = ConnectionPool(database.DATABASE_NAME, pool_size)
+        self.writes = WriteQueue(database.DATABASE_NAME).start()
+
+    def server_close(self):
+        super().server_close()
+        self.read_pool.close()
+        self.writes.stop()
+
+class ApiError(Exception):
+    """An error that maps directly to an HTTP status code."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+class CRMRequestHandler(BaseHTTPRequestHandler):
+    """Routes REST requests to the DAL."""
+
+    server_version = 'CRMServer/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    # --- Plumbing ---
+    def log_message(self, format, *args):
+        # Log to stderr like the default handler, but without reverse DNS lookups
+        sys.stderr.write(f"{self.address_string()} - {format % args}\n")
+
+    def _close_if_body_unread(self):
+        """
+        Ask to close the connection if the request body was not read, since on a
+        kept-alive connection it would be parsed as the start of the next request.
+        Call before end_headers().
+        """
+        if not self._body_read and (self.headers.get('Content-Length') or '0').strip() != '0':
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+
+    def _send_json(self, status, payload, etag=None):
+        body = json.dumps(payload, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_header('ETag', etag)
+        self._close_if_body_unread()
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_conditional(self, payload):
+        """Send a GET response, or 304 if the client's cached copy is current."""
+        body = json.dumps(payload, default=str, sort_keys=True).encode('utf-8')
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self._close_if_body_unread()
+            self.end_headers()
+            return
+        self._send_json(200, payload, etag)
+
+    def _read_body(self):
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            raise ApiError(400, "Content-Length must be an integer")
+        if length < 0:
+            raise ApiError(400, "Content-Length must not be negative")
+        body = self.rfile.read(length) if length else b''
+        self._body_read = True
+        if not length:
+            return {}
+        try:
+            data = json.loads(body)
+        except json.JSONDecodeError as e:
+            raise ApiError(400, f"Invalid JSON body: {e}")
+        if not isinstance(data, dict):
+            raise ApiError(400, "Request body must be a JSON object")
+        return data
+
+    def _route(self):
+        """Split the path into (collection, id, child) and the query parameters."""
+        parts = urlsplit(self.path)
+        segments = [segment for segment in parts.path.split('/') if segment]
+        params = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        if not segments:
+            raise ApiError(404, "Not found")
+        record_id = None
+        if len(segments) > 1 and segments[0] != 'picklists':
+            try:
+                record_id = int(segments[1])
+            except ValueError:
+                raise ApiError(404, f"Invalid ID '{segments[1]}'")
+        child = segments[2] if len(segments) > 2 else None
+        if len(segments) > 3:
+            raise ApiError(404, "Not found")
+        return segments, record_id, child, params
+
+    def _run(self, command):
+        """Run a batch-style read command on a pooled read connection."""
+        stdout = sys.stdout if isinstance(sys.stdout, _ThreadLocalStdout) else None
+        if stdout:
+            stdout.capture()
+        try:
+            conn = self.server.read_pool.acquire()
+            try:
+                with database.bind_connection(conn):
+                    value = execute_command(command)
+            finally:
+                self.server.read_pool.release(conn)
+        except BatchCommandError as e:
+            raise ApiError(400, str(e))
+        finally:
+            messages = stdout.release().strip() if stdout else ''
+        return value, messages
+
+    def _write(self, op, entity, record_id=None, data=None):
+        """
+        Queue a create, update or delete on the server's write queue and wait for
+        its group to commit. Returns the new ID for creates, else whether a row changed.
+        """
+        method = getattr(self.server.writes, f"{op}_{entity}")
+        args = () if record_id is None else (record_id,)
+        data = {**CREATE_DEFAULTS[entity], **data} if op == 'create' else (data or {})
+        conn = self.server.read_pool.acquire()
+        try:
+            # Building the statement may look up picklist values
+            with database.bind_connection(conn):
+                future = method(*args, **data)
+        except TypeError as e:
+            # Unknown or missing fields in the body
+            raise ApiError(400, f"Invalid fields for {entity} {op}: {e}")
+        finally:
+            self.server.read_pool.release(conn)
+        try:
+            result = future.result()
+        except sqlite3.IntegrityError as e:
+            raise ApiError(409, f"Integrity error: {e}")
+        except sqlite3.Error as e:
+            raise ApiError(400, f"Database error: {e}")
+        return result.lastrowid if op == 'create' else result.rowcount > 0
+
+    def _read_with_connection(self, func, *args):
+        """Call a DAL read function on a pooled connection."""
+        conn = self.server.read_pool.acquire()
+        try:
+            with database.bind_connection(conn):
+                return func(*args)
+        finally:
+            self.server.read_pool.release(conn)
+
+    def _handle(self, method):
+        self._body_read = False
+        try:
+            segments, record_id, child, params = self._route()
+            if segments[0] == 'picklists':
+                if method != 'GET' or len(segments) != 2:
+                    raise ApiError(405, "Method not allowed")
+                values = self._read_with_connection(get_picklist_values, segments[1])
+                return self._send_conditional({'items': values})
+
+            entity = COLLECTIONS.get(segments[0])
+            if entity is None:
+                raise ApiError(404, "Not found")
+
+            if child is not None:
+                if entity != 'account' or child not in ACCOUNT_CHILDREN or method != 'GET':
+                    raise ApiError(404, "Not found")
+                rows = self._read_with_connection(ACCOUNT_CHILDREN[child], record_id)
+                return self._send_conditional({'items': [dict(row) for row in rows]})
+
+            if record_id is None:
+                return self._handle_collection(method, entity, params)
+            return self._handle_record(method, entity, record_id)
+        except ApiError as e:
+            self._send_json(e.status, {'error': e.message})
+
+    def _handle_collection(self, method, entity, params):
+        if method == 'GET':
+            try:
+                limit = int(params.get('limit', DEFAULT_PAGE_SIZE))
+                offset = int(params.get('offset', 0))
+            except ValueError:
+                raise ApiError(400, "limit and offset must be integers")
+            if offset < 0:
+                raise ApiError(400, "offset must not be negative")
+            # A page always has room for at least one row, so next_offset moves forward
+            limit = max(1, min(limit, MAX_PAGE_SIZE))
+            if 'q' in params:
+                # Ranked matches, best first, one page at a time
+                items, _ = self._run({'op': 'search', 'entity': entity, 'query': params['q'],
+                                      'mode': params.get('mode'), 'limit': limit, 'offset': offset})
+            else:
+                items, _ = self._run({'op': 'list', 'entity': entity, 'limit': limit, 'offset': offset})
+            payload = {'items': items, 'limit': limit, 'offset': offset,
+                       'next_offset': offset + limit if len(items) == limit else None}
+            return self._send_conditional(payload)
+        if method == 'POST':
+            new_id = self._write('create', entity, data=self._read_body())
+            if new_id is None:
+                raise ApiError(400, "Create failed")
+            record, _ = self._run({'op': 'get', 'entity': entity, 'id': new_id})
+            return self._send_json(201, record)
+        raise ApiError(405, "Method not allowed")
+
+    def _handle_record(self, method, entity, record_id):
+        if method == 'GET':
+            record, _ = self._run({'op': 'get', 'entity': entity, 'id': record_id})
+            if record is None:
+                raise ApiError(404, f"{entity.capitalize()} {record_id} not found")
+            return self._send_conditional(record)
+        if method in ('PATCH', 'PUT'):
+            data = self._read_body()
+            if not data:
+                raise ApiError(400, "No fields to update")
+            if not self._write('update', entity, record_id, data):
+                raise ApiError(404, f"{entity.capitalize()} {record_id} not found")
+            record, _ = self._run({'op': 'get', 'entity': entity, 'id': record_id})
+            return self._send_json(200, record)
+        if method == 'DELETE':
+            if not self._write('delete', entity, record_id):
+                raise ApiError(404, f"{entity.capitalize()} {record_id} not found")
+            return self._send_json(200, {'deleted': record_id})
+        raise ApiError(405, "Method not allowed")
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PATCH(self):
+        self._handle('PATCH')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, pool_size=8):
+    """
+    Run the API server until interrupted.
+
+    Args:
+        host (str): Interface to bind; defaults to localhost only
+        port (int): TCP port
+        pool_size (int): Number of pooled read-only connections
+    """
+    database.initialize_database()
+    original_stdout = sys.stdout
+    if not isinstance(sys.stdout, _ThreadLocalStdout):
+        sys.stdout = _ThreadLocalStdout(sys.stdout)
+    try:
+        server = CRMServer((host, port), pool_size)
+        print(f"CRM API listening on http://{host}:{server.server_address[1]} (Ctrl-C to stop)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\nShutting down API server...")
+        finally:
+            server.server_close()
+    finally:
+        sys.stdout = original_stdout
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Serve the CRM data as a local JSON HTTP API")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--pool-size', type=int, default=8)
+    args = parser.parse_args()
+    serve(args.host, args.port, args.pool_size)
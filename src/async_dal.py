@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Async Data Access Layer for CRM Application
+
+This module exposes the CRUD and search functions of crm_dal as coroutines for
+services that embed the CRM data layer in an asyncio event loop.
+
+- Reads run on a bounded thread pool; every reader thread keeps its own
+  read-only connection for its whole life.
+- Writes are routed through a group-commit WriteQueue (see write_queue.py):
+  one writer thread with its own connection commits them in small groups, so
+  writers never contend with each other inside the process. Their statements
+  are built on a reader thread, since building one may look up picklists.
+- Backpressure: the number of reads and writes waiting for a thread is capped,
+  and bulk reads (the list_* functions) may only occupy a limited number of
+  reader threads, so a slow export cannot starve interactive lookups.
+- Cancellation: cancelling an awaiting task drops the call if it has not
+  started yet. A running read is interrupted; a write whose group is already
+  being committed completes.
+
+Usage:
+    async with AsyncCRM() as crm:
+        account = await crm.get_account(1)
+        contact_id = await crm.create_contact("Ada", "Lovelace", "ada@example.com", None, 1)
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from . import crm_dal
+from . import database
+from .write_queue import WriteQueue
+
+class _Call:
+    """A DAL call that remembers which connection it is running on, so it can be interrupted."""
+
+    def __init__(self, func, args, kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.connection = None
+        self._lock = threading.Lock()
+
+    def run(self):
+        with self._lock:
+            self.connection = database.get_db_connection()
+        try:
+            return self.func(*self.args, **self.kwargs)
+        finally:
+            with self._lock:
+                self.connection = None
+
+    def interrupt(self):
+        """Abort the running statement, if the call is running."""
+        with self._lock:
+            if self.connection is not None:
+                self.connection.interrupt()
+
+class AsyncCRM:
+    """
+    asyncio facade over the DAL with a bounded reader pool and a group-commit writer.
+
+    Args:
+        database_path (str, optional): Database file; defaults to database.DATABASE_NAME
+        read_workers (int): Number of reader threads (and read connections)
+        bulk_read_workers (int): Maximum reader threads that list_* calls may occupy at once
+        max_pending_reads (int): Reads allowed in flight or queued before callers wait
+        max_pending_writes (int): Writes allowed in flight or queued before callers wait
+    """
+
+    def __init__(self, database_path=None, read_workers=4, bulk_read_workers=1,
+                 max_pending_reads=64, max_pending_writes=64):
+        if bulk_read_workers >= read_workers:
+            bulk_read_workers = max(1, read_workers - 1)
+        self.database_path = database_path or database.DATABASE_NAME
+        self.read_workers = read_workers
+        self._bulk_slots = asyncio.Semaphore(bulk_read_workers)
+        self._read_slots = asyncio.Semaphore(max_pending_reads)
+        self._write_slots = asyncio.Semaphore(max_pending_writes)
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._readers = None
+        self._writes = None
+
+    # --- Lifecycle ---
+    def _open_reader_connection(self):
+        """Thread initializer: open this reader thread's read-only connection."""
+        uri = f"file:{quote(os.path.abspath(self.database_path))}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                               timeout=database.BUSY_TIMEOUT_MS / 1000)
+        self._track(conn)
+        database.bind_thread_connection(conn, path=self.database_path)
+
+    def _track(self, conn):
+        with self._connections_lock:
+            self._connections.append(conn)
+
+    async def start(self):
+        """Start the reader pool and the writer thread."""
+        if self._readers is None:
+            self._readers = ThreadPoolExecutor(
+                max_workers=self.read_workers, thread_name_prefix='crm-reader',
+                initializer=self._open_reader_connection)
+            self._writes = WriteQueue(self.database_path).start()
+        return self
+
+    async def close(self):
+        """Wait for running calls, then stop the threads and close their connections."""
+        if self._readers is None:
+            return
+        readers, writes = self._readers, self._writes
+        self._readers = self._writes = None
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, readers.shutdown, True)
+        await loop.run_in_executor(None, writes.stop)
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    # --- Dispatch ---
+    async def _submit(self, executor, slots, func, *args, **kwargs):
+        if executor is None:
+            raise RuntimeError("AsyncCRM is not started; use 'async with AsyncCRM()' or await start()")
+        async with slots:
+            call = _Call(func, args, kwargs)
+            future = asyncio.get_running_loop().run_in_executor(executor, call.run)
+            try:
+                return await future
+            except asyncio.CancelledError:
+                call.interrupt()
+                raise
+
+    async def _read(self, func, *args, **kwargs):
+        return await self._submit(self._readers, self._read_slots, func, *args, **kwargs)
+
+    async def _bulk_read(self, func, *args, **kwargs):
+        async with self._bulk_slots:
+            return await self._read(func, *args, **kwargs)
+
+    async def _write(self, name, /, *args, **kwargs):
+        """
+        Queue the WriteQueue method `name` and wait for its group to commit.
+        Returns the new ID for create_*, else whether a row changed, like the DAL.
+        """
+        if self._writes is None:
+            raise RuntimeError("AsyncCRM is not started; use 'async with AsyncCRM()' or await start()")
+        async with self._write_slots:
+            future = await self._read(getattr(self._writes, name), *args, **kwargs)
+            try:
+                result = await asyncio.wrap_future(future)
+            except sqlite3.Error as e:
+                print(f"Database error in {name}: {e}")
+                return None if name.startswith('create_') else False
+        if name.startswith('create_'):
+            return result.lastrowid
+        return result.rowcount > 0
+
+    # --- Account Operations ---
+    async def create_account(self, *args, **kwargs):
+        return await self._write('create_account', *args, **kwargs)
+
+    async def get_account(self, account_id):
+        return await self._read(crm_dal.get_account, account_id)
+
+    async def list_accounts(self):
+        return await self._bulk_read(crm_dal.list_accounts)
+
+    async def search_accounts(self, query, limit=None, offset=0, mode=None):
+        return await self._read(crm_dal.search_accounts, query, limit, offset, mode)
+
+    async def update_account(self, account_id, **kwargs):
+        return await self._write('update_account', account_id, **kwargs)
+
+    async def delete_account(self, account_id):
+        return await self._write('delete_account', account_id)
+
+    # --- Contact Operations ---
+    async def create_contact(self, *args, **kwargs):
+        return await self._write('create_contact', *args, **kwargs)
+
+    async def get_contact(self, contact_id):
+        return await self._read(crm_dal.get_contact, contact_id)
+
+    async def list_contacts(self):
+        return await self._bulk_read(crm_dal.list_contacts)
+
+    async def search_contacts(self, query, limit=None, offset=0, mode=None):
+        return await self._read(crm_dal.search_contacts, query, limit, offset, mode)
+
+    async def get_contacts_by_account(self, account_id):
+        return await self._read(crm_dal.get_contacts_by_account, account_id)
+
+    async def update_contact(self, contact_id, **kwargs):
+        return await self._write('update_contact', contact_id, **kwargs)
+
+    async def delete_contact(self, contact_id):
+        return await self._write('delete_contact', contact_id)
+
+    # --- Opportunity Operations ---
+    async def create_opportunity(self, *args, **kwargs):
+        return await self._write('create_opportunity', *args, **kwargs)
+
+    async def get_opportunity(self, opportunity_id):
+        return await self._read(crm_dal.get_opportunity, opportunity_id)
+
+    async def list_opportunities(self):
+        return await self._bulk_read(crm_dal.list_opportunities)
+
+    async def search_opportunities(self, query, limit=None, offset=0, mode=None):
+        return await self._read(crm_dal.search_opportunities, query, limit, offset, mode)
+
+    async def get_opportunities_by_account(self, account_id):
+        return await self._read(crm_dal.get_opportunities_by_account, account_id)
+
+    async def update_opportunity(self, opportunity_id, **kwargs):
+        return await self._write('update_opportunity', opportunity_id, **kwargs)
+
+    async def delete_opportunity(self, opportunity_id):
+        return await self._write('delete_opportunity', opportunity_id)
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Online Backup and Restore for CRM Application
+
+Backups use SQLite's online backup API (Connection.backup) instead of copying
+crm.db on disk. The copy is made in page steps, releasing the read lock between
+steps so other processes can keep writing, and it includes anything still in
+the WAL. Each copy is checked with PRAGMA integrity_check before it is
+compressed into data/backups/.
+
+Compression is gzip by default. zstd is used when requested and available,
+either through the optional 'zstandard' package or Python's compression.zstd.
+
+Restores go through the backup API as well, so the live database is replaced
+under SQLite's own locking rather than by overwriting the file.
+"""
+
+import os
+import sys
+import gzip
+import shutil
+import sqlite3
+import datetime
+from time import perf_counter
+
+from . import database
+
+BACKUP_PREFIX = 'crm_backup_'
+
+# Pages copied per backup step; smaller steps hold the read lock for less time
+DEFAULT_STEP_PAGES = 1024
+
+# Buffer size used when streaming through the compressor
+_COPY_BUFFER = 1024 * 1024
+
+COMPRESSION_SUFFIXES = {
+    'gzip': '.db.gz',
+    'zstd': '.db.zst',
+    'none': '.db',
+}
+
+def get_backup_dir():
+    """The directory backups are written to (follows the current database location)."""
+    return os.path.join(database.DATA_DIR, 'backups')
+
+def _zstd_module():
+    """Return a zstd implementation, or None if none is installed."""
+    try:
+        from compression import zstd  # Python 3.14+
+        return zstd
+    except ImportError:
+        pass
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        return None
+
+def _open_compressed(path, mode, compression):
+    """Open path for streaming reads or writes through the given compression."""
+    if compression == 'gzip':
+        return gzip.open(path, mode, compresslevel=6)
+    if compression == 'zstd':
+        zstd = _zstd_module()
+        if zstd is None:
+            raise RuntimeError("zstd compression needs Python 3.14+ or the 'zstandard' package")
+        if hasattr(zstd, 'ZstdCompressor') and not hasattr(zstd, 'open'):
+            # zstandard package
+            raw = open(path, mode)
+            if 'w' in mode:
+                return zstd.ZstdCompressor(level=3).stream_writer(raw, closefd=True)
+            return zstd.ZstdDecompressor().stream_reader(raw, closefd=True)
+        return zstd.open(path, mode)
+    return open(path, mode)
+
+def compression_for_path(path):
+    """Work out the compression of a backup file from its name."""
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if compression != 'none' and path.endswith(suffix):
+            return compression
+    return 'none'
+
+def check_integrity(path):
+    """
+    Run PRAGMA integrity_check on a database file.
+
+    Returns:
+        tuple: (ok, message) where message is 'ok' or the first problems reported
+    """
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = [row[0] for row in conn.execute("PRAGMA integrity_check").fetchall()]
+        return rows == ['ok'], '; '.join(rows[:5])
+    except sqlite3.Error as e:
+        return False, str(e)
+    finally:
+        conn.close()
+
+def _print_progress(status, remaining, total):
+    """Progress callback for Connection.backup()."""
+    if total:
+        done = (total - remaining) * 100 // total
+        print(f"\r  Copied {total - remaining}/{total} pages ({done}%)", end='', flush=True)
+
+def snapshot_database(dest_path, step_pages=DEFAULT_STEP_PAGES, show_progress=True):
+    """
+    Copy the live database into dest_path with the online backup API.
+
+    Raises:
+        sqlite3.Error: If the copy fails
+    """
+    source = sqlite3.connect(database.DATABASE_NAME, timeout=database.BUSY_TIMEOUT_MS / 1000)
+    try:
+        dest = sqlite3.connect(dest_path)
+        try:
+            source.backup(dest, pages=step_pages, progress=_print_progress if show_progress else None)
+        finally:
+            dest.close()
+        if show_progress:
+            print()
+    finally:
+        source.close()
+
+def restore_database_file(path):
+    """
+    Verify an uncompressed database file and copy it over the live database.
+
+    Returns:
+        bool: True on success, False if the file failed verification or the copy failed
+    """
+    ok, message = check_integrity(path)
+    if not ok:
+        print(f"Error: Backup file failed integrity check, nothing restored: {message}")
+        return False
+    source = sqlite3.connect(path)
+    try:
+        dest = sqlite3.connect(database.DATABASE_NAME, timeout=database.BUSY_TIMEOUT_MS / 1000)
+        try:
+            # Copy everything in one step so readers never see a half-restored database
+            source.backup(dest, pages=-1)
+        finally:
+            dest.close()
+    except sqlite3.Error as e:
+        print(f"Error restoring backup: {e}")
+        return False
+    finally:
+        source.close()
+    return True
+
+def create_backup(compression='gzip', step_pages=DEFAULT_STEP_PAGES, show_progress=True):
+    """
+    Make an online backup of the current database.
+
+    Args:
+        compression (str): 'gzip', 'zstd' or 'none'
+        step_pages (int): Pages copied per backup step
+        show_progress (bool): Print progress while copying
+
+    Returns:
+        str: Path of the backup file, or None on failure
+    """
+    if compression not in COMPRESSION_SUFFIXES:
+        print(f"Error: Unknown compression '{compression}'. Valid options: {', '.join(COMPRESSION_SUFFIXES)}")
+        return None
+    if compression == 'zstd' and _zstd_module() is None:
+        print("zstd is not available (needs Python 3.14+ or the 'zstandard' package); using gzip instead.")
+        compression = 'gzip'
+    if not os.path.exists(database.DATABASE_NAME):
+        print(f"Warning: Database file {database.DATABASE_NAME} does not exist. No backup created.")
+        return None
+
+    backup_dir = get_backup_dir()
+    os.makedirs(backup_dir, exist_ok=True)
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    backup_file = os.path.join(backup_dir, f"{BACKUP_PREFIX}{timestamp}{COMPRESSION_SUFFIXES[compression]}")
+    sequence = 1
+    while os.path.exists(backup_file):
+        # Never overwrite a backup taken within the same second
+        backup_file = os.path.join(backup_dir, f"{BACKUP_PREFIX}{timestamp}_{sequence}{COMPRESSION_SUFFIXES[compression]}")
+        sequence += 1
+    snapshot = os.path.join(backup_dir, f".{BACKUP_PREFIX}{timestamp}.snapshot")
+
+    started = perf_counter()
+    try:
+        # 1. Copy the live database page by page into a consistent snapshot
+        snapshot_database(snapshot, step_pages, show_progress)
+
+        # 2. Verify the snapshot before trusting it
+        ok, message = check_integrity(snapshot)
+        if not ok:
+            print(f"Error: Backup failed integrity check: {message}")
+            return None
+
+        # 3. Stream it through the compressor
+        if compression == 'none':
+            os.replace(snapshot, backup_file)
+        else:
+            with open(snapshot, 'rb') as raw, _open_compressed(backup_file, 'wb', compression) as out:
+                shutil.copyfileobj(raw, out, _COPY_BUFFER)
+
+        size = os.path.getsize(backup_file)
+        print(f"Database backup created at: {backup_file} "
+              f"({size / 1024 / 1024:.1f} MiB, {perf_counter() - started:.1f} s)")
+        return backup_file
+    except (sqlite3.Error, OSError, RuntimeError) as e:
+        print(f"Error creating backup: {e}")
+        if os.path.exists(backup_file):
+            os.remove(backup_file)
+        return None
+    finally:
+        if os.path.exists(snapshot):
+            os.remove(snapshot)
+
+def restore_backup(backup_file, show_progress=True):
+    """
+    Restore the current database from a backup file.
+
+    The backup is decompressed to a temporary file and integrity-checked, then
+    copied into the live database with the backup API.
+
+    Returns:
+        bool: True on success, False on failure
+    """
+    if not os.path.exists(backup_file):
+        print(f"Error: Backup file not found at {backup_file}")
+        return False
+
+    os.makedirs(database.DATA_DIR, exist_ok=True)
+    staging = database.DATABASE_NAME + '.restore'
+    started = perf_counter()
+    try:
+        compression = compression_for_path(backup_file)
+        with _open_compressed(backup_file, 'rb', compression) as raw, open(staging, 'wb') as out:
+            shutil.copyfileobj(raw, out, _COPY_BUFFER)
+        if not restore_database_file(staging):
+            return False
+        if show_progress:
+            print(f"Database restored from {backup_file} in {perf_counter() - started:.1f} s")
+        return True
+    except (OSError, RuntimeError, EOFError) as e:
+        print(f"Error restoring backup: {e}")
+        return False
+    finally:
+        if os.path.exists(staging):
+            os.remove(staging)
+
+def list_backups():
+    """
+    List the backup files in the backup directory, newest first.
+
+    Returns:
+        list: Paths of backup files
+    """
+    backup_dir = get_backup_dir()
+    if not os.path.isdir(backup_dir):
+        return []
+    names = [name for name in os.listdir(backup_dir)
+             if name.startswith(BACKUP_PREFIX) and any(name.endswith(s) for s in COMPRESSION_SUFFIXES.values())]
+    return [os.path.join(backup_dir, name) for name in sorted(names, reverse=True)]
+
+def handle_backup_menu_option():
+    """Admin menu: make a backup now."""
+    print("\n--- Back Up Database ---")
+    compression = input("Compression (gzip/zstd/none) [default: gzip]: ").strip().lower() or 'gzip'
+    create_backup(compression)
+
+def handle_restore_menu_option():
+    """Admin menu: pick a backup and restore it."""
+    print("\n--- Restore Database from Backup ---")
+    backups = list_backups()
+    if not backups:
+        print(f"No backups found in {get_backup_dir()}")
+        return
+    for index, path in enumerate(backups, 1):
+        print(f"{index}. {os.path.basename(path)} ({os.path.getsize(path) / 1024 / 1024:.1f} MiB)")
+    choice = input(f"Select a backup to restore (1-{len(backups)}) or 'back': ").strip()
+    if choice.lower() == 'back':
+        return
+    try:
+        number = int(choice)
+    except ValueError:
+        number = 0
+    if not 1 <= number <= len(backups):
+        print("Invalid selection.")
+        return
+    backup_file = backups[number - 1]
+    confirm = input(f"This will replace ALL current data with {os.path.basename(backup_file)}. Continue? (yes/no): ").strip().lower()
+    if confirm in ('yes', 'y'):
+        restore_backup(backup_file)
+    else:
+        print("Restore cancelled.")
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Back up or restore the CRM database")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--backup', choices=list(COMPRESSION_SUFFIXES), nargs='?', const='gzip')
+    group.add_argument('--restore', metavar='FILE')
+    group.add_argument('--list', action='store_true')
+    args = parser.parse_args()
+    if args.list:
+        for path in list_backups():
+            print(path)
+    elif args.restore:
+        sys.exit(0 if restore_backup(args.restore) else 1)
+    else:
+        sys.exit(0 if create_backup(args.backup) else 1)
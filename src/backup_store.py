@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+"""
+Deduplicated Snapshot Store for CRM Application
+
+Full backups of a large, mostly unchanged crm.db cost the whole file every
+time. The snapshot store instead splits the database into page-aligned chunks
+and keeps each distinct chunk once, named by its SHA-256 hash. A snapshot is
+only a manifest listing its chunks, so an hourly snapshot stores just the
+chunks whose pages changed since an earlier snapshot.
+
+In the default rollback-journal mode the chunks are read straight from the
+live file inside one read transaction, whose shared lock keeps writers from
+changing the file until the snapshot is read; writers wait for it within their
+busy timeout. A snapshot still reads the whole database once, since every
+chunk has to be hashed, and runs PRAGMA quick_check on it; the full
+integrity_check runs on restore. In WAL mode, where committed pages may still
+be in the WAL, a consistent copy is made with the backup API and chunked
+instead, which costs a full copy and integrity_check as well.
+
+Layout under data/backups/store/:
+    chunks/ab/abcdef...      zlib-compressed chunk, named by the hash of its content
+    manifests/<id>.json      one manifest per snapshot
+
+Retention keeps the newest snapshot of each of the last N hours, days and
+ISO weeks (grandfather-father-son). Pruning deletes the other manifests, and
+garbage collection deletes chunks no manifest refers to any more.
+
+Usage:
+    python -m src.backup_store snapshot
+    python -m src.backup_store list
+    python -m src.backup_store restore <snapshot id>
+    python -m src.backup_store prune --hourly 24 --daily 7 --weekly 4
+    python -m src.backup_store gc
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import datetime
+from time import perf_counter
+
+from . import database
+from .backup import get_backup_dir, snapshot_database, restore_database_file, check_integrity
+
+# Database pages per chunk; chunks always start on a page boundary
+CHUNK_PAGES = 16
+
+# Snapshots kept per bucket type by prune()
+DEFAULT_RETENTION = {'hourly': 24, 'daily': 7, 'weekly': 4}
+
+# Unreferenced chunks younger than this are left alone by gc(), so a snapshot
+# being written at the same time never loses a chunk it has just stored or reused
+GC_GRACE_SECONDS = 600
+
+_BUCKET_FORMATS = {
+    'hourly': '%Y-%m-%d %H',
+    'daily': '%Y-%m-%d',
+    'weekly': '%G-W%V',
+}
+
+def get_store_dir():
+    """The root directory of the snapshot store."""
+    return os.path.join(get_backup_dir(), 'store')
+
+def _chunk_path(digest):
+    return os.path.join(get_store_dir(), 'chunks', digest[:2], digest)
+
+def _manifest_dir():
+    return os.path.join(get_store_dir(), 'manifests')
+
+def _write_atomic(path, data):
+    """Write data to path so readers see either nothing or the whole file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'wb') as f:
+        f.write(data)
+    os.replace(temporary, path)
+
+def _store_chunk(data):
+    """
+    Store one chunk unless an identical chunk is already present.
+
+    Returns:
+        tuple: (digest, bytes written to the store)
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    path = _chunk_path(digest)
+    if os.path.exists(path):
+        # Refresh the mtime so a concurrent gc() treats the chunk as in use
+        os.utime(path)
+        return digest, 0
+    compressed = zlib.compress(data, 1)
+    _write_atomic(path, compressed)
+    return digest, len(compressed)
+
+def _read_chunk(digest):
+    """Read and verify one chunk. Raises ValueError if it is missing or corrupt."""
+    try:
+        with open(_chunk_path(digest), 'rb') as f:
+            data = zlib.decompress(f.read())
+    except (OSError, zlib.error) as e:
+        raise ValueError(f"chunk {digest[:12]} is unreadable: {e}")
+    if hashlib.sha256(data).hexdigest() != digest:
+        raise ValueError(f"chunk {digest[:12]} does not match its hash")
+    return data
+
+def _new_snapshot_id(created):
+    base = created.strftime('%Y%m%dT%H%M%SZ')
+    snapshot_id, sequence = base, 1
+    while os.path.exists(os.path.join(_manifest_dir(), f"{snapshot_id}.json")):
+        snapshot_id = f"{base}_{sequence}"
+        sequence += 1
+    return snapshot_id
+
+def _store_file_chunks(f, chunk_size, size):
+    """
+    Store the first size bytes of the open file f as chunks.
+
+    Returns:
+        tuple: (chunk digests, whole-file SHA-256 hex digest, new chunk count, bytes written to the store)
+    """
+    chunks = []
+    new_chunks = stored_bytes = 0
+    # Whole-file hash lets restore check the reassembled copy end to end
+    file_digest = hashlib.sha256()
+    remaining = size
+    while remaining > 0:
+        data = f.read(min(chunk_size, remaining))
+        if not data:
+            raise OSError(f"{f.name} ended {remaining} bytes early")
+        remaining -= len(data)
+        file_digest.update(data)
+        digest, written = _store_chunk(data)
+        chunks.append(digest)
+        if written:
+            new_chunks += 1
+            stored_bytes += written
+    return chunks, file_digest.hexdigest(), new_chunks, stored_bytes
+
+def _chunk_live_database(conn):
+    """
+    Check and chunk the live database file inside a read transaction on conn.
+
+    Returns:
+        tuple: (page_size, size, _store_file_chunks result), or None if the check failed
+    """
+    conn.execute("BEGIN")
+    try:
+        # quick_check reads every page, so the shared lock is held from here on
+        rows = [row[0] for row in conn.execute("PRAGMA quick_check").fetchall()]
+        if rows != ['ok']:
+            print(f"Error: Database failed quick_check, no snapshot created: {'; '.join(rows[:5])}")
+            return None
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        size = page_size * conn.execute("PRAGMA page_count").fetchone()[0]
+        with open(database.DATABASE_NAME, 'rb') as f:
+            return page_size, size, _store_file_chunks(f, page_size * CHUNK_PAGES, size)
+    finally:
+        conn.rollback()
+
+def _chunk_backup_copy(copy_path, show_progress):
+    """
+    Copy the database with the backup API, check the copy and chunk it.
+
+    Returns:
+        tuple: (page_size, size, _store_file_chunks result), or None if the check failed
+    """
+    snapshot_database(copy_path, show_progress=show_progress)
+    ok, message = check_integrity(copy_path)
+    if not ok:
+        print(f"Error: Snapshot failed integrity check: {message}")
+        return None
+
+    conn = sqlite3.connect(copy_path)
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    conn.close()
+
+    size = os.path.getsize(copy_path)
+    with open(copy_path, 'rb') as f:
+        return page_size, size, _store_file_chunks(f, page_size * CHUNK_PAGES, size)
+
+def create_snapshot(show_progress=True):
+    """
+    Store a snapshot of the current database.
+
+    Returns:
+        dict: The snapshot's manifest, or None on failure
+    """
+    if not os.path.exists(database.DATABASE_NAME):
+        print(f"Warning: Database file {database.DATABASE_NAME} does not exist. No snapshot created.")
+        return None
+
+    os.makedirs(_manifest_dir(), exist_ok=True)
+    created = datetime.datetime.now(datetime.timezone.utc)
+    snapshot_id = _new_snapshot_id(created)
+    copy_path = os.path.join(get_store_dir(), f".{snapshot_id}.copy")
+    started = perf_counter()
+    try:
+        conn = sqlite3.connect(database.DATABASE_NAME, timeout=database.BUSY_TIMEOUT_MS / 1000)
+        try:
+            if conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal':
+                result = _chunk_backup_copy(copy_path, show_progress)
+            else:
+                result = _chunk_live_database(conn)
+        finally:
+            conn.close()
+        if result is None:
+            return None
+        page_size, size, (chunks, file_digest, new_chunks, stored_bytes) = result
+
+        manifest = {
+            'id': snapshot_id,
+            'created': created.isoformat(timespec='seconds'),
+            'page_size': page_size,
+            'chunk_size': page_size * CHUNK_PAGES,
+            'size': size,
+            'sha256': file_digest,
+            'chunks': chunks,
+        }
+
+        _write_atomic(os.path.join(_manifest_dir(), f"{snapshot_id}.json"),
+                      json.dumps(manifest, indent=1).encode('utf-8'))
+        print(f"Snapshot {snapshot_id} stored: {len(chunks)} chunks, {new_chunks} new "
+              f"({stored_bytes / 1024 / 1024:.1f} MiB added, {perf_counter() - started:.1f} s)")
+        return manifest
+    except (sqlite3.Error, OSError) as e:
+        print(f"Error creating snapshot: {e}")
+        return None
+    finally:
+        if os.path.exists(copy_path):
+            os.remove(copy_path)
+
+def load_manifest(snapshot_id):
+    """Return a snapshot's manifest, or None if it does not exist."""
+    path = os.path.join(_manifest_dir(), f"{snapshot_id}.json")
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def list_snapshots():
+    """
+    List stored snapshots, newest first.
+
+    Returns:
+        list: Manifests (without their chunk lists)
+    """
+    manifest_dir = _manifest_dir()
+    if not os.path.isdir(manifest_dir):
+        return []
+    snapshots = []
+    for name in sorted(os.listdir(manifest_dir), reverse=True):
+        if name.endswith('.json'):
+            manifest = load_manifest(name[:-5])
+            if manifest:
+                manifest['chunk_count'] = len(manifest.pop('chunks'))
+                snapshots.append(manifest)
+    return snapshots
+
+def restore_snapshot(snapshot_id):
+    """
+    Rebuild a snapshot from its chunks, verify it, and restore it over the live database.
+
+    Returns:
+        bool: True on success, False on failure
+    """
+    manifest = load_manifest(snapshot_id)
+    if manifest is None:
+        print(f"Error: Snapshot {snapshot_id} not found in {get_store_dir()}")
+        return False
+
+    staging = database.DATABASE_NAME + '.restore'
+    started = perf_counter()
+    try:
+        digest = hashlib.sha256()
+        with open(staging, 'wb') as out:
+            for chunk_digest in manifest['chunks']:
+                data = _read_chunk(chunk_digest)
+                digest.update(data)
+                out.write(data)
+        if digest.hexdigest() != manifest['sha256']:
+            print(f"Error: Snapshot {snapshot_id} does not match its recorded hash, nothing restored.")
+            return False
+        if not restore_database_file(staging):
+            return False
+        print(f"Database restored from snapshot {snapshot_id} in {perf_counter() - started:.1f} s")
+        return True
+    except ValueError as e:
+        print(f"Error: Snapshot {snapshot_id} is damaged, nothing restored: {e}")
+        return False
+    except OSError as e:
+        print(f"Error restoring snapshot: {e}")
+        return False
+    finally:
+        if os.path.exists(staging):
+            os.remove(staging)
+
+def select_retained(snapshots, hourly=None, daily=None, weekly=None):
+    """
+    Decide which snapshots a retention policy keeps.
+
+    The newest snapshot in each of the most recent `hourly` hours, `daily` days
+    and `weekly` ISO weeks is kept, as is the newest snapshot overall.
+
+    Args:
+        snapshots (list): Manifests with 'id' and 'created'
+        hourly, daily, weekly (int): Buckets to keep; None uses DEFAULT_RETENTION
+
+    Returns:
+        set: IDs of snapshots to keep
+    """
+    limits = {
+        'hourly': DEFAULT_RETENTION['hourly'] if hourly is None else hourly,
+        'daily': DEFAULT_RETENTION['daily'] if daily is None else daily,
+        'weekly': DEFAULT_RETENTION['weekly'] if weekly is None else weekly,
+    }
+    ordered = sorted(snapshots, key=lambda s: s['created'], reverse=True)
+    keep = {ordered[0]['id']} if ordered else set()
+    for bucket_type, limit in limits.items():
+        seen = set()
+        for snapshot in ordered:
+            if len(seen) >= limit:
+                break
+            bucket = datetime.datetime.fromisoformat(snapshot['created']).strftime(_BUCKET_FORMATS[bucket_type])
+            if bucket not in seen:
+                seen.add(bucket)
+                keep.add(snapshot['id'])
+    return keep
+
+def prune(hourly=None, daily=None, weekly=None):
+    """
+    Delete the manifests of snapshots the retention policy does not keep.
+
+    Returns:
+        list: IDs of the deleted snapshots
+    """
+    snapshots = list_snapshots()
+    keep = select_retained(snapshots, hourly, daily, weekly)
+    removed = []
+    for snapshot in snapshots:
+        if snapshot['id'] not in keep:
+            os.remove(os.path.join(_manifest_dir(), f"{snapshot['id']}.json"))
+            removed.append(snapshot['id'])
+    if removed:
+        print(f"Pruned {len(removed)} snapshots; {len(keep)} kept.")
+    return removed
+
+def gc(grace_seconds=GC_GRACE_SECONDS):
+    """
+    Delete chunks that no manifest refers to.
+
+    Returns:
+        tuple: (chunks deleted, bytes freed)
+    """
+    referenced = set()
+    manifest_dir = _manifest_dir()
+    if os.path.isdir(manifest_dir):
+        for name in os.listdir(manifest_dir):
+            if name.endswith('.json'):
+                manifest = load_manifest(name[:-5])
+                if manifest is None:
+                    # An unreadable manifest might still need its chunks; do not guess
+                    print(f"Warning: Manifest {name} is unreadable; skipping garbage collection.")
+                    return 0, 0
+                referenced.update(manifest['chunks'])
+
+    chunk_root = os.path.join(get_store_dir(), 'chunks')
+    cutoff = time.time() - grace_seconds
+    deleted = freed = 0
+    if os.path.isdir(chunk_root):
+        for prefix in os.listdir(chunk_root):
+            prefix_dir = os.path.join(chunk_root, prefix)
+            for name in os.listdir(prefix_dir):
+                path = os.path.join(prefix_dir, name)
+                if name in referenced:
+                    continue
+                stat = os.stat(path)
+                if stat.st_mtime > cutoff:
+                    continue
+                os.remove(path)
+                deleted += 1
+                freed += stat.st_size
+    if deleted:
+        print(f"Garbage collection removed {deleted} chunks ({freed / 1024 / 1024:.1f} MiB).")
+    return deleted, freed
+
+def store_usage():
+    """
+    Return the store's logical size (sum of snapshot sizes) and physical size on disk.
+
+    Returns:
+        dict: snapshots, logical_bytes, stored_bytes, chunks
+    """
+    snapshots = list_snapshots()
+    stored = chunks = 0
+    chunk_root = os.path.join(get_store_dir(), 'chunks')
+    if os.path.isdir(chunk_root):
+        for prefix in os.listdir(chunk_root):
+            for name in os.listdir(os.path.join(chunk_root, prefix)):
+                stored += os.path.getsize(os.path.join(chunk_root, prefix, name))
+                chunks += 1
+    return {
+        'snapshots': len(snapshots),
+        'logical_bytes': sum(s['size'] for s in snapshots),
+        'stored_bytes': stored,
+        'chunks': chunks,
+    }
+
+def snapshot_with_retention(show_progress=True):
+    """Take a snapshot, then prune and garbage-collect with the default policy."""
+    manifest = create_snapshot(show_progress)
+    if manifest:
+        prune()
+        gc()
+    return manifest
+
+def _print_snapshots(snapshots):
+    for index, snapshot in enumerate(snapshots, 1):
+        print(f"{index}. {snapshot['id']}  {snapshot['created']}  "
+              f"{snapshot['size'] / 1024 / 1024:.1f} MiB, {snapshot['chunk_count']} chunks")
+
+def handle_snapshot_menu_option():
+    """Admin menu: take a snapshot and apply the retention policy."""
+    print("\n--- Snapshot Database ---")
+    snapshot_with_retention()
+    usage = store_usage()
+    print(f"Store holds {usage['snapshots']} snapshots ({usage['logical_bytes'] / 1024 / 1024:.1f} MiB) "
+          f"in {usage['stored_bytes'] / 1024 / 1024:.1f} MiB on disk.")
+
+def handle_snapshot_restore_menu_option():
+    """Admin menu: pick a snapshot and restore it."""
+    print("\n--- Restore Database from Snapshot ---")
+    snapshots = list_snapshots()
+    if not snapshots:
+        print(f"No snapshots found in {get_store_dir()}")
+        return
+    _print_snapshots(snapshots)
+    choice = input(f"Select a snapshot to restore (1-{len(snapshots)}) or 'back': ").strip()
+    if choice.lower() == 'back':
+        return
+    try:
+        number = int(choice)
+    except ValueError:
+        number = 0
+    if not 1 <= number <= len(snapshots):
+        print("Invalid selection.")
+        return
+    snapshot_id = snapshots[number - 1]['id']
+    confirm = input(f"This will replace ALL current data with snapshot {snapshot_id}. Continue? (yes/no): ").strip().lower()
+    if confirm in ('yes', 'y'):
+        restore_snapshot(snapshot_id)
+    else:
+        print("Restore cancelled.")
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Deduplicated snapshot store for the CRM database")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('snapshot', help="Store a snapshot, then prune and garbage-collect")
+    commands.add_parser('list', help="List snapshots and store usage")
+    restore_parser = commands.add_parser('restore', help="Restore a snapshot over the live database")
+    restore_parser.add_argument('snapshot_id')
+    prune_parser = commands.add_parser('prune', help="Apply the retention policy and garbage-collect")
+    for bucket_type, default in DEFAULT_RETENTION.items():
+        prune_parser.add_argument(f'--{bucket_type}', type=int, default=default)
+    gc_parser = commands.add_parser('gc', help="Delete unreferenced chunks")
+    gc_parser.add_argument('--grace-seconds', type=int, default=GC_GRACE_SECONDS)
+    args = parser.parse_args()
+
+    if args.command == 'snapshot':
+        sys.exit(0 if snapshot_with_retention() else 1)
+    elif args.command == 'list':
+        _print_snapshots(list_snapshots())
+        usage = store_usage()
+        print(f"{usage['snapshots']} snapshots, {usage['logical_bytes'] / 1024 / 1024:.1f} MiB logical, "
+              f"{usage['stored_bytes'] / 1024 / 1024:.1f} MiB stored in {usage['chunks']} chunks")
+    elif args.command == 'restore':
+        sys.exit(0 if restore_snapshot(args.snapshot_id) else 1)
+    elif args.command == 'prune':
+        prune(args.hourly, args.daily, args.weekly)
+        gc()
+    else:
+        gc(args.grace_seconds)
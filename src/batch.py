@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Batch Command Mode for CRM Application
+
+This module runs CRM commands non-interactively. It reads JSON Lines commands
+from a file or stdin and streams one JSON result per command to stdout, so
+integration jobs do not have to drive the input() prompts.
+
+All commands run on a single database connection. With a group size of N,
+N commands are committed together in one transaction.
+
+Command format (one JSON object per line):
+    {"op": "create", "entity": "account", "data": {"name": "Acme"}}
+    {"op": "get", "entity": "contact", "id": 12}
+    {"op": "update", "entity": "opportunity", "id": 7, "data": {"amount": 5000}}
+    {"op": "delete", "entity": "account", "id": 3}
+    {"op": "search", "entity": "contact", "query": "smith", "limit": 20, "offset": 0}
+    {"op": "search", "entity": "account", "query": "corp", "mode": "substring"}
+    {"op": "search", "entity": "contact", "query": "jonh smtih", "mode": "fuzzy"}
+    {"op": "list", "entity": "opportunity", "limit": 100, "offset": 0}
+    {"op": "export", "entity": "contact"}
+
+Each result carries the input line number, plus any "ref" value from the
+command so callers can match results to commands. Results look like:
+    {"line": 1, "ref": 1, "ok": true, "result": 42}
+    {"line": 2, "ref": 2, "ok": false, "error": "Integrity error creating contact: ..."}
+"""
+
+import io
+import sys
+import json
+import sqlite3
+import contextlib
+
+from . import crm_dal
+from .database import bind_connection, initialize_database
+from .retry import get_contention_stats, run_with_retry
+from . import database
+
+ENTITIES = ('account', 'contact', 'opportunity')
+OPERATIONS = ('create', 'get', 'update', 'delete', 'search', 'list', 'export')
+
+# Positional DAL arguments that are optional from a batch caller's point of view
+CREATE_DEFAULTS = {
+    'account': {},
+    'contact': {'phone': None, 'account_id': None},
+    'opportunity': {'description': None, 'amount': None, 'close_date': None,
+                    'account_id': None, 'contact_id': None},
+}
+
+_DAL_FUNCTIONS = {
+    'account': {
+        'create': crm_dal.create_account, 'get': crm_dal.get_account,
+        'update': crm_dal.update_account, 'delete': crm_dal.delete_account,
+        'search': crm_dal.search_accounts, 'list': crm_dal.list_accounts,
+    },
+    'contact': {
+        'create': crm_dal.create_contact, 'get': crm_dal.get_contact,
+        'update': crm_dal.update_contact, 'delete': crm_dal.delete_contact,
+        'search': crm_dal.search_contacts, 'list': crm_dal.list_contacts,
+    },
+    'opportunity': {
+        'create': crm_dal.create_opportunity, 'get': crm_dal.get_opportunity,
+        'update': crm_dal.update_opportunity, 'delete': crm_dal.delete_opportunity,
+        'search': crm_dal.search_opportunities, 'list': crm_dal.list_opportunities,
+    },
+}
+
+class BatchCommandError(Exception):
+    """Raised for a malformed batch command."""
+    pass
+
+def _row_to_dict(row):
+    """Convert a sqlite3.Row (or None) to something json.dumps can handle."""
+    return dict(row) if row is not None else None
+
+def _export(entity):
+    """Run the CSV export for an entity and return the written file path."""
+    # Imported here so batch runs only load the interactive CLI module when exporting
+    from .main import export_contacts_to_csv, export_opportunities_to_csv
+    if entity == 'contact':
+        return export_contacts_to_csv()
+    if entity == 'opportunity':
+        return export_opportunities_to_csv()
+    raise BatchCommandError(f"Export is not supported for entity '{entity}'")
+
+def execute_command(command):
+    """
+    Execute one batch command against the currently bound connection.
+
+    Args:
+        command (dict): The parsed command
+
+    Returns:
+        The command result (an ID, a row dict, a list of row dicts, a bool or a path).
+        None means the DAL reported a failure.
+
+    Raises:
+        BatchCommandError: If the command is malformed
+    """
+    if not isinstance(command, dict):
+        raise BatchCommandError("Command must be a JSON object")
+    op = command.get('op')
+    entity = command.get('entity')
+    if op not in OPERATIONS:
+        raise BatchCommandError(f"Unknown op '{op}'. Valid ops: {', '.join(OPERATIONS)}")
+    if entity not in ENTITIES:
+        raise BatchCommandError(f"Unknown entity '{entity}'. Valid entities: {', '.join(ENTITIES)}")
+
+    if op == 'export':
+        return _export(entity)
+
+    func = _DAL_FUNCTIONS[entity][op]
+    data = command.get('data') or {}
+    if not isinstance(data, dict):
+        raise BatchCommandError("'data' must be a JSON object")
+
+    try:
+        if op == 'create':
+            return func(**{**CREATE_DEFAULTS[entity], **data})
+        if op == 'list':
+            if 'limit' in command:
+                rows = func(int(command['limit']), int(command.get('offset', 0)))
+            else:
+                rows = func()
+            return [_row_to_dict(row) for row in rows]
+        if op == 'search':
+            if 'query' not in command:
+                raise BatchCommandError("'search' requires a 'query'")
+            mode = command.get('mode')
+            if mode is not None and mode not in crm_dal.SEARCH_MODES:
+                raise BatchCommandError(f"Unknown search mode '{mode}'. Valid modes: {', '.join(crm_dal.SEARCH_MODES)}")
+            if 'limit' in command:
+                rows = func(str(command['query']), int(command['limit']), int(command.get('offset', 0)), mode)
+            else:
+                rows = func(str(command['query']), mode=mode)
+            return [_row_to_dict(row) for row in rows]
+
+        if 'id' not in command:
+            raise BatchCommandError(f"'{op}' requires an 'id'")
+        if op == 'get':
+            return _row_to_dict(func(command['id']))
+        if op == 'update':
+            return func(command['id'], **data) or None
+        return func(command['id']) or None  # delete
+    except TypeError as e:
+        # Unknown or missing fields in 'data'
+        raise BatchCommandError(f"Invalid fields for {entity} {op}: {e}")
+    except ValueError as e:
+        raise BatchCommandError(f"Invalid paging values for {entity} {op}: {e}")
+
+def run_batch(input_stream, output_stream, group_size=1):
+    """
+    Run every command from input_stream and write one JSON result line per command.
+
+    Args:
+        input_stream: Text stream of JSON Lines commands
+        output_stream: Text stream the JSON results are written to
+        group_size (int): Number of commands committed together in one transaction
+
+    Returns:
+        tuple: (number of commands run, number of failed commands)
+    """
+    conn = sqlite3.connect(database.DATABASE_NAME, timeout=database.BUSY_TIMEOUT_MS / 1000)
+    total = 0
+    failed = 0
+    try:
+        with bind_connection(conn, defer_commit=group_size > 1) as shared:
+            # Results are written only once their group is committed
+            group = []
+
+            def commit_group():
+                nonlocal failed
+                try:
+                    # A COMMIT that fails with SQLITE_BUSY leaves the transaction open, so it can be retried
+                    run_with_retry(shared.commit_now)
+                except sqlite3.Error as e:
+                    conn.rollback()
+                    for result in group:
+                        if result['ok']:
+                            failed += 1
+                            result['ok'] = False
+                            result.pop('result', None)
+                            result['error'] = f"Rolled back, committing the group failed: {e}"
+                for result in group:
+                    output_stream.write(json.dumps(result, default=str) + '\n')
+                group.clear()
+
+            for line_number, line in enumerate(input_stream, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                total += 1
+                result = {'line': line_number}
+                # DAL functions report errors with print(); capture them so stdout stays pure JSONL
+                messages = io.StringIO()
+                try:
+                    command = json.loads(line)
+                    if isinstance(command, dict) and 'ref' in command:
+                        result['ref'] = command['ref']
+                    with contextlib.redirect_stdout(messages):
+                        value = execute_command(command)
+                    if value is None and command.get('op') != 'get':
+                        result['ok'] = False
+                        result['error'] = messages.getvalue().strip() or f"{command.get('op')} failed"
+                    else:
+                        result['ok'] = True
+                        result['result'] = value
+                except json.JSONDecodeError as e:
+                    result['ok'] = False
+                    result['error'] = f"Invalid JSON: {e}"
+                except BatchCommandError as e:
+                    result['ok'] = False
+                    result['error'] = str(e)
+
+                if not result['ok']:
+                    failed += 1
+                group.append(result)
+                if len(group) >= group_size:
+                    commit_group()
+            commit_group()
+        output_stream.flush()
+        return total, failed
+    finally:
+        conn.close()
+
+def main(source='-', group_size=1):
+    """
+    Entry point for `python -m src.main --batch`.
+
+    Args:
+        source (str): Path to a JSON Lines file, or '-' for stdin
+        group_size (int): Number of commands per transaction
+    """
+    # Start-up messages go to stderr so stdout only carries results
+    with contextlib.redirect_stdout(sys.stderr):
+        initialize_database()
+
+    if source == '-':
+        total, failed = run_batch(sys.stdin, sys.stdout, group_size)
+    else:
+        with open(source, 'r') as f:
+            total, failed = run_batch(f, sys.stdout, group_size)
+    print(f"Batch complete: {total} commands, {failed} failed", file=sys.stderr)
+    contention = get_contention_stats()
+    if contention['busy_errors']:
+        print(f"Lock contention: {contention['retries']} retries, "
+              f"{contention['wait_seconds']:.2f} s waiting, {contention['gave_up']} gave up", file=sys.stderr)
+    return failed == 0
+
+if __name__ == '__main__':
+    sys.exit(0 if main(sys.argv[1] if len(sys.argv) > 1 else '-') else 1)
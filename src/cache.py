@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Entity Cache for CRM Application
+
+A bounded LRU cache of account, contact and opportunity rows keyed by table
+and ID, used by crm_dal.get_account/get_contact/get_opportunity.
+
+- Size limit: the least recently used entry is evicted when the cache is full.
+- TTL: entries older than ttl_seconds are treated as misses.
+- Write-through: update_* refreshes the cached row and delete_* removes it.
+- Cross-process invalidation: the cache watches PRAGMA data_version on the
+  session connection. The value changes whenever another connection (another
+  process, or another connection in this one) commits, and then the whole
+  cache is dropped. Commits made on the session connection itself do not
+  change it, which is why the cache is tied to one connection.
+
+Hit, miss, eviction, expiry and invalidation counts are kept in stats().
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from time import monotonic
+
+DEFAULT_MAX_ENTRIES = int(os.environ.get('CRM_CACHE_SIZE', 1024))
+DEFAULT_TTL_SECONDS = float(os.environ.get('CRM_CACHE_TTL_SECONDS', 300))
+
+class EntityCache:
+    """
+    LRU cache with a TTL, invalidated by PRAGMA data_version.
+
+    Args:
+        connection (sqlite3.Connection): The connection whose data_version is watched;
+                                         writes made on it keep the cache valid
+        max_entries (int): Maximum number of cached rows
+        ttl_seconds (float): How long a cached row may be served
+    """
+
+    def __init__(self, connection, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.connection = connection
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._data_version = self._read_data_version()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def _read_data_version(self):
+        return self.connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def _check_data_version(self):
+        """Drop everything if another connection has committed since the last check."""
+        current = self._read_data_version()
+        if current != self._data_version:
+            self._data_version = current
+            if self._entries:
+                self._entries.clear()
+                self._stats['invalidations'] += 1
+
+    def get(self, table, key):
+        """Return the cached row, or None on a miss."""
+        with self._lock:
+            self._check_data_version()
+            entry = self._entries.get((table, key))
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            row, stored_at = entry
+            if monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[(table, key)]
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end((table, key))
+            self._stats['hits'] += 1
+            return row
+
+    def put(self, table, key, row):
+        """Cache a row (None is not cached)."""
+        if row is None:
+            self.discard(table, key)
+            return
+        with self._lock:
+            self._entries[(table, key)] = (row, monotonic())
+            self._entries.move_to_end((table, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def discard(self, table, key):
+        """Remove one row from the cache."""
+        with self._lock:
+            self._entries.pop((table, key), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return the counters and the current number of entries."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+            return stats
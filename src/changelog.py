@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Change Data Capture for CRM Application
+
+Triggers created by migration 9 append a row to ChangeLog for every insert,
+update and delete on Accounts, Contacts and Opportunities: entity, record id,
+operation and a sequence number that only ever grows (AUTOINCREMENT, so
+numbers are not reused after old entries are deleted).
+
+export_changes() writes one CSV per entity with only the records changed
+since the consumer's last export of that entity, and then moves the
+consumer's high-water mark (ExportWatermark.last_seq) forward. Each changed
+record appears once, with its current values ('upsert') or just its id
+('delete'). An entity without a high-water mark gets a full export first.
+
+compact_change_log() keeps the table small: entries every consumer has
+exported are deleted, and of the remaining entries only the newest per
+record is kept.
+"""
+
+import csv
+import os
+import sqlite3
+from datetime import datetime
+
+from . import database
+from .retry import run_with_retry
+
+DEFAULT_CONSUMER = 'csv_export'
+
+# entity -> (table, key column)
+ENTITY_TABLES = {
+    'accounts': ('Accounts', 'account_id'),
+    'contacts': ('Contacts', 'contact_id'),
+    'opportunities': ('Opportunities', 'opportunity_id'),
+}
+
+def _connect():
+    """Open an autocommit connection; transactions are explicit below."""
+    conn = sqlite3.connect(database.current_database_path(), isolation_level=None,
+                           timeout=database.BUSY_TIMEOUT_MS / 1000)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def get_watermark(conn, consumer, table):
+    """Return the last sequence number a consumer exported of a table, or None if it never did."""
+    row = conn.execute("SELECT last_seq FROM ExportWatermark WHERE consumer = ? AND entity = ?",
+                       (consumer, table)).fetchone()
+    return row[0] if row else None
+
+def save_watermarks(conn, consumer, tables, last_seq):
+    """Set a consumer's high-water mark of several tables in one transaction (autocommit conn)."""
+    def save():
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("""
+                INSERT INTO ExportWatermark (consumer, entity, last_seq, exported_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT (consumer, entity) DO UPDATE
+                SET last_seq = excluded.last_seq, exported_at = excluded.exported_at
+            """, [(consumer, table, last_seq) for table in tables])
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+    run_with_retry(save)
+
+def _changed_rows(conn, table, key, after_seq, up_to_seq):
+    """Current rows of the records changed in (after_seq, up_to_seq], latest change last."""
+    return conn.execute(f"""
+        WITH changes AS (
+            SELECT record_id, MAX(seq) AS seq FROM ChangeLog
+            WHERE seq > ? AND seq <= ? AND entity = ?
+            GROUP BY record_id
+        )
+        SELECT changes.seq AS change_seq, changes.record_id AS change_record_id, t.*
+        FROM changes LEFT JOIN {table} t ON t.{key} = changes.record_id
+        ORDER BY changes.seq
+    """, (after_seq, up_to_seq, table))
+
+def _all_rows(conn, table, key, up_to_seq):
+    return conn.execute(f"SELECT ? AS change_seq, {key} AS change_record_id, * FROM {table} ORDER BY {key}",
+                        (up_to_seq,))
+
+def _write_csv(filename, cursor, key):
+    """Write change rows to filename; returns the number of rows (the file is removed if there are none)."""
+    columns = [description[0] for description in cursor.description][2:]
+    written = 0
+    with open(filename, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['change_seq', 'change'] + columns)
+        for row in cursor:
+            if row[key] is None:
+                values = [row['change_record_id'] if column == key else None for column in columns]
+                writer.writerow([row['change_seq'], 'delete'] + values)
+            else:
+                writer.writerow([row['change_seq'], 'upsert'] + [row[column] for column in columns])
+            written += 1
+    if not written:
+        os.remove(filename)
+    return written
+
+def export_changes(consumer=DEFAULT_CONSUMER, entities=None, output_dir=None, compact=True):
+    """
+    Export the records changed since the consumer's last export, one CSV per entity.
+
+    All entities are read in one transaction, up to the same sequence number,
+    which becomes the consumer's new high-water mark of each exported entity
+    once the files are written.
+
+    Args:
+        consumer (str): Name of the downstream reader that owns the high-water mark
+        entities (list, optional): Subset of ENTITY_TABLES (default: all)
+        output_dir (str, optional): Directory for the files (default: the data directory)
+        compact (bool): Compact the change log afterwards
+
+    Returns:
+        dict: {entity: (mode, filename or None, rows)}, mode being 'delta' or 'full'; None on failure
+    """
+    from .in_memory import is_active
+    if is_active():
+        # The export would read and mark the file on disk, which lacks this session's changes
+        print("Delta export is not available in an in-memory session; save the session and "
+              "run it from a normal session.")
+        return None
+    entities = list(entities or ENTITY_TABLES)
+    unknown = [entity for entity in entities if entity not in ENTITY_TABLES]
+    if unknown:
+        print(f"Error: Unknown entity {', '.join(unknown)}. Valid options: {', '.join(ENTITY_TABLES)}")
+        return None
+    output_dir = output_dir or database.DATA_DIR
+    os.makedirs(output_dir, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    conn = _connect()
+    try:
+        result = {}
+        conn.execute("BEGIN")
+        try:
+            up_to_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM ChangeLog").fetchone()[0]
+            for entity in entities:
+                table, key = ENTITY_TABLES[entity]
+                after_seq = get_watermark(conn, consumer, table)
+                if after_seq is None:
+                    mode, cursor = 'full', _all_rows(conn, table, key, up_to_seq)
+                else:
+                    mode, cursor = 'delta', _changed_rows(conn, table, key, after_seq, up_to_seq)
+                filename = os.path.join(output_dir, f"{entity}_{mode}_{timestamp}.csv")
+                rows = _write_csv(filename, cursor, key)
+                result[entity] = (mode, filename if rows else None, rows)
+        finally:
+            conn.execute("COMMIT")
+
+        save_watermarks(conn, consumer, [ENTITY_TABLES[entity][0] for entity in entities], up_to_seq)
+    except (sqlite3.Error, OSError) as e:
+        print(f"Error exporting changes: {e}")
+        return None
+    finally:
+        conn.close()
+
+    if compact:
+        compact_change_log()
+    return result
+
+def compact_change_log():
+    """
+    Delete change log entries that every consumer has exported, then keep only
+    the newest remaining entry per record (older ones add nothing to an export).
+
+    Returns:
+        tuple: (exported entries deleted, superseded entries deleted), or None on failure
+    """
+    conn = _connect()
+    try:
+        def compact():
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                exported = 0
+                for table, _ in ENTITY_TABLES.values():
+                    low_water = conn.execute("SELECT MIN(last_seq) FROM ExportWatermark WHERE entity = ?",
+                                             (table,)).fetchone()[0]
+                    if low_water is not None:
+                        exported += conn.execute("DELETE FROM ChangeLog WHERE entity = ? AND seq <= ?",
+                                                 (table, low_water)).rowcount
+                superseded = conn.execute("""
+                    DELETE FROM ChangeLog WHERE EXISTS (
+                        SELECT 1 FROM ChangeLog later
+                        WHERE later.entity = ChangeLog.entity AND later.record_id = ChangeLog.record_id
+                          AND later.seq > ChangeLog.seq
+                    )
+                """).rowcount
+                conn.execute("COMMIT")
+                return exported, superseded
+            except sqlite3.Error:
+                conn.execute("ROLLBACK")
+                raise
+        return run_with_retry(compact)
+    except sqlite3.Error as e:
+        print(f"Error compacting change log: {e}")
+        return None
+    finally:
+        conn.close()
+
+def reset_consumer(consumer):
+    """Forget a consumer's high-water marks; its next export is a full one."""
+    conn = _connect()
+    try:
+        return run_with_retry(
+            lambda: conn.execute("DELETE FROM ExportWatermark WHERE consumer = ?", (consumer,)).rowcount) > 0
+    except sqlite3.Error as e:
+        print(f"Error resetting consumer: {e}")
+        return False
+    finally:
+        conn.close()
+
+def print_status():
+    conn = _connect()
+    try:
+        count, low, high = conn.execute("SELECT COUNT(*), MIN(seq), MAX(seq) FROM ChangeLog").fetchone()
+        print(f"Change log: {count:,} entries" + (f" (sequence {low} to {high})" if count else ""))
+        for row in conn.execute("SELECT * FROM ExportWatermark ORDER BY consumer, entity").fetchall():
+            pending = conn.execute("SELECT COUNT(DISTINCT record_id) FROM ChangeLog WHERE seq > ? AND entity = ?",
+                                   (row['last_seq'], row['entity'])).fetchone()[0]
+            print(f"  {row['consumer']:<20} {row['entity']:<14} exported up to {row['last_seq']} "
+                  f"at {row['exported_at']}, {pending:,} records changed since")
+    except sqlite3.Error as e:
+        print(f"Error reading change log: {e}")
+    finally:
+        conn.close()
+
+def print_export_result(result):
+    if result is None:
+        return
+    for entity, (mode, filename, rows) in result.items():
+        if filename and mode == 'full':
+            print(f"SUCCESS: All {rows:,} {entity} exported to {filename} (first export; later ones contain only changes)")
+        elif filename:
+            print(f"SUCCESS: {rows:,} changed {entity} exported to {filename}")
+        else:
+            print(f"No {entity} changed since the last export.")
+
+def handle_delta_export_menu_option():
+    """Export menu: write the records changed since the last export."""
+    print_export_result(export_changes())
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Export CRM records changed since the last export")
+    parser.add_argument('command', choices=['export', 'status', 'compact', 'reset'])
+    parser.add_argument('--consumer', default=DEFAULT_CONSUMER,
+                        help=f"Owner of the high-water mark (default: {DEFAULT_CONSUMER})")
+    parser.add_argument('--entity', action='append', choices=list(ENTITY_TABLES), dest='entities',
+                        help="Export only this entity (repeatable)")
+    parser.add_argument('--output-dir', default=None, help="Directory for the CSV files (default: data/)")
+    args = parser.parse_args()
+    if args.command == 'export':
+        print_export_result(export_changes(args.consumer, args.entities, args.output_dir))
+    elif args.command == 'status':
+        print_status()
+    elif args.command == 'compact':
+        deleted = compact_change_log()
+        if deleted:
+            print(f"Deleted {deleted[0]:,} exported and {deleted[1]:,} superseded change log entries.")
+    else:
+        print("Consumer reset; its next export is a full export." if reset_consumer(args.consumer)
+              else f"No high-water mark stored for '{args.consumer}'.")
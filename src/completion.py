@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Name Completion for CRM Application
+
+Tab completion at the "search by name" prompts, backed by an in-memory prefix
+index per entity:
+
+- The index is a list of terms (account names, contact names and emails,
+  opportunity names) sorted case-insensitively, with a parallel array of the
+  owning record IDs. A completion is a binary search for the typed prefix
+  followed by a short forward scan, so it stays well under a millisecond even
+  with hundreds of thousands of contacts.
+- Each index is built on first use from one projection query.
+- Creates, updates and deletes made through crm_dal are applied to the loaded
+  indexes incrementally (see crm_dal.add_write_listener).
+
+readline is optional: where it is not available (e.g. Windows without
+pyreadline) the prompts work exactly as before, without completion.
+"""
+
+import sqlite3
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+
+try:
+    import readline
+except ImportError:
+    readline = None
+
+from . import crm_dal
+from .database import get_db_connection
+
+# Candidates offered for one Tab press
+MAX_CANDIDATES = 50
+
+# entity -> (table, key column, projection query returning the key followed by one column per term)
+_SOURCES = {
+    'account': ('Accounts', 'account_id', "SELECT account_id, name FROM Accounts"),
+    'contact': ('Contacts', 'contact_id',
+                "SELECT contact_id, first_name || ' ' || last_name, last_name, email FROM Contacts"),
+    'opportunity': ('Opportunities', 'opportunity_id', "SELECT opportunity_id, name FROM Opportunities"),
+}
+
+def _fold(term):
+    return term.casefold()
+
+class PrefixIndex:
+    """Sorted terms with the ID of the record each term belongs to."""
+
+    def __init__(self):
+        self._terms = []
+        self._ids = array('q')
+        self._lock = threading.Lock()
+
+    def load(self, rows):
+        """Replace the contents with (id, term, term, ...) rows."""
+        shared = {}
+        pairs = []
+        for row in rows:
+            key = row[0]
+            for term in row[1:]:
+                if term:
+                    # Names repeat a lot; keep one string object per distinct term
+                    pairs.append((shared.setdefault(term, term), key))
+        pairs.sort(key=lambda pair: _fold(pair[0]))
+        with self._lock:
+            self._terms = [term for term, _ in pairs]
+            self._ids = array('q', (key for _, key in pairs))
+
+    def __len__(self):
+        return len(self._terms)
+
+    def add(self, key, terms):
+        """Add the terms of one record."""
+        with self._lock:
+            for term in terms:
+                if term:
+                    position = bisect_right(self._terms, _fold(term), key=_fold)
+                    self._terms.insert(position, term)
+                    self._ids.insert(position, key)
+
+    def remove(self, key):
+        """Remove every term of one record."""
+        with self._lock:
+            position = 0
+            while True:
+                try:
+                    position = self._ids.index(key, position)
+                except ValueError:
+                    return
+                del self._terms[position]
+                del self._ids[position]
+
+    def complete(self, prefix, limit=MAX_CANDIDATES):
+        """Return up to limit distinct terms starting with prefix (case-insensitive)."""
+        folded = _fold(prefix)
+        matches = []
+        seen = set()
+        with self._lock:
+            position = bisect_left(self._terms, folded, key=_fold)
+            terms = self._terms
+            while position < len(terms) and len(matches) < limit:
+                term = terms[position]
+                if not _fold(term).startswith(folded):
+                    break
+                if term not in seen:
+                    seen.add(term)
+                    matches.append(term)
+                position += 1
+        return matches
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_index(entity):
+    """Return the prefix index of an entity, building it on first use."""
+    with _indexes_lock:
+        index = _indexes.get(entity)
+        if index is None:
+            index = PrefixIndex()
+            conn = get_db_connection()
+            if conn is None:
+                return index
+            try:
+                index.load(conn.execute(_SOURCES[entity][2]).fetchall())
+            except sqlite3.Error as e:
+                print(f"Database error building name completion: {e}")
+            finally:
+                conn.close()
+            _indexes[entity] = index
+            if len(_indexes) == 1:
+                crm_dal.add_write_listener(_apply_write)
+        return index
+
+def reset_indexes():
+    """Drop all loaded indexes (they are rebuilt on next use)."""
+    with _indexes_lock:
+        _indexes.clear()
+        crm_dal.remove_write_listener(_apply_write)
+
+def _apply_write(table, key, action):
+    """crm_dal write listener: keep loaded indexes in step with creates, updates and deletes."""
+    for entity, (source_table, key_column, query) in _SOURCES.items():
+        index = _indexes.get(entity)
+        if source_table != table or index is None:
+            continue
+        index.remove(key)
+        if action == 'delete':
+            continue
+        conn = get_db_connection()
+        if conn is None:
+            continue
+        try:
+            row = conn.execute(f"{query} WHERE {key_column} = ?", (key,)).fetchone()
+        except sqlite3.Error:
+            row = None
+        finally:
+            conn.close()
+        if row:
+            index.add(key, row[1:])
+
+def _make_completer(entity):
+    matches = []
+
+    def completer(text, state):
+        if state == 0:
+            matches[:] = get_index(entity).complete(text) if text else []
+        return matches[state] if state < len(matches) else None
+
+    return completer
+
+@contextmanager
+def completing(entity):
+    """Enable Tab completion of entity names for input() calls inside the block."""
+    if readline is None:
+        yield
+        return
+    previous_completer = readline.get_completer()
+    previous_delims = readline.get_completer_delims()
+    readline.set_completer(_make_completer(entity))
+    # Complete the whole line, since names contain spaces
+    readline.set_completer_delims('')
+    if 'libedit' in (readline.__doc__ or ''):
+        readline.parse_and_bind('bind ^I rl_complete')
+    else:
+        readline.parse_and_bind('tab: complete')
+    try:
+        yield
+    finally:
+        readline.set_completer(previous_completer)
+        readline.set_completer_delims(previous_delims)
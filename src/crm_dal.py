@@ -1,8 +1,604 @@
 # This file will contain the Data Access Layer (DAL) functions for performing CRUD operations on the CRM data (Accounts, Contacts, Opportunities).
 
+import os
+import re
 import sqlite3
+from datetime import date
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 # Update import to use relative path
-from .database import get_db_connection
+from . import database
+from .database import get_db_connection, SharedConnection
+from .retry import run_with_retry
+from .cache import EntityCache, DEFAULT_MAX_ENTRIES, DEFAULT_TTL_SECONDS
+from .timestamps import parse_utc
+from .similarity import fold, jaro_winkler
+
+# --- Entity Cache ---
+# get_account/get_contact/get_opportunity read through an optional LRU cache
+# (see cache.py). The cache is tied to a session connection bound to the thread
+# that enabled it, and is only used for DAL calls made on that connection.
+
+_entity_cache = None
+_cache_connection = None
+
+def enable_entity_cache(max_entries=None, ttl_seconds=None):
+    """
+    Open a session connection for the current thread and cache entity reads on it.
+
+    Args:
+        max_entries (int, optional): Cache size; 0 disables the cache (default: CRM_CACHE_SIZE or 1024)
+        ttl_seconds (float, optional): Entry lifetime (default: CRM_CACHE_TTL_SECONDS or 300)
+
+    Returns:
+        EntityCache: The cache, or None if it is disabled
+    """
+    global _entity_cache, _cache_connection
+    disable_entity_cache()
+    max_entries = DEFAULT_MAX_ENTRIES if max_entries is None else max_entries
+    if max_entries <= 0:
+        return None
+    try:
+        _cache_connection = sqlite3.connect(database.DATABASE_NAME, timeout=database.BUSY_TIMEOUT_MS / 1000)
+    except sqlite3.Error as e:
+        print(f"Entity cache disabled, could not open session connection: {e}")
+        return None
+    shared = database.bind_thread_connection(_cache_connection)
+    _entity_cache = EntityCache(shared, max_entries,
+                                DEFAULT_TTL_SECONDS if ttl_seconds is None else ttl_seconds)
+    return _entity_cache
+
+def disable_entity_cache():
+    """Drop the cache and close its session connection."""
+    global _entity_cache, _cache_connection
+    if _entity_cache is not None and database.get_bound_connection() is _entity_cache.connection:
+        database.unbind_thread_connection()
+    if _cache_connection is not None:
+        _cache_connection.close()
+    _entity_cache = _cache_connection = None
+
+def get_session_connection():
+    """Return the session connection opened by enable_entity_cache(), or None."""
+    return _cache_connection
+
+def get_cache_stats():
+    """Return the entity cache counters, or None if the cache is not enabled."""
+    return _entity_cache.stats() if _entity_cache is not None else None
+
+def _active_cache():
+    """The entity cache, if this call runs on the cache's session connection."""
+    cache = _entity_cache
+    if cache is not None and database.get_bound_connection() is cache.connection:
+        return cache
+    return None
+
+def _refresh_cached(table, key_column, key):
+    """Write-through after an update: cache the row as it is now stored."""
+    cache = _active_cache()
+    if cache is None:
+        return
+    try:
+        row = cache.connection.execute(f"SELECT * FROM {table} WHERE {key_column} = ?", (key,)).fetchone()
+    except sqlite3.Error:
+        cache.discard(table, key)
+        return
+    cache.put(table, key, row)
+
+def _forget_cached(table, key):
+    """Remove a deleted row from the cache."""
+    cache = _active_cache()
+    if cache is not None:
+        cache.discard(table, key)
+
+# Columns filled from the removed record when merging duplicates
+_ACCOUNT_MERGE_COLUMNS = ('industry_id', 'description', 'website', 'street', 'city', 'state', 'zip', 'country')
+_CONTACT_MERGE_COLUMNS = ('title', 'phone', 'account_id', 'description', 'website', 'street', 'city',
+                          'state', 'zip', 'country')
+
+def _after_merge(table, key_column, keep_id, remove_id, moved_children):
+    """Update the cache and write listeners after merge_accounts/merge_contacts."""
+    cache = _active_cache()
+    if cache is not None and moved_children:
+        # Cached child rows still point at the removed record
+        cache.clear()
+    _refresh_cached(table, key_column, keep_id)
+    _forget_cached(table, remove_id)
+    _notify_write(table, keep_id, 'update')
+    _notify_write(table, remove_id, 'delete')
+
+# --- Write Listeners ---
+# Callbacks run after each successful create/update/delete made through this
+# module, as callback(table, key, action) with action 'create', 'update' or
+# 'delete'. Used to keep in-memory structures (e.g. completion.py) current.
+
+_write_listeners = []
+
+def add_write_listener(callback):
+    """Register callback(table, key, action) to run after successful DAL writes."""
+    if callback not in _write_listeners:
+        _write_listeners.append(callback)
+
+def remove_write_listener(callback):
+    if callback in _write_listeners:
+        _write_listeners.remove(callback)
+
+def _notify_write(table, key, action):
+    for callback in list(_write_listeners):
+        callback(table, key, action)
+
+def after_queued_write(table, key, action):
+    """
+    Cache and listener hooks for a write committed by write_queue.py instead
+    of a DAL function. The queue writes on its own connection, so the row is
+    dropped from the cache rather than refreshed.
+    """
+    cache = _entity_cache
+    if cache is not None:
+        cache.discard(table, key)
+    _notify_write(table, key, action)
+
+# --- Search ---
+# search_* return matches ranked exact, then prefix, then substring (ties by the
+# first searched field, then ID), optionally one page at a time. count_*_matches
+# report how many rows match without fetching them all.
+#
+# Modes: 'prefix' matches fields that start with the query, as range scans on
+# the NOCASE indexes of _PREFIX_FIELDS (migration 10); 'substring' matches the
+# query anywhere, which has to scan the table. Prefix is the default unless the
+# query contains a '*' or '%' wildcard. 'fuzzy' tolerates typos (see below) and
+# is only used when asked for.
+
+SEARCH_MODES = ('prefix', 'substring', 'fuzzy')
+
+# Matches counted exactly before count_*_matches switches to an estimate
+SEARCH_COUNT_CAP = 1000
+
+# table -> (key column, searched expressions; the first one is also the sort key)
+_SEARCH_FIELDS = {
+    'Accounts': ('account_id', ('name',)),
+    'Contacts': ('contact_id', ("first_name || ' ' || last_name", 'email', 'first_name', 'last_name')),
+    'Opportunities': ('opportunity_id', ('name', 'description')),
+}
+
+# table -> expressions with a NOCASE index, searched in prefix mode
+# (a first name prefix is a prefix of the full name)
+_PREFIX_FIELDS = {
+    'Accounts': ('name',),
+    'Contacts': ("first_name || ' ' || last_name", 'last_name', 'email'),
+    'Opportunities': ('name',),
+}
+
+# Sorts after every character, so [prefix, prefix + _PREFIX_END) covers all strings starting with prefix
+_PREFIX_END = '\U0010ffff'
+
+def search_mode(query, mode=None):
+    """Return the mode a search for query runs in: mode if given, else prefix unless query has a wildcard."""
+    if mode is not None:
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}'. Valid options: {', '.join(SEARCH_MODES)}")
+        return mode
+    return 'substring' if '*' in query or '%' in query else 'prefix'
+
+def _search_filter(table, query, mode):
+    """Returns (where, params) matching query in the searched fields."""
+    if mode == 'prefix':
+        fields = _PREFIX_FIELDS[table]
+        where = ' OR '.join(f"({field} >= ? COLLATE NOCASE AND {field} < ? COLLATE NOCASE)" for field in fields)
+        return where, [query, query + _PREFIX_END] * len(fields)
+    _, fields = _SEARCH_FIELDS[table]
+    search_term = '%' + query.replace('*', '%') + '%'
+    return ' OR '.join(f"{field} LIKE ?" for field in fields), [search_term] * len(fields)
+
+def _build_search(table, query, limit=None, offset=0, mode=None):
+    """Returns (sql, params) selecting the ranked matches of query, or one page of them."""
+    key_column, _ = _SEARCH_FIELDS[table]
+    mode = search_mode(query, mode)
+    where, params = _search_filter(table, query, mode)
+    fields = _PREFIX_FIELDS[table] if mode == 'prefix' else _SEARCH_FIELDS[table][1]
+    term = query.replace('*', '').replace('%', '')
+    exact = ' OR '.join(f"{field} = ? COLLATE NOCASE" for field in fields)
+    prefix = ' OR '.join(f"{field} LIKE ?" for field in fields)
+    params += [term] * len(fields) + [term + '%'] * len(fields)
+    sql = (f"SELECT * FROM {table} WHERE {where} "
+           f"ORDER BY CASE WHEN {exact} THEN 0 WHEN {prefix} THEN 1 ELSE 2 END, "
+           f"{fields[0]} COLLATE NOCASE, {key_column}")
+    if limit is not None:
+        sql += " LIMIT ? OFFSET ?"
+        params += [limit, offset]
+    return sql, params
+
+def _count_search_matches(table, query, cap, mode=None):
+    """
+    Count the matches of query, stopping after cap of them.
+
+    Prefix and fuzzy matches are counted exactly; it only takes index lookups.
+    Past the cap, substring matches are estimated: the scan runs in key order,
+    so the share of the key range it covered before finding cap + 1 matches is
+    scaled up to the whole table.
+
+    Returns:
+        tuple: (count, estimated)
+    """
+    key_column, _ = _SEARCH_FIELDS[table]
+    mode = search_mode(query, mode)
+    conn = get_db_connection()
+    if conn is None:
+        return 0, False
+
+    cursor = conn.cursor()
+    try:
+        if mode == 'fuzzy':
+            return _count_fuzzy_matches(cursor, table, query), False
+        where, params = _search_filter(table, query, mode)
+        if mode == 'prefix':
+            return cursor.execute(f"SELECT count(*) FROM {table} WHERE {where}", params).fetchone()[0], False
+        cursor.execute(f"""
+            SELECT count(*), max({key_column}) FROM (
+                SELECT {key_column} FROM {table} WHERE {where} ORDER BY {key_column} LIMIT ?
+            )
+        """, params + [cap + 1])
+        count, last_key = cursor.fetchone()
+        if count <= cap:
+            return count, False
+        max_key = cursor.execute(f"SELECT max({key_column}) FROM {table}").fetchone()[0]
+        return max(count, round(count * max_key / last_key)), True
+    except sqlite3.Error as e:
+        print(f"Database error counting {table.lower()} matches: {e}")
+        return 0, False
+    finally:
+        if cursor: cursor.close()
+        if conn: conn.close()
+
+# --- Fuzzy Search ---
+# Migration 11 keeps each distinct name (and contact email) once in FuzzyTerms,
+# indexed by an FTS5 trigram table per entity. A fuzzy search takes, per field,
+# the FUZZY_CANDIDATES terms sharing the most trigrams with the words of the
+# query (rare trigrams count more, bm25), re-ranks them by Jaro-Winkler
+# similarity, and looks up the records using the terms that score
+# FUZZY_MIN_SCORE or more through the NOCASE indexes of migration 10, so
+# "Jonh Smtih" finds John Smith.
+
+# Trigram index candidates re-ranked per fuzzy search
+FUZZY_CANDIDATES = int(os.environ.get('CRM_FUZZY_CANDIDATES', 200))
+
+# Lowest Jaro-Winkler similarity (0.0-1.0) of a fuzzy match
+FUZZY_MIN_SCORE = float(os.environ.get('CRM_FUZZY_MIN_SCORE', 0.85))
+
+# table -> (trigram index, {FuzzyTerms field: expression it was taken from})
+_FUZZY_FIELDS = {
+    'Accounts': ('AccountTermTrigrams', {'name': 'name'}),
+    'Contacts': ('ContactTermTrigrams', {'full_name': "first_name || ' ' || last_name", 'email': 'email'}),
+    'Opportunities': ('OpportunityTermTrigrams', {'name': 'name'}),
+}
+
+_WORD_SEPARATOR = re.compile(r'[\W_]+')
+
+def _trigram_query(query, all_words=True):
+    """
+    FTS5 MATCH expression for the trigrams of query, padded and split into
+    words like the indexed terms (see migrations._PADDED_TERM): with all_words,
+    terms must share a trigram with every word, otherwise with any word.
+    Returns None if query is blank.
+    """
+    text = query.lower()
+    for separator in '.@_-':
+        text = text.replace(separator, ' ')
+    groups = []
+    for word in text.split():
+        padded = f" {word} "
+        trigrams = dict.fromkeys(padded[i:i + 3] for i in range(len(padded) - 2))
+        groups.append(' OR '.join('"' + trigram.replace('"', '""') + '"' for trigram in trigrams))
+    if not groups:
+        return None
+    return ' AND '.join(f"({group})" for group in groups) if all_words else ' OR '.join(groups)
+
+def fuzzy_score(query, text):
+    """
+    Similarity of query to text (0.0-1.0): the best Jaro-Winkler score against
+    the whole text or any run of as many words as the query has, so a query
+    can match part of a name or email ("smtih" ~ "barbara.smith@example.com").
+    """
+    if not text:
+        return 0.0
+    query = ' '.join(_WORD_SEPARATOR.split(fold(query))).strip()
+    words = [word for word in _WORD_SEPARATOR.split(fold(text)) if word]
+    width = len(query.split())
+    spans = {' '.join(words)} | {' '.join(words[i:i + width]) for i in range(len(words) - width + 1)}
+    return max(jaro_winkler(query, span) for span in spans)
+
+def _fuzzy_terms(cursor, table, query):
+    """Returns [(field, term, score)] of the terms similar to query, best first."""
+    index, fields = _FUZZY_FIELDS[table]
+    if not query.split():
+        return []
+    # Terms sharing a trigram with every word first; with any word only if that finds nothing
+    searches = [_trigram_query(query)]
+    if len(query.split()) > 1:
+        searches.append(_trigram_query(query, all_words=False))
+    scored = []
+    for match in searches:
+        # Per field, so that e.g. a million similar emails do not crowd out the names
+        for field in fields:
+            # Names are in the emails too; searching the emails only pays off for email-like queries
+            if field == 'email' and '@' not in query and '.' not in query:
+                continue
+            candidates = cursor.execute(f"""
+                SELECT f.term
+                FROM (SELECT rowid FROM {index} WHERE {index} MATCH ? ORDER BY rank LIMIT ?) c
+                JOIN FuzzyTerms f ON f.term_id = c.rowid
+            """, (f"{field} : ({match})", FUZZY_CANDIDATES)).fetchall()
+            for (term,) in candidates:
+                score = fuzzy_score(query, term)
+                if score >= FUZZY_MIN_SCORE:
+                    scored.append((field, term, score))
+        if scored:
+            break
+    return sorted(scored, key=lambda term: -term[2])
+
+def _fuzzy_select(table, terms):
+    """Returns (sql, params) of the keys of the records using terms, with their best score."""
+    key_column, _ = _SEARCH_FIELDS[table]
+    _, fields = _FUZZY_FIELDS[table]
+    values = ', '.join('(?, ?, ?)' for _ in terms)
+    by_field = ' UNION ALL '.join(
+        f"SELECT t.{key_column} AS record_id, m.score FROM fuzzy_terms m "
+        f"JOIN {table} t ON m.field = '{field}' AND {expression} = m.term COLLATE NOCASE"
+        for field, expression in fields.items())
+    sql = (f"WITH fuzzy_terms(field, term, score) AS (VALUES {values}) "
+           f"SELECT record_id, MAX(score) AS score FROM ({by_field}) GROUP BY record_id")
+    return sql, [value for term in terms for value in term]
+
+def _fuzzy_matches(cursor, table, query, limit=None, offset=0):
+    """Rows of table similar to query, most similar first (ties by ID)."""
+    key_column, _ = _SEARCH_FIELDS[table]
+    terms = _fuzzy_terms(cursor, table, query)
+    if not terms:
+        return []
+    matches, params = _fuzzy_select(table, terms)
+    sql = (f"SELECT t.* FROM ({matches}) matches JOIN {table} t ON t.{key_column} = matches.record_id "
+           f"ORDER BY matches.score DESC, t.{key_column}")
+    if limit is not None:
+        sql += " LIMIT ? OFFSET ?"
+        params += [limit, offset]
+    return cursor.execute(sql, params).fetchall()
+
+def _count_fuzzy_matches(cursor, table, query):
+    terms = _fuzzy_terms(cursor, table, query)
+    if not terms:
+        return 0
+    matches, params = _fuzzy_select(table, terms)
+    return cursor.execute(f"SELECT count(*) FROM ({matches})", params).fetchone()[0]
+
+def _search_rows(cursor, table, query, limit, offset, mode):
+    """Run a search on cursor and return the rows of the requested page."""
+    if search_mode(query, mode) == 'fuzzy':
+        return _fuzzy_matches(cursor, table, query, limit, offset)
+    cursor.execute(*_build_search(table, query, limit, offset, mode))
+    return cursor.fetchall()
+
+# --- Statement Builders ---
+# Each builder returns the (sql, params) of one write. The DAL functions below
+# execute them directly, and write_queue.py runs the same statements on its
+# group-commit writer thread (used by AsyncCRM and the HTTP API).
+
+def _build_update(table, key_column, key_value, fields):
+    """
+    Build an UPDATE that sets only the fields whose value is not None.
+    Returns (sql, params), or None if there is nothing to update.
+    """
+    updates = []
+    params = []
+    for column, value in fields.items():
+        if value is not None:
+            updates.append(f"{column} = ?")
+            params.append(value)
+
+    if not updates:
+        return None
+
+    params.append(key_value)
+    return f"UPDATE {table} SET {', '.join(updates)} WHERE {key_column} = ?", params
+
+def build_account_insert(name, industry_id=None, description=None, website=None, street=None, city=None, state=None, zip=None, country=None):
+    """Returns (sql, params) to insert an account."""
+    return (
+        """INSERT INTO Accounts 
+           (name, industry_id, description, website, street, city, state, zip, country) 
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        (name, industry_id, description, website, street, city, state, zip, country)
+    )
+
+def build_account_update(account_id, name=None, industry_id=None, description=None, website=None,
+                         street=None, city=None, state=None, zip=None, country=None):
+    """Returns (sql, params) to update an account's non-None fields, or None if there are none."""
+    return _build_update('Accounts', 'account_id', account_id, {
+        'name': name, 'industry_id': industry_id, 'description': description, 'website': website,
+        'street': street, 'city': city, 'state': state, 'zip': zip, 'country': country,
+    })
+
+def build_account_delete(account_id):
+    """Returns (sql, params) to delete an account."""
+    return "DELETE FROM Accounts WHERE account_id = ?", (account_id,)
+
+def build_contact_insert(first_name, last_name, email, phone, account_id, title=None, description=None,
+                         website=None, street=None, city=None, state=None, zip=None, country=None):
+    """Returns (sql, params) to insert a contact."""
+    return (
+        """
+        INSERT INTO Contacts 
+        (first_name, last_name, email, phone, account_id, title, description, 
+        website, street, city, state, zip, country) 
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (first_name, last_name, email, phone, account_id, title, description,
+         website, street, city, state, zip, country)
+    )
+
+def build_contact_update(contact_id, first_name=None, last_name=None, email=None, phone=None, account_id=None,
+                         title=None, description=None, website=None, street=None, city=None, state=None, zip=None, country=None):
+    """Returns (sql, params) to update a contact's non-None fields, or None if there are none."""
+    return _build_update('Contacts', 'contact_id', contact_id, {
+        'first_name': first_name, 'last_name': last_name, 'email': email, 'phone': phone,
+        'account_id': account_id, 'title': title, 'description': description, 'website': website,
+        'street': street, 'city': city, 'state': state, 'zip': zip, 'country': country,
+    })
+
+def build_contact_delete(contact_id):
+    """Returns (sql, params) to delete a contact."""
+    return "DELETE FROM Contacts WHERE contact_id = ?", (contact_id,)
+
+# --- Storage Layout ---
+# Databases converted with `migrations compact` store Opportunities.amount as
+# integer cents and close_date as integer days (see migrations.COMPACT_LAYOUT).
+# Reads see the usual columns either way; writes go to the stored columns.
+
+_compact_layouts = {}  # database path -> bool
+
+def _uses_compact_layout():
+    """True if the current database uses the compact layout (checked once per database)."""
+    path = database.current_database_path()
+    compact = _compact_layouts.get(path)
+    if compact is None:
+        conn = get_db_connection()
+        if conn is None:
+            return False
+        try:
+            columns = [row[1] for row in conn.execute("PRAGMA table_xinfo(Opportunities)").fetchall()]
+        except sqlite3.Error:
+            return False
+        finally:
+            conn.close()
+        if not columns:
+            return False  # not created yet; check again next time
+        compact = _compact_layouts[path] = 'amount_cents' in columns
+    return compact
+
+def clear_layout_cache():
+    """Forget the detected storage layouts (after converting a database)."""
+    _compact_layouts.clear()
+
+def _to_cents(amount):
+    """Amount -> integer cents. Values that are not numbers are passed through for STRICT to reject."""
+    if amount is None or amount == '':
+        return None
+    try:
+        return int((Decimal(str(amount)) * 100).to_integral_value(ROUND_HALF_UP))
+    except (InvalidOperation, ValueError, OverflowError):
+        return amount
+
+def _to_day(close_date):
+    """'YYYY-MM-DD' -> days since 1970-01-01. Other text is passed through for STRICT to reject."""
+    if close_date is None or close_date == '':
+        return None
+    try:
+        return (date.fromisoformat(str(close_date)[:10]) - _EPOCH_DATE).days
+    except ValueError:
+        return close_date
+
+_EPOCH_DATE = date(1970, 1, 1)
+
+def _resolve_stage_id(stage):
+    """Turn a stage picklist ID or text value into a picklist_value_id (None if unknown)."""
+    from .picklist import get_picklist_id_by_value
+    if isinstance(stage, int):
+        return stage
+    return get_picklist_id_by_value('stage', stage)
+
+def build_opportunity_insert(name, description, amount, close_date, account_id, contact_id, stage=None):
+    """
+    Returns (sql, params) to insert an opportunity.
+    A missing stage is replaced by the default stage picklist value.
+    """
+    from .picklist import get_picklist_values
+
+    stage_id = None
+    if stage:
+        stage_id = _resolve_stage_id(stage)
+    else:
+        # Use default stage if none provided
+        stages = get_picklist_values('stage')
+        if stages:
+            default_stage = next((s for s in stages if s['is_default']), stages[0] if stages else None)
+            if default_stage:
+                stage_id = default_stage['picklist_value_id']
+
+    if _uses_compact_layout():
+        return (
+            "INSERT INTO Opportunities (name, description, amount_cents, close_day, account_id, contact_id, stage_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (name, description, _to_cents(amount), _to_day(close_date), account_id, contact_id, stage_id)
+        )
+    return (
+        "INSERT INTO Opportunities (name, description, amount, close_date, account_id, contact_id, stage_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (name, description, amount, close_date, account_id, contact_id, stage_id)
+    )
+
+def build_opportunity_update(opportunity_id, name=None, description=None, amount=None, close_date=None,
+                             account_id=None, contact_id=None, stage=None):
+    """
+    Returns (sql, params) to update an opportunity's non-None fields, or None if there are none.
+    A stage that does not match a picklist value is left unchanged.
+    """
+    stage_id = _resolve_stage_id(stage) if stage is not None else None
+    if _uses_compact_layout():
+        amount_field, close_field = {'amount_cents': _to_cents(amount)}, {'close_day': _to_day(close_date)}
+    else:
+        amount_field, close_field = {'amount': amount}, {'close_date': close_date}
+    return _build_update('Opportunities', 'opportunity_id', opportunity_id, {
+        'name': name, 'description': description, **amount_field, **close_field,
+        'account_id': account_id, 'contact_id': contact_id, 'stage_id': stage_id or None,
+    })
+
+def build_opportunity_delete(opportunity_id):
+    """Returns (sql, params) to delete an opportunity."""
+    return "DELETE FROM Opportunities WHERE opportunity_id = ?", (opportunity_id,)
+
+def _execute_write(statement):
+    """
+    Execute one write statement and commit it, retrying busy/locked errors
+    according to the retry policy (see retry.py).
+
+    Returns:
+        tuple: (lastrowid, rowcount) of the statement
+
+    Raises:
+        sqlite3.Error: If the write fails, or is still busy after the last retry
+    """
+    return _execute_writes([statement])[0]
+
+def _execute_writes(statements):
+    """
+    Execute several write statements in one transaction and commit them together,
+    retrying the whole transaction on busy/locked errors.
+
+    Returns:
+        list: (lastrowid, rowcount) of each statement
+
+    Raises:
+        sqlite3.Error: If a write fails, or is still busy after the last retry
+    """
+    def attempt():
+        conn = get_db_connection()
+        if conn is None:
+            raise sqlite3.OperationalError("unable to open database")
+        cursor = conn.cursor()
+        try:
+            results = []
+            for statement in statements:
+                cursor.execute(*statement)
+                results.append((cursor.lastrowid, cursor.rowcount))
+            conn.commit()
+            return results
+        except sqlite3.Error:
+            # A failed COMMIT leaves the transaction open; roll it back so the retry
+            # starts clean. Grouped transactions belong to their owner, so leave those alone.
+            grouped = isinstance(conn, SharedConnection) and conn.defer_commit
+            if not grouped and conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+
+    return run_with_retry(attempt)
 
 # --- Account Operations ---
 def create_account(name, industry_id=None, description=None, website=None, street=None, city=None, state=None, zip=None, country=None):
@@ -16,20 +612,10 @@ def create_account(name, industry_id=None, description=None, website=None, stree
     
     Returns the account_id on success, None on failure.
     """
-    conn = get_db_connection()
-    if conn is None:
-        return None
-
-    cursor = conn.cursor()
     try:
-        cursor.execute(
-            """INSERT INTO Accounts 
-               (name, industry_id, description, website, street, city, state, zip, country) 
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""", 
-            (name, industry_id, description, website, street, city, state, zip, country)
-        )
-        conn.commit()
-        account_id = cursor.lastrowid
+        account_id, _ = _execute_write(build_account_insert(name, industry_id, description, website, street, city, state, zip, country))
+        if account_id is not None:
+            _notify_write('Accounts', account_id, 'create')
         return account_id
     except sqlite3.IntegrityError as e:
         # Handle cases like unique constraints if added later
@@ -38,15 +624,18 @@ def create_account(name, industry_id=None, description=None, website=None, stree
     except sqlite3.Error as e:
         print(f"Database error creating account: {e}")
         return None
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
 
 def get_account(account_id):
     """
     Retrieve an account from the database by its ID.
     Returns the account row (as a dict-like object) on success, None if not found or on error.
     """
+    cache = _active_cache()
+    if cache is not None:
+        cached = cache.get('Accounts', account_id)
+        if cached is not None:
+            return cached
+
     conn = get_db_connection()
     if conn is None:
         return None
@@ -55,6 +644,8 @@ def get_account(account_id):
     try:
         cursor.execute("SELECT * FROM Accounts WHERE account_id = ?", (account_id,))
         account = cursor.fetchone()
+        if cache is not None:
+            cache.put('Accounts', account_id, account)
         return account
     except sqlite3.Error as e:
         print(f"Database error getting account: {e}")
@@ -63,9 +654,14 @@ def get_account(account_id):
         if cursor: cursor.close()
         if conn: conn.close()
 
-def list_accounts():
+def list_accounts(limit=None, offset=0):
     """
-    Retrieve all accounts from the database.
+    Retrieve all accounts from the database, or one page of them.
+
+    Args:
+        limit (int, optional): Maximum number of rows to return (ordered by ID)
+        offset (int, optional): Number of rows to skip when limit is given
+
     Returns a list of account rows.
     """
     conn = get_db_connection()
@@ -74,7 +670,10 @@ def list_accounts():
 
     cursor = conn.cursor()
     try:
-        cursor.execute("SELECT * FROM Accounts")
+        if limit is None:
+            cursor.execute("SELECT * FROM Accounts")
+        else:
+            cursor.execute("SELECT * FROM Accounts ORDER BY account_id LIMIT ? OFFSET ?", (limit, offset))
         accounts = cursor.fetchall()
         return accounts
     except sqlite3.Error as e:
@@ -84,9 +683,20 @@ def list_accounts():
         if cursor: cursor.close()
         if conn: conn.close()
 
-def search_accounts(query):
+def search_accounts(query, limit=None, offset=0, mode=None):
     """
-    Search for accounts by name (case-insensitive, partial match).
+    Search for accounts by name (case-insensitive). Prefix mode matches names
+    starting with query; substring mode matches query anywhere in the name.
+
+    Exact matches come first, then prefix matches, then other partial matches;
+    fuzzy matches are ranked by similarity to query.
+
+    Args:
+        query (str): Text to search for ('*' or '%' are wildcards in substring mode)
+        limit (int, optional): Maximum number of rows to return
+        offset (int, optional): Number of ranked rows to skip when limit is given
+        mode (str, optional): 'prefix', 'substring' or 'fuzzy' (default: prefix unless query has a wildcard)
+
     Returns a list of matching account rows.
     """
     conn = get_db_connection()
@@ -95,10 +705,7 @@ def search_accounts(query):
 
     cursor = conn.cursor()
     try:
-        # Use LIKE for partial, case-insensitive search
-        search_term = '%' + query + '%'
-        cursor.execute("SELECT * FROM Accounts WHERE name LIKE ?", (search_term,))
-        accounts = cursor.fetchall()
+        accounts = _search_rows(cursor, 'Accounts', query, limit, offset, mode)
         return accounts
     except sqlite3.Error as e:
         print(f"Database error searching accounts: {e}")
@@ -107,6 +714,14 @@ def search_accounts(query):
         if cursor: cursor.close()
         if conn: conn.close()
 
+def count_account_matches(query, cap=SEARCH_COUNT_CAP, mode=None):
+    """
+    Count the accounts search_accounts would return for query.
+    Returns (count, estimated); estimated is True when a substring search had
+    more than cap matches and count is an estimate.
+    """
+    return _count_search_matches('Accounts', query, cap, mode)
+
 
 def update_account(account_id, name=None, industry_id=None, description=None, website=None, 
                 street=None, city=None, state=None, zip=None, country=None):
@@ -117,81 +732,77 @@ def update_account(account_id, name=None, industry_id=None, description=None, we
     
     Returns True if updated, False otherwise.
     """
-    conn = get_db_connection()
-    if conn is None:
-        return False
-
-    cursor = conn.cursor()
-    updates = []
-    params = []
-
-    if name is not None:
-        updates.append("name = ?")
-        params.append(name)
-    if industry_id is not None:
-        updates.append("industry_id = ?")
-        params.append(industry_id)
-    if description is not None:
-        updates.append("description = ?")
-        params.append(description)
-    if website is not None:
-        updates.append("website = ?")
-        params.append(website)
-    if street is not None:
-        updates.append("street = ?")
-        params.append(street)
-    if city is not None:
-        updates.append("city = ?")
-        params.append(city)
-    if state is not None:
-        updates.append("state = ?")
-        params.append(state)
-    if zip is not None:
-        updates.append("zip = ?")
-        params.append(zip)
-    if country is not None:
-        updates.append("country = ?")
-        params.append(country)
-
-    if not updates:
+    statement = build_account_update(account_id, name, industry_id, description, website,
+                                     street, city, state, zip, country)
+    if statement is None:
         # No fields to update
         return False
 
-    query = f"UPDATE Accounts SET {', '.join(updates)} WHERE account_id = ?"
-    params.append(account_id)
-
     try:
-        cursor.execute(query, params)
-        conn.commit()
-        return cursor.rowcount > 0
+        _, rowcount = _execute_write(statement)
+        _refresh_cached('Accounts', 'account_id', account_id)
+        if rowcount > 0:
+            _notify_write('Accounts', account_id, 'update')
+        return rowcount > 0
     except sqlite3.Error as e:
         print(f"Database error updating account: {e}")
         return False
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
 
 def delete_account(account_id):
     """
     Delete an account from the database.
     Returns True if deleted, False otherwise.
     """
-    conn = get_db_connection()
-    if conn is None:
-        return False
-
-    cursor = conn.cursor()
     try:
         # Consider adding ON DELETE CASCADE to foreign keys or handle related records here
-        cursor.execute("DELETE FROM Accounts WHERE account_id = ?", (account_id,))
-        conn.commit()
-        return cursor.rowcount > 0
+        _, rowcount = _execute_write(build_account_delete(account_id))
+        _forget_cached('Accounts', account_id)
+        if rowcount > 0:
+            _notify_write('Accounts', account_id, 'delete')
+        return rowcount > 0
     except sqlite3.Error as e:
         print(f"Database error deleting account: {e}")
         return False
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
+
+def merge_accounts(keep_id, remove_id):
+    """
+    Merge a duplicate account into another one.
+
+    The contacts and opportunities of remove_id are moved to keep_id, fields that
+    are empty on keep_id are filled from remove_id, and remove_id is deleted, all
+    in one transaction.
+
+    Args:
+        keep_id (int): The account that remains
+        remove_id (int): The duplicate account to fold into it
+
+    Returns:
+        bool: True if merged, False if either account does not exist or the merge failed
+    """
+    if keep_id == remove_id:
+        print("Error: Cannot merge an account into itself.")
+        return False
+    both_exist = ("EXISTS (SELECT 1 FROM Accounts WHERE account_id = :keep) "
+                  "AND EXISTS (SELECT 1 FROM Accounts WHERE account_id = :remove)")
+    fill = ', '.join(f"{column} = COALESCE({column}, (SELECT {column} FROM Accounts WHERE account_id = :remove))"
+                     for column in _ACCOUNT_MERGE_COLUMNS)
+    ids = {'keep': keep_id, 'remove': remove_id}
+    try:
+        results = _execute_writes([
+            (f"UPDATE Contacts SET account_id = :keep WHERE account_id = :remove AND {both_exist}", ids),
+            (f"UPDATE Opportunities SET account_id = :keep WHERE account_id = :remove AND {both_exist}", ids),
+            (f"UPDATE Accounts SET {fill} WHERE account_id = :keep AND {both_exist}", ids),
+            ("DELETE FROM Accounts WHERE account_id = :remove "
+             "AND EXISTS (SELECT 1 FROM Accounts WHERE account_id = :keep)", ids),
+        ])
+    except sqlite3.Error as e:
+        print(f"Database error merging accounts: {e}")
+        return False
+    if results[-1][1] == 0:
+        print(f"Error: Account {keep_id} or {remove_id} not found.")
+        return False
+    _after_merge('Accounts', 'account_id', keep_id, remove_id, moved_children=results[0][1] + results[1][1])
+    return True
 
 # --- Contact Operations ---
 def create_contact(first_name, last_name, email, phone, account_id, title=None, description=None, 
@@ -200,21 +811,11 @@ def create_contact(first_name, last_name, email, phone, account_id, title=None,
     Create a new contact in the database.
     Returns the contact_id on success, None on failure.
     """
-    conn = get_db_connection()
-    if conn is None:
-        return None
-
-    cursor = conn.cursor()
     try:
-        cursor.execute("""
-            INSERT INTO Contacts 
-            (first_name, last_name, email, phone, account_id, title, description, 
-            website, street, city, state, zip, country) 
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (first_name, last_name, email, phone, account_id, title, description, 
-              website, street, city, state, zip, country))
-        conn.commit()
-        contact_id = cursor.lastrowid
+        contact_id, _ = _execute_write(build_contact_insert(first_name, last_name, email, phone, account_id, title, description,
+                                                            website, street, city, state, zip, country))
+        if contact_id is not None:
+            _notify_write('Contacts', contact_id, 'create')
         return contact_id
     except sqlite3.IntegrityError as e:
         print(f"Integrity error creating contact: {e}")
@@ -222,15 +823,18 @@ def create_contact(first_name, last_name, email, phone, account_id, title=None,
     except sqlite3.Error as e:
         print(f"Database error creating contact: {e}")
         return None
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
 
 def get_contact(contact_id):
     """
     Retrieve a contact from the database by its ID.
     Returns the contact row (as a dict-like object) on success, None if not found or on error.
     """
+    cache = _active_cache()
+    if cache is not None:
+        cached = cache.get('Contacts', contact_id)
+        if cached is not None:
+            return cached
+
     conn = get_db_connection()
     if conn is None:
         return None
@@ -239,6 +843,8 @@ def get_contact(contact_id):
     try:
         cursor.execute("SELECT * FROM Contacts WHERE contact_id = ?", (contact_id,))
         contact = cursor.fetchone()
+        if cache is not None:
+            cache.put('Contacts', contact_id, contact)
         return contact
     except sqlite3.Error as e:
         print(f"Database error getting contact: {e}")
@@ -247,9 +853,14 @@ def get_contact(contact_id):
         if cursor: cursor.close()
         if conn: conn.close()
 
-def list_contacts():
+def list_contacts(limit=None, offset=0):
     """
-    Retrieve all contacts from the database.
+    Retrieve all contacts from the database, or one page of them.
+
+    Args:
+        limit (int, optional): Maximum number of rows to return (ordered by ID)
+        offset (int, optional): Number of rows to skip when limit is given
+
     Returns a list of contact rows.
     """
     conn = get_db_connection()
@@ -258,7 +869,10 @@ def list_contacts():
 
     cursor = conn.cursor()
     try:
-        cursor.execute("SELECT * FROM Contacts")
+        if limit is None:
+            cursor.execute("SELECT * FROM Contacts")
+        else:
+            cursor.execute("SELECT * FROM Contacts ORDER BY contact_id LIMIT ? OFFSET ?", (limit, offset))
         contacts = cursor.fetchall()
         return contacts
     except sqlite3.Error as e:
@@ -268,9 +882,21 @@ def list_contacts():
         if cursor: cursor.close()
         if conn: conn.close()
 
-def search_contacts(query):
+def search_contacts(query, limit=None, offset=0, mode=None):
     """
-    Search for contacts by first name, last name, or email (case-insensitive, partial match).
+    Search for contacts by first name, last name, full name ("First Last"), or email
+    (case-insensitive). Prefix mode matches full names, last names and emails
+    starting with query; substring mode matches query anywhere in them.
+
+    Exact matches come first, then prefix matches, then other partial matches;
+    fuzzy matches are ranked by similarity to query.
+
+    Args:
+        query (str): Text to search for ('*' or '%' are wildcards in substring mode)
+        limit (int, optional): Maximum number of rows to return
+        offset (int, optional): Number of ranked rows to skip when limit is given
+        mode (str, optional): 'prefix', 'substring' or 'fuzzy' (default: prefix unless query has a wildcard)
+
     Returns a list of matching contact rows.
     """
     conn = get_db_connection()
@@ -279,13 +905,7 @@ def search_contacts(query):
 
     cursor = conn.cursor()
     try:
-        # Use LIKE for partial, case-insensitive search across multiple fields
-        search_term = '%' + query + '%'
-        cursor.execute("""
-            SELECT * FROM Contacts
-            WHERE first_name LIKE ? OR last_name LIKE ? OR email LIKE ?
-        """, (search_term, search_term, search_term))
-        contacts = cursor.fetchall()
+        contacts = _search_rows(cursor, 'Contacts', query, limit, offset, mode)
         return contacts
     except sqlite3.Error as e:
         print(f"Database error searching contacts: {e}")
@@ -294,6 +914,14 @@ def search_contacts(query):
         if cursor: cursor.close()
         if conn: conn.close()
 
+def count_contact_matches(query, cap=SEARCH_COUNT_CAP, mode=None):
+    """
+    Count the contacts search_contacts would return for query.
+    Returns (count, estimated); estimated is True when a substring search had
+    more than cap matches and count is an estimate.
+    """
+    return _count_search_matches('Contacts', query, cap, mode)
+
 def get_contacts_by_account(account_id):
     """
     Retrieve all contacts linked to a specific account.
@@ -322,95 +950,78 @@ def update_contact(contact_id, first_name=None, last_name=None, email=None, phon
     Update an existing contact in the database.
     Returns True if updated, False otherwise.
     """
-    conn = get_db_connection()
-    if conn is None:
-        return False
-
-    cursor = conn.cursor()
-    updates = []
-    params = []
-
-    if first_name is not None:
-        updates.append("first_name = ?")
-        params.append(first_name)
-    if last_name is not None:
-        updates.append("last_name = ?")
-        params.append(last_name)
-    if email is not None:
-        updates.append("email = ?")
-        params.append(email)
-    if phone is not None:
-        updates.append("phone = ?")
-        params.append(phone)
-    if account_id is not None:
-        updates.append("account_id = ?")
-        params.append(account_id)
-    if title is not None:
-        updates.append("title = ?")
-        params.append(title)
-    if description is not None:
-        updates.append("description = ?")
-        params.append(description)
-    if website is not None:
-        updates.append("website = ?")
-        params.append(website)
-    if street is not None:
-        updates.append("street = ?")
-        params.append(street)
-    if city is not None:
-        updates.append("city = ?")
-        params.append(city)
-    if state is not None:
-        updates.append("state = ?")
-        params.append(state)
-    if zip is not None:
-        updates.append("zip = ?")
-        params.append(zip)
-    if country is not None:
-        updates.append("country = ?")
-        params.append(country)
-
-    if not updates:
+    statement = build_contact_update(contact_id, first_name, last_name, email, phone, account_id,
+                                     title, description, website, street, city, state, zip, country)
+    if statement is None:
         # No fields to update
         return False
 
-    query = f"UPDATE Contacts SET {', '.join(updates)} WHERE contact_id = ?"
-    params.append(contact_id)
-
     try:
-        cursor.execute(query, params)
-        conn.commit()
-        return cursor.rowcount > 0
+        _, rowcount = _execute_write(statement)
+        _refresh_cached('Contacts', 'contact_id', contact_id)
+        if rowcount > 0:
+            _notify_write('Contacts', contact_id, 'update')
+        return rowcount > 0
     except sqlite3.IntegrityError as e:
         print(f"Integrity error updating contact: {e}")
         return False
     except sqlite3.Error as e:
         print(f"Database error updating contact: {e}")
         return False
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
 
 def delete_contact(contact_id):
     """
     Delete a contact from the database.
     Returns True if deleted, False otherwise.
     """
-    conn = get_db_connection()
-    if conn is None:
+    try:
+        _, rowcount = _execute_write(build_contact_delete(contact_id))
+        _forget_cached('Contacts', contact_id)
+        if rowcount > 0:
+            _notify_write('Contacts', contact_id, 'delete')
+        return rowcount > 0
+    except sqlite3.Error as e:
+        print(f"Database error deleting contact: {e}")
         return False
 
-    cursor = conn.cursor()
+def merge_contacts(keep_id, remove_id):
+    """
+    Merge a duplicate contact into another one.
+
+    The opportunities of remove_id are moved to keep_id, fields that are empty on
+    keep_id are filled from remove_id, and remove_id is deleted, all in one
+    transaction. keep_id keeps its own name and email.
+
+    Args:
+        keep_id (int): The contact that remains
+        remove_id (int): The duplicate contact to fold into it
+
+    Returns:
+        bool: True if merged, False if either contact does not exist or the merge failed
+    """
+    if keep_id == remove_id:
+        print("Error: Cannot merge a contact into itself.")
+        return False
+    both_exist = ("EXISTS (SELECT 1 FROM Contacts WHERE contact_id = :keep) "
+                  "AND EXISTS (SELECT 1 FROM Contacts WHERE contact_id = :remove)")
+    fill = ', '.join(f"{column} = COALESCE({column}, (SELECT {column} FROM Contacts WHERE contact_id = :remove))"
+                     for column in _CONTACT_MERGE_COLUMNS)
+    ids = {'keep': keep_id, 'remove': remove_id}
     try:
-        cursor.execute("DELETE FROM Contacts WHERE contact_id = ?", (contact_id,))
-        conn.commit()
-        return cursor.rowcount > 0
+        results = _execute_writes([
+            (f"UPDATE Opportunities SET contact_id = :keep WHERE contact_id = :remove AND {both_exist}", ids),
+            (f"UPDATE Contacts SET {fill} WHERE contact_id = :keep AND {both_exist}", ids),
+            ("DELETE FROM Contacts WHERE contact_id = :remove "
+             "AND EXISTS (SELECT 1 FROM Contacts WHERE contact_id = :keep)", ids),
+        ])
     except sqlite3.Error as e:
-        print(f"Database error deleting contact: {e}")
+        print(f"Database error merging contacts: {e}")
         return False
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
+    if results[-1][1] == 0:
+        print(f"Error: Contact {keep_id} or {remove_id} not found.")
+        return False
+    _after_merge('Contacts', 'contact_id', keep_id, remove_id, moved_children=results[0][1])
+    return True
 
 # --- Opportunity Operations ---
 def create_opportunity(name, description, amount, close_date, account_id, contact_id, stage=None):
@@ -424,35 +1035,10 @@ def create_opportunity(name, description, amount, close_date, account_id, contac
     
     Returns the opportunity_id on success, None on failure.
     """
-    from .picklist import get_picklist_id_by_value, get_picklist_values
-    
-    conn = get_db_connection()
-    if conn is None:
-        return None
-
-    cursor = conn.cursor()
     try:
-        # Handle stage as picklist
-        stage_id = None
-        if stage:
-            if isinstance(stage, int):
-                stage_id = stage
-            else:
-                stage_id = get_picklist_id_by_value('stage', stage)
-        else:
-            # Use default stage if none provided
-            stages = get_picklist_values('stage')
-            if stages:
-                default_stage = next((s for s in stages if s['is_default']), stages[0] if stages else None)
-                if default_stage:
-                    stage_id = default_stage['picklist_value_id']
-
-        cursor.execute(
-            "INSERT INTO Opportunities (name, description, amount, close_date, account_id, contact_id, stage_id) VALUES (?, ?, ?, ?, ?, ?, ?)", 
-            (name, description, amount, close_date, account_id, contact_id, stage_id)
-        )
-        conn.commit()
-        opportunity_id = cursor.lastrowid
+        opportunity_id, _ = _execute_write(build_opportunity_insert(name, description, amount, close_date, account_id, contact_id, stage))
+        if opportunity_id is not None:
+            _notify_write('Opportunities', opportunity_id, 'create')
         return opportunity_id
     except sqlite3.IntegrityError as e:
         print(f"Integrity error creating opportunity: {e}")
@@ -460,15 +1046,18 @@ def create_opportunity(name, description, amount, close_date, account_id, contac
     except sqlite3.Error as e:
         print(f"Database error creating opportunity: {e}")
         return None
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
 
 def get_opportunity(opportunity_id):
     """
     Retrieve an opportunity from the database by its ID.
     Returns the opportunity row (as a dict-like object) on success, None if not found or on error.
     """
+    cache = _active_cache()
+    if cache is not None:
+        cached = cache.get('Opportunities', opportunity_id)
+        if cached is not None:
+            return cached
+
     conn = get_db_connection()
     if conn is None:
         return None
@@ -477,6 +1066,8 @@ def get_opportunity(opportunity_id):
     try:
         cursor.execute("SELECT * FROM Opportunities WHERE opportunity_id = ?", (opportunity_id,))
         opportunity = cursor.fetchone()
+        if cache is not None:
+            cache.put('Opportunities', opportunity_id, opportunity)
         return opportunity
     except sqlite3.Error as e:
         print(f"Database error getting opportunity: {e}")
@@ -485,9 +1076,14 @@ def get_opportunity(opportunity_id):
         if cursor: cursor.close()
         if conn: conn.close()
 
-def list_opportunities():
+def list_opportunities(limit=None, offset=0):
     """
-    Retrieve all opportunities from the database.
+    Retrieve all opportunities from the database, or one page of them.
+
+    Args:
+        limit (int, optional): Maximum number of rows to return (ordered by ID)
+        offset (int, optional): Number of rows to skip when limit is given
+
     Returns a list of opportunity rows.
     """
     conn = get_db_connection()
@@ -496,7 +1092,10 @@ def list_opportunities():
 
     cursor = conn.cursor()
     try:
-        cursor.execute("SELECT * FROM Opportunities")
+        if limit is None:
+            cursor.execute("SELECT * FROM Opportunities")
+        else:
+            cursor.execute("SELECT * FROM Opportunities ORDER BY opportunity_id LIMIT ? OFFSET ?", (limit, offset))
         opportunities = cursor.fetchall()
         return opportunities
     except sqlite3.Error as e:
@@ -506,9 +1105,21 @@ def list_opportunities():
         if cursor: cursor.close()
         if conn: conn.close()
 
-def search_opportunities(query):
+def search_opportunities(query, limit=None, offset=0, mode=None):
     """
-    Search for opportunities by name or description (case-insensitive, partial match).
+    Search for opportunities (case-insensitive). Prefix mode matches names
+    starting with query; substring mode matches query anywhere in the name or
+    description.
+
+    Exact matches come first, then prefix matches, then other partial matches;
+    fuzzy matches are ranked by similarity to query.
+
+    Args:
+        query (str): Text to search for ('*' or '%' are wildcards in substring mode)
+        limit (int, optional): Maximum number of rows to return
+        offset (int, optional): Number of ranked rows to skip when limit is given
+        mode (str, optional): 'prefix', 'substring' or 'fuzzy' (default: prefix unless query has a wildcard)
+
     Returns a list of matching opportunity rows.
     """
     conn = get_db_connection()
@@ -517,13 +1128,7 @@ def search_opportunities(query):
 
     cursor = conn.cursor()
     try:
-        # Use LIKE for partial, case-insensitive search across multiple fields
-        search_term = '%' + query + '%'
-        cursor.execute("""
-            SELECT * FROM Opportunities
-            WHERE name LIKE ? OR description LIKE ?
-        """, (search_term, search_term))
-        opportunities = cursor.fetchall()
+        opportunities = _search_rows(cursor, 'Opportunities', query, limit, offset, mode)
         return opportunities
     except sqlite3.Error as e:
         print(f"Database error searching opportunities: {e}")
@@ -532,6 +1137,14 @@ def search_opportunities(query):
         if cursor: cursor.close()
         if conn: conn.close()
 
+def count_opportunity_matches(query, cap=SEARCH_COUNT_CAP, mode=None):
+    """
+    Count the opportunities search_opportunities would return for query.
+    Returns (count, estimated); estimated is True when a substring search had
+    more than cap matches and count is an estimate.
+    """
+    return _count_search_matches('Opportunities', query, cap, mode)
+
 def get_opportunities_by_account(account_id):
     """
     Retrieve all opportunities linked to a specific account.
@@ -553,6 +1166,76 @@ def get_opportunities_by_account(account_id):
         if cursor: cursor.close()
         if conn: conn.close()
 
+def list_opportunities_by_close_date(start_date=None, end_date=None, limit=None, offset=0):
+    """
+    Retrieve opportunities closing within a date range, earliest first.
+    Uses the indexed close_epoch column instead of comparing close_date text.
+
+    Args:
+        start_date (str, optional): First close date, 'YYYY-MM-DD' (inclusive)
+        end_date (str, optional): Last close date, 'YYYY-MM-DD' (inclusive)
+        limit (int, optional): Maximum number of rows to return
+        offset (int, optional): Number of rows to skip when limit is given
+
+    Returns a list of opportunity rows.
+    """
+    return _list_by_epoch('Opportunities', 'close_epoch', start_date, end_date, limit, offset)
+
+def list_created_between(table, start=None, end=None, limit=None, offset=0):
+    """
+    Retrieve Accounts, Contacts or Opportunities rows created within a UTC time
+    range, oldest first, using the indexed created_epoch column.
+
+    Args:
+        table (str): 'Accounts', 'Contacts' or 'Opportunities'
+        start (str, optional): 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS' (inclusive)
+        end (str, optional): 'YYYY-MM-DD' (the whole day is included) or 'YYYY-MM-DD HH:MM:SS'
+        limit (int, optional): Maximum number of rows to return
+        offset (int, optional): Number of rows to skip when limit is given
+
+    Returns a list of rows.
+    """
+    if table not in _SEARCH_FIELDS:
+        print(f"Error: Unknown table '{table}'. Valid options: {', '.join(_SEARCH_FIELDS)}")
+        return []
+    return _list_by_epoch(table, 'created_epoch', start, end, limit, offset)
+
+def _list_by_epoch(table, column, start, end, limit, offset):
+    """Rows of table whose epoch column lies between two UTC dates/times, ordered by it."""
+    bounds = []
+    params = []
+    for value, operator in ((start, '>='), (end, '<=')):
+        if not value:
+            continue
+        epoch = parse_utc(value)
+        if epoch is None:
+            print(f"Error: Invalid date '{value}'. Use YYYY-MM-DD or YYYY-MM-DD HH:MM:SS.")
+            return []
+        if operator == '<=' and len(value) == 10:
+            epoch += 86399  # a bare end date includes the whole day
+        bounds.append(f"{column} {operator} ?")
+        params.append(epoch)
+    key_column, _ = _SEARCH_FIELDS[table]
+    sql = f"SELECT * FROM {table} WHERE {' AND '.join(bounds) or f'{column} IS NOT NULL'} ORDER BY {column}, {key_column}"
+    if limit is not None:
+        sql += " LIMIT ? OFFSET ?"
+        params += [limit, offset]
+
+    conn = get_db_connection()
+    if conn is None:
+        return []
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+    except sqlite3.Error as e:
+        print(f"Database error listing {table.lower()} by date: {e}")
+        return []
+    finally:
+        if cursor: cursor.close()
+        if conn: conn.close()
+
 
 def update_opportunity(opportunity_id, name=None, description=None, amount=None, close_date=None, account_id=None, contact_id=None, stage=None):
     """
@@ -565,84 +1248,36 @@ def update_opportunity(opportunity_id, name=None, description=None, amount=None,
     
     Returns True if updated, False otherwise.
     """
-    from .picklist import get_picklist_id_by_value
-    
-    conn = get_db_connection()
-    if conn is None:
-        return False
-
-    cursor = conn.cursor()
-    updates = []
-    params = []
-
-    if name is not None:
-        updates.append("name = ?")
-        params.append(name)
-    if description is not None:
-        updates.append("description = ?")
-        params.append(description)
-    if amount is not None:
-        updates.append("amount = ?")
-        params.append(amount)
-    if close_date is not None:
-        updates.append("close_date = ?")
-        params.append(close_date)
-    if account_id is not None:
-        updates.append("account_id = ?")
-        params.append(account_id)
-    if contact_id is not None:
-        updates.append("contact_id = ?")
-        params.append(contact_id)
-    if stage is not None:
-        # Handle stage as picklist
-        stage_id = None
-        if isinstance(stage, int):
-            stage_id = stage
-        else:
-            stage_id = get_picklist_id_by_value('stage', stage)
-            
-        if stage_id:
-            updates.append("stage_id = ?")
-            params.append(stage_id)
-
-    if not updates:
+    statement = build_opportunity_update(opportunity_id, name, description, amount, close_date,
+                                         account_id, contact_id, stage)
+    if statement is None:
         # No fields to update
         return False
 
-    query = f"UPDATE Opportunities SET {', '.join(updates)} WHERE opportunity_id = ?"
-    params.append(opportunity_id)
-
     try:
-        cursor.execute(query, params)
-        conn.commit()
-        return cursor.rowcount > 0
+        _, rowcount = _execute_write(statement)
+        _refresh_cached('Opportunities', 'opportunity_id', opportunity_id)
+        if rowcount > 0:
+            _notify_write('Opportunities', opportunity_id, 'update')
+        return rowcount > 0
     except sqlite3.IntegrityError as e:
         print(f"Integrity error updating opportunity: {e}")
         return False
     except sqlite3.Error as e:
         print(f"Database error updating opportunity: {e}")
         return False
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
 
 def delete_opportunity(opportunity_id):
     """
     Delete an opportunity from the database.
     Returns True if deleted, False otherwise.
     """
-    conn = get_db_connection()
-    if conn is None:
-        return False
-
-    cursor = conn.cursor()
     try:
-        cursor.execute("DELETE FROM Opportunities WHERE opportunity_id = ?", (opportunity_id,))
-        conn.commit()
-        return cursor.rowcount > 0
+        _, rowcount = _execute_write(build_opportunity_delete(opportunity_id))
+        _forget_cached('Opportunities', opportunity_id)
+        if rowcount > 0:
+            _notify_write('Opportunities', opportunity_id, 'delete')
+        return rowcount > 0
     except sqlite3.Error as e:
         print(f"Database error deleting opportunity: {e}")
-        return False
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
+        return False
\ No newline at end of file
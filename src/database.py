@@ -1,20 +1,135 @@
 import sqlite3
 import os # Import os module
 import sys
+import threading
+from contextlib import contextmanager
 
 # Define the path to the data directory and the database file
 DATA_DIR = 'data'
 DATABASE_NAME = os.path.join(DATA_DIR, 'crm.db') # Use os.path.join for cross-platform compatibility
 
+# How long a connection waits on another connection's lock before reporting "database is locked"
+BUSY_TIMEOUT_MS = int(os.environ.get('CRM_BUSY_TIMEOUT_MS', 5000))
+
+def set_database_path(path):
+    """
+    Point the application at a different database file.
+    Used by tooling (e.g. the replay harness) that runs against a seeded copy of crm.db.
+    """
+    global DATA_DIR, DATABASE_NAME
+    DATABASE_NAME = path
+    DATA_DIR = os.path.dirname(path) or '.'
+    # The migration script keeps its own copy of the path
+    from . import migrate_db
+    migrate_db.DATA_DIR = DATA_DIR
+    migrate_db.DATABASE_NAME = DATABASE_NAME
+    migrate_db.BACKUP_DIR = os.path.join(DATA_DIR, 'backups')
+
+# Connection bound to the current thread with bind_connection(), if any
+_bound = threading.local()
+
+class SharedConnection:
+    """
+    Wraps a long-lived connection so it can be handed out by get_db_connection().
+
+    The DAL functions open a connection, commit and close it on every call.
+    While a connection is bound, close() is a no-op so the connection survives
+    across calls, and commit() can be deferred so several DAL calls are grouped
+    into one transaction that the owner commits explicitly.
+    """
+
+    def __init__(self, conn, defer_commit=False, path=None):
+        self._conn = conn
+        self.defer_commit = defer_commit
+        # Database file of conn, if it is not DATABASE_NAME (see current_database_path)
+        self.path = path
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        """
+        Keep the connection open; its owner closes it.
+        Like closing a real connection, this discards uncommitted changes,
+        unless commits are being grouped by the owner.
+        """
+        if not self.defer_commit and self._conn.in_transaction:
+            self._conn.rollback()
+
+    def commit(self):
+        """Commit now, unless commits are being grouped by the owner."""
+        if not self.defer_commit:
+            self._conn.commit()
+
+    def commit_now(self):
+        """Commit regardless of defer_commit. Used by the owner to end a group."""
+        self._conn.commit()
+
+@contextmanager
+def bind_connection(conn, defer_commit=False, path=None):
+    """
+    Make get_db_connection() return conn for the current thread until the block exits.
+
+    Args:
+        conn (sqlite3.Connection): An open connection owned by the caller
+        defer_commit (bool): If True, DAL commits are skipped and the caller
+                             commits with commit_now() on the yielded wrapper
+        path (str, optional): Database file of conn, if it is not DATABASE_NAME
+
+    Yields:
+        SharedConnection: The wrapper handed to DAL functions
+    """
+    previous = getattr(_bound, 'connection', None)
+    shared = bind_thread_connection(conn, defer_commit, path)
+    try:
+        yield shared
+    finally:
+        _bound.connection = previous
+
+def bind_thread_connection(conn, defer_commit=False, path=None):
+    """
+    Bind conn to the current thread for the rest of the thread's life.
+    Used by worker threads that keep one connection each (see bind_connection).
+
+    Returns:
+        SharedConnection: The wrapper handed to DAL functions
+    """
+    conn.row_factory = sqlite3.Row
+    _bound.connection = SharedConnection(conn, defer_commit, path)
+    return _bound.connection
+
+def get_bound_connection():
+    """Return the SharedConnection bound to the current thread, or None."""
+    return getattr(_bound, 'connection', None)
+
+def current_database_path():
+    """
+    Return the database file get_db_connection() uses on this thread: the path
+    given when a connection was bound (e.g. a tenant's file), else DATABASE_NAME.
+    """
+    bound = getattr(_bound, 'connection', None)
+    if bound is not None and bound.path:
+        return bound.path
+    return DATABASE_NAME
+
+def unbind_thread_connection():
+    """Undo bind_thread_connection() for the current thread."""
+    _bound.connection = None
+
 def get_db_connection():
     """
     Establish a connection to the SQLite database.
+    Returns the connection bound with bind_connection() instead, if there is one.
     """
+    bound = getattr(_bound, 'connection', None)
+    if bound is not None:
+        return bound
+
     conn = None
     try:
         # Ensure the data directory exists
         os.makedirs(DATA_DIR, exist_ok=True)
-        conn = sqlite3.connect(DATABASE_NAME)
+        conn = sqlite3.connect(DATABASE_NAME, timeout=BUSY_TIMEOUT_MS / 1000)
         conn.row_factory = sqlite3.Row  # Access columns by name
         return conn
     except sqlite3.Error as e:
@@ -125,55 +240,28 @@ def create_tables():
 
 def check_schema():
     """
-    Check if schema migration is needed by comparing columns in the database
-    with the expected schema. Returns True if migration is needed, False otherwise.
+    Check if schema migration is needed, i.e. whether any of the numbered steps
+    in migrations.py has not been applied yet. Returns True if migration is needed.
     """
     # Check if database exists first
     if not os.path.exists(DATABASE_NAME):
         return False  # No migration needed, just create new tables
-        
-    conn = get_db_connection()
-    if conn is None:
-        return False
-    
-    cursor = conn.cursor()
+
+    from .migrations import pending_migrations
     try:
-        # Check Accounts table
-        cursor.execute("PRAGMA table_info(Accounts)")
-        accounts_columns = [row[1] for row in cursor.fetchall()]
-        # Check for any of the new columns including industry_id
-        if "description" not in accounts_columns or "website" not in accounts_columns or "industry_id" not in accounts_columns:
-            return True
-        
-        # Check Contacts table
-        cursor.execute("PRAGMA table_info(Contacts)")
-        contacts_columns = [row[1] for row in cursor.fetchall()]
-        # Check for any of the new columns
-        if "title" not in contacts_columns or "description" not in contacts_columns:
-            return True
-        
-        # Check Opportunities table
-        cursor.execute("PRAGMA table_info(Opportunities)")
-        opportunities_columns = [row[1] for row in cursor.fetchall()]
-        # Check for the stage_id column
-        if "stage_id" not in opportunities_columns:
-            return True
-            
-        return False  # No migration needed
+        return bool(pending_migrations(DATABASE_NAME))
     except sqlite3.Error as e:
         print(f"Error checking schema: {e}")
         return False
-    finally:
-        cursor.close()
-        conn.close()
 
 def initialize_database():
     """
     Initialize the database, performing migrations if needed.
     """
-    # Check if migration is needed
-    if check_schema():
-        print("Database schema needs migration. Running migration script...")
+    # A new database is built by the migration steps as well
+    if not os.path.exists(DATABASE_NAME) or check_schema():
+        if os.path.exists(DATABASE_NAME):
+            print("Database schema needs migration. Running migration script...")
         try:
             # Import and run the migration script
             from .migrate_db import migrate_database
@@ -185,9 +273,6 @@ def initialize_database():
             print(f"Error during migration: {e}")
             print("Attempting to continue with create_tables()...")
             create_tables()
-    else:
-        # Just create tables if needed
-        create_tables()
 
 if __name__ == '__main__':
     initialize_database()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Database Statistics for CRM Application
+
+Answers "where did the space go?" without the sqlite3 shell: row counts per
+table, on-disk size per table and index (from the dbstat virtual table),
+page and freelist counts, the size of the WAL file, and the hit ratio of the
+entity cache.
+
+Each time the statistics are collected with record=True, the sizes and row
+counts are stored as a snapshot in DatabaseStatsHistory (created by migration
+8), and the report shows the growth since the previous snapshot. Only the
+latest HISTORY_KEEP snapshots are kept.
+"""
+
+import os
+import sqlite3
+
+from . import database
+from .database import get_db_connection
+
+# Snapshots kept in DatabaseStatsHistory
+HISTORY_KEEP = int(os.environ.get('CRM_STATS_HISTORY_KEEP', 100))
+
+# object_name of the whole-file row in DatabaseStatsHistory
+DATABASE_OBJECT = '(database)'
+
+def _object_sizes(conn):
+    """Return {table or index name: bytes on disk}, or None if dbstat is not compiled in."""
+    try:
+        return {row[0]: row[1] for row in conn.execute(
+            "SELECT name, pgsize FROM dbstat WHERE aggregate = TRUE")}
+    except sqlite3.OperationalError:
+        return None
+
+def _tables(conn):
+    """Return the names of ordinary tables (no virtual or shadow tables)."""
+    return [row[1] for row in conn.execute("PRAGMA table_list")
+            if row[0] == 'main' and row[2] == 'table' and not row[1].startswith('sqlite_')]
+
+def _wal_bytes():
+    wal_path = database.DATABASE_NAME + '-wal'
+    return os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+
+def _cache_hit_ratio():
+    """Hit ratio of the entity cache in this process, or None if it is not enabled."""
+    from .crm_dal import get_cache_stats
+    stats = get_cache_stats()
+    if not stats:
+        return None
+    lookups = stats['hits'] + stats['misses']
+    return stats['hits'] / lookups if lookups else None
+
+def collect_stats(record=True):
+    """
+    Gather the database statistics.
+
+    Args:
+        record (bool): Store the result as a snapshot in DatabaseStatsHistory
+
+    Returns:
+        dict: 'page_size', 'page_count', 'freelist_count', 'file_bytes',
+              'journal_mode', 'wal_bytes', 'cache_hit_ratio', 'tables' (a list of
+              {'name', 'rows', 'bytes', 'indexes': [(name, bytes)]}, largest first),
+              and 'previous' ({object name: (rows, bytes)} of the last snapshot,
+              with 'previous_at'); None on failure
+    """
+    conn = get_db_connection()
+    if conn is None:
+        return None
+    try:
+        stats = {
+            'page_size': conn.execute("PRAGMA page_size").fetchone()[0],
+            'page_count': conn.execute("PRAGMA page_count").fetchone()[0],
+            'freelist_count': conn.execute("PRAGMA freelist_count").fetchone()[0],
+            'journal_mode': conn.execute("PRAGMA journal_mode").fetchone()[0],
+            'wal_bytes': _wal_bytes(),
+            'cache_hit_ratio': _cache_hit_ratio(),
+        }
+        stats['file_bytes'] = stats['page_size'] * stats['page_count']
+
+        sizes = _object_sizes(conn)
+        stats['sizes_available'] = sizes is not None
+        sizes = sizes or {}
+        indexes = {}
+        for name, table in conn.execute("SELECT name, tbl_name FROM sqlite_master WHERE type = 'index'"):
+            indexes.setdefault(table, []).append((name, sizes.get(name)))
+
+        tables = []
+        for name in _tables(conn):
+            rows = conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0]
+            table_indexes = sorted(indexes.get(name, []), key=lambda index: -(index[1] or 0))
+            tables.append({'name': name, 'rows': rows, 'bytes': sizes.get(name), 'indexes': table_indexes})
+        tables.sort(key=lambda table: -((table['bytes'] or 0) + sum(size or 0 for _, size in table['indexes'])))
+        stats['tables'] = tables
+
+        stats['previous_at'], stats['previous'] = _last_snapshot(conn)
+        if record:
+            _record_snapshot(conn, stats)
+        return stats
+    except sqlite3.Error as e:
+        print(f"Database error collecting statistics: {e}")
+        return None
+    finally:
+        conn.close()
+
+# --- History ---
+
+def _last_snapshot(conn):
+    """Return (recorded_at, {object name: (rows, bytes)}) of the latest snapshot, or (None, {})."""
+    latest = conn.execute("SELECT MAX(snapshot_id) FROM DatabaseStatsHistory").fetchone()[0]
+    if latest is None:
+        return None, {}
+    rows = conn.execute(
+        "SELECT object_name, row_count, size_bytes, recorded_at FROM DatabaseStatsHistory WHERE snapshot_id = ?",
+        (latest,)
+    ).fetchall()
+    return rows[0][3], {row[0]: (row[1], row[2]) for row in rows}
+
+def _record_snapshot(conn, stats):
+    entries = [(DATABASE_OBJECT, 'database', None, stats['file_bytes'])]
+    for table in stats['tables']:
+        entries.append((table['name'], 'table', table['rows'], table['bytes']))
+        entries.extend((name, 'index', None, size) for name, size in table['indexes'])
+    cursor = conn.cursor()
+    try:
+        snapshot_id = cursor.execute(
+            "SELECT COALESCE(MAX(snapshot_id), 0) + 1 FROM DatabaseStatsHistory").fetchone()[0]
+        cursor.executemany(
+            "INSERT INTO DatabaseStatsHistory (snapshot_id, object_name, object_type, row_count, size_bytes) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(snapshot_id,) + entry for entry in entries]
+        )
+        cursor.execute("DELETE FROM DatabaseStatsHistory WHERE snapshot_id <= ?", (snapshot_id - HISTORY_KEEP,))
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def get_history(object_name=DATABASE_OBJECT, limit=20):
+    """Return [(recorded_at, row_count, size_bytes)] of one object, newest first."""
+    conn = get_db_connection()
+    if conn is None:
+        return []
+    try:
+        return conn.execute(
+            "SELECT recorded_at, row_count, size_bytes FROM DatabaseStatsHistory "
+            "WHERE object_name = ? ORDER BY snapshot_id DESC LIMIT ?",
+            (object_name, limit)
+        ).fetchall()
+    except sqlite3.Error as e:
+        print(f"Database error reading statistics history: {e}")
+        return []
+    finally:
+        conn.close()
+
+# --- Display ---
+
+def format_bytes(size):
+    if size is None:
+        return "n/a"
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if abs(size) < 1024 or unit == 'GiB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+def _growth(current, previous):
+    if current is None or previous is None:
+        return ""
+    delta = current - previous
+    return f"{'+' if delta >= 0 else '-'}{format_bytes(abs(delta))}"
+
+def _row_growth(current, previous):
+    if current is None or previous is None:
+        return ""
+    return f"{current - previous:+,}"
+
+def print_stats(stats):
+    previous = stats['previous']
+    file_growth = _growth(stats['file_bytes'], previous.get(DATABASE_OBJECT, (None, None))[1])
+    print(f"Database file : {database.DATABASE_NAME}")
+    print(f"Size          : {format_bytes(stats['file_bytes'])}"
+          + (f" ({file_growth} since {stats['previous_at']})" if file_growth else ""))
+    print(f"Pages         : {stats['page_count']:,} of {stats['page_size']} bytes, "
+          f"{stats['freelist_count']:,} free ({format_bytes(stats['freelist_count'] * stats['page_size'])})")
+    print(f"Journal       : {stats['journal_mode']}, WAL file {format_bytes(stats['wal_bytes'])}")
+    ratio = stats['cache_hit_ratio']
+    print(f"Entity cache  : {f'{ratio:.1%} hit ratio' if ratio is not None else 'no lookups yet'}")
+    if not stats['sizes_available']:
+        print("Per-table sizes are not available: this SQLite build has no dbstat table.")
+
+    print(f"\n{'Table / index':<44} {'Rows':>12} {'Row growth':>11} {'Size':>11} {'Growth':>11}")
+    for table in stats['tables']:
+        rows_before, bytes_before = previous.get(table['name'], (None, None))
+        print(f"{table['name']:<44} {table['rows']:>12,} {_row_growth(table['rows'], rows_before):>11} "
+              f"{format_bytes(table['bytes']):>11} {_growth(table['bytes'], bytes_before):>11}")
+        for name, size in table['indexes']:
+            print(f"  {name:<42} {'':>12} {'':>11} {format_bytes(size):>11} "
+                  f"{_growth(size, previous.get(name, (None, None))[1]):>11}")
+
+def handle_stats_menu_option():
+    """Admin menu: show the statistics and record a snapshot."""
+    print("\n--- Database Statistics ---")
+    stats = collect_stats()
+    if stats:
+        print_stats(stats)
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Show CRM database size and growth statistics")
+    parser.add_argument('--no-record', action='store_true', help="Do not store a snapshot in the history table")
+    parser.add_argument('--history', nargs='?', const=DATABASE_OBJECT, metavar='OBJECT',
+                        help="Show the recorded size history of the database (or of a table or index)")
+    args = parser.parse_args()
+    if args.history:
+        for recorded_at, row_count, size_bytes in get_history(args.history):
+            rows = f"{row_count:,} rows, " if row_count is not None else ""
+            print(f"{recorded_at}  {rows}{format_bytes(size_bytes)}")
+    else:
+        stats = collect_stats(record=not args.no_record)
+        if stats:
+            print_stats(stats)
@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+Duplicate Detection for CRM Application
+
+Finds likely duplicate contacts and accounts without comparing every pair.
+
+1. Blocking: each record gets a few normalized keys, one per kind of
+   evidence. For contacts these are the lowercased email (without any +tag),
+   the normalized full name, the phone number, a phonetic code of the name
+   (Soundex) and the email domain combined with the phonetic surname. For
+   accounts they are the normalized name (punctuation and legal suffixes such
+   as Inc/LLC dropped), the website host and a phonetic code of the name.
+2. Candidates: records are only compared with records that share a key.
+   Small blocks are compared pairwise. In blocks larger than max_block_size
+   (e.g. a very common name), records are sorted and each is compared with the
+   next `window` records only, so no block can become quadratic.
+3. Scoring: candidate pairs are scored between 0 and 1 with Jaro-Winkler name
+   similarity plus the supporting evidence, and pairs at or above the
+   threshold are written to the DuplicatePairs table for review.
+
+Pairs can then be merged (see crm_dal.merge_contacts/merge_accounts) or
+dismissed; dismissed pairs are not proposed again by later scans.
+
+Usage:
+    python -m src.dedupe scan contacts [--threshold 0.85]
+    python -m src.dedupe list [--entity contacts] [--limit 20]
+    python -m src.dedupe merge PAIR_ID [--keep RECORD_ID]
+    python -m src.dedupe dismiss PAIR_ID
+"""
+
+import re
+import sys
+import sqlite3
+from collections import namedtuple
+from itertools import combinations
+from time import perf_counter
+
+from . import crm_dal
+from .database import get_db_connection
+from .similarity import fold, jaro_winkler, soundex
+
+# Pairs scoring at least this much are written for review
+DEFAULT_THRESHOLD = 0.85
+
+# Blocks up to this size are compared pairwise; larger ones use a sliding window
+DEFAULT_MAX_BLOCK_SIZE = 50
+
+# Neighbours each record is compared with inside a large block
+DEFAULT_WINDOW = 5
+
+# Words that do not tell two company names apart
+_LEGAL_SUFFIXES = frozenset({
+    'inc', 'incorporated', 'llc', 'llp', 'ltd', 'limited', 'corp', 'corporation', 'co', 'company',
+    'plc', 'gmbh', 'ag', 'sa', 'bv', 'nv', 'pty', 'the',
+})
+
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+# --- Normalization ---
+
+def normalize_name(text, drop_legal_suffixes=False):
+    """Lowercase, strip accents and punctuation, and collapse whitespace."""
+    words = _NON_ALNUM.sub(' ', fold(text or '').replace('&', ' and ')).split()
+    if drop_legal_suffixes:
+        words = [word for word in words if word not in _LEGAL_SUFFIXES] or words
+    return ' '.join(words)
+
+def normalize_email(email):
+    """Lowercase an email address and drop any +tag from the local part."""
+    email = (email or '').strip().casefold()
+    local, at, domain = email.partition('@')
+    if not at:
+        return email
+    return local.split('+', 1)[0] + '@' + domain
+
+def website_host(url):
+    """Return the host of a website without scheme, port, path or leading 'www.'."""
+    host = (url or '').strip().casefold()
+    host = host.split('://', 1)[-1].split('/', 1)[0].split(':', 1)[0]
+    return host[4:] if host.startswith('www.') else host
+
+def normalize_phone(phone):
+    """
+    Return the last ten digits of a phone number, or '' if it has fewer than ten
+    (local numbers without an area code are too ambiguous to match on).
+    """
+    digits = ''.join(ch for ch in (phone or '') if ch.isdigit())
+    return digits[-10:] if len(digits) >= 10 else ''
+
+# --- Records, blocking keys and scores per entity ---
+
+ContactRecord = namedtuple('ContactRecord', ['id', 'first', 'last', 'email', 'domain', 'phone', 'account_id', 'phonetic'])
+AccountRecord = namedtuple('AccountRecord', ['id', 'name', 'host', 'phonetic'])
+
+def _contact_record(row):
+    contact_id, first_name, last_name, email, phone, account_id = row
+    email = normalize_email(email)
+    last_code = soundex(last_name)
+    first_code = soundex(first_name)
+    return ContactRecord(contact_id, normalize_name(first_name), normalize_name(last_name), email,
+                         email.partition('@')[2], normalize_phone(phone), account_id,
+                         last_code + first_code if last_code and first_code else '')
+
+def _account_record(row):
+    account_id, name, website = row
+    name = normalize_name(name, drop_legal_suffixes=True)
+    return AccountRecord(account_id, name, website_host(website),
+                         ''.join(soundex(word) for word in name.split()[:2]))
+
+def _name_similarity(a, b):
+    return 1.0 if a == b else jaro_winkler(a, b)
+
+def _score_contacts(a, b):
+    """Score a contact pair; returns (score, reasons)."""
+    if a.email and a.email == b.email:
+        return 1.0, 'same email'
+    # The weaker of the two names, so a shared common first name cannot carry a pair
+    name_similarity = min(_name_similarity(a.first, b.first), _name_similarity(a.last, b.last))
+    reasons = [f"name {name_similarity:.2f}"]
+    evidence = 0.0
+    if a.phone and a.phone == b.phone:
+        evidence = 1.0
+        reasons.append('same phone')
+    same_account = a.account_id is not None and a.account_id == b.account_id
+    same_domain = bool(a.domain) and a.domain == b.domain
+    if same_account:
+        reasons.append('same account')
+    if same_domain:
+        reasons.append('same email domain')
+    if same_account and same_domain:
+        evidence = max(evidence, 0.8)
+    elif same_account or same_domain:
+        evidence = max(evidence, 0.5)
+    return 0.7 * name_similarity + 0.3 * evidence, ', '.join(reasons)
+
+def _score_accounts(a, b):
+    """Score an account pair; returns (score, reasons)."""
+    name_similarity = _name_similarity(a.name, b.name)
+    reasons = [f"name {name_similarity:.2f}"]
+    score = name_similarity
+    if a.host and b.host:
+        if a.host == b.host:
+            score = 0.7 * name_similarity + 0.3
+            reasons.append('same website')
+        else:
+            score = 0.8 * name_similarity
+            reasons.append('different websites')
+    return score, ', '.join(reasons)
+
+# entity -> how to load, block, order and score its records
+EntitySpec = namedtuple('EntitySpec', ['name', 'query', 'make_record', 'blocking_keys', 'sort_key', 'score', 'merge'])
+
+ENTITIES = {
+    'contacts': EntitySpec(
+        'contact',
+        "SELECT contact_id, first_name, last_name, email, phone, account_id FROM Contacts",
+        _contact_record,
+        {
+            'email': lambda r: r.email,
+            'name': lambda r: f"{r.first} {r.last}",
+            'phone': lambda r: r.phone,
+            'phonetic name': lambda r: r.phonetic,
+            'domain and surname': lambda r: r.domain and r.phonetic[:4] and f"{r.domain}|{r.phonetic[:4]}",
+        },
+        lambda r: (r.last, r.first, r.domain, r.email),
+        _score_contacts,
+        crm_dal.merge_contacts,
+    ),
+    'accounts': EntitySpec(
+        'account',
+        "SELECT account_id, name, website FROM Accounts",
+        _account_record,
+        {
+            'name': lambda r: r.name,
+            'website': lambda r: r.host,
+            'phonetic name': lambda r: r.phonetic,
+        },
+        lambda r: (r.name, r.host),
+        _score_accounts,
+        crm_dal.merge_accounts,
+    ),
+}
+
+# --- Scan ---
+
+def _blocks(records, key_func):
+    """Group record positions by blocking key, yielding only groups of two or more."""
+    groups = {}
+    for position, record in enumerate(records):
+        key = key_func(record)
+        if not key:
+            continue
+        group = groups.get(key)
+        if group is None:
+            # Most keys are unique; store a bare position until a second record shows up
+            groups[key] = position
+        elif isinstance(group, int):
+            groups[key] = [group, position]
+        else:
+            group.append(position)
+    for group in groups.values():
+        if not isinstance(group, int):
+            yield group
+
+def _candidate_pairs(records, key_func, sort_key, max_block_size, window):
+    """Yield (position, position) pairs of records that share a blocking key."""
+    for block in _blocks(records, key_func):
+        if len(block) <= max_block_size:
+            yield from combinations(block, 2)
+            continue
+        block.sort(key=lambda position: sort_key(records[position]))
+        for i, first in enumerate(block):
+            for second in block[i + 1:i + 1 + window]:
+                yield first, second
+
+def find_duplicates(entity, threshold=DEFAULT_THRESHOLD, max_block_size=DEFAULT_MAX_BLOCK_SIZE,
+                    window=DEFAULT_WINDOW, show_progress=True):
+    """
+    Scan contacts or accounts for likely duplicates and store them for review.
+
+    Pending pairs from the previous scan of the entity are replaced; merged and
+    dismissed pairs are kept and not proposed again.
+
+    Args:
+        entity (str): 'contacts' or 'accounts'
+        threshold (float): Minimum score of a stored pair
+        max_block_size (int): Largest block compared pairwise
+        window (int): Neighbours compared per record in larger blocks
+        show_progress (bool): Print progress of each step
+
+    Returns:
+        int: Number of pending pairs stored, or None on failure
+    """
+    spec = ENTITIES.get(entity)
+    if spec is None:
+        print(f"Error: Unknown entity '{entity}'. Valid options: {', '.join(ENTITIES)}")
+        return None
+
+    conn = get_db_connection()
+    if conn is None:
+        return None
+    cursor = conn.cursor()
+    try:
+        started = perf_counter()
+        records = [spec.make_record(row) for row in cursor.execute(spec.query)]
+        if show_progress:
+            print(f"Loaded {len(records):,} {entity} in {perf_counter() - started:.1f} s")
+
+        found = {}
+        for key_name, key_func in spec.blocking_keys.items():
+            step_started = perf_counter()
+            compared = 0
+            for first, second in _candidate_pairs(records, key_func, spec.sort_key, max_block_size, window):
+                compared += 1
+                a, b = records[first], records[second]
+                pair = (a.id, b.id) if a.id < b.id else (b.id, a.id)
+                if pair in found:
+                    continue
+                score, reasons = spec.score(a, b)
+                if score >= threshold:
+                    found[pair] = (score, reasons)
+            if show_progress:
+                print(f"  Blocking on {key_name}: {compared:,} comparisons, "
+                      f"{len(found):,} pairs so far ({perf_counter() - step_started:.1f} s)")
+        del records
+
+        cursor.execute("DELETE FROM DuplicatePairs WHERE entity = ? AND status = 'pending'", (spec.name,))
+        cursor.executemany(
+            "INSERT OR IGNORE INTO DuplicatePairs (entity, record_id_a, record_id_b, score, reasons) VALUES (?, ?, ?, ?, ?)",
+            ((spec.name, a, b, round(score, 4), reasons) for (a, b), (score, reasons) in found.items())
+        )
+        conn.commit()
+        stored = cursor.execute("SELECT COUNT(*) FROM DuplicatePairs WHERE entity = ? AND status = 'pending'",
+                                (spec.name,)).fetchone()[0]
+        if show_progress:
+            print(f"Stored {stored:,} likely duplicate {entity} pairs in {perf_counter() - started:.1f} s")
+        return stored
+    except sqlite3.Error as e:
+        print(f"Database error finding duplicates: {e}")
+        return None
+    finally:
+        cursor.close()
+        conn.close()
+
+# --- Review ---
+
+def list_pairs(entity=None, status='pending', limit=20):
+    """
+    Return stored duplicate pairs, highest score first.
+
+    Args:
+        entity (str, optional): 'contacts' or 'accounts' (default: both)
+        status (str): 'pending', 'merged' or 'dismissed'
+        limit (int): Maximum number of pairs
+    """
+    conn = get_db_connection()
+    if conn is None:
+        return []
+    try:
+        sql = "SELECT * FROM DuplicatePairs WHERE status = ?"
+        params = [status]
+        if entity:
+            sql += " AND entity = ?"
+            params.append(ENTITIES[entity].name)
+        sql += " ORDER BY score DESC, pair_id LIMIT ?"
+        params.append(limit)
+        return conn.execute(sql, params).fetchall()
+    except sqlite3.Error as e:
+        print(f"Database error listing duplicate pairs: {e}")
+        return []
+    finally:
+        conn.close()
+
+def get_pair(pair_id):
+    conn = get_db_connection()
+    if conn is None:
+        return None
+    try:
+        return conn.execute("SELECT * FROM DuplicatePairs WHERE pair_id = ?", (pair_id,)).fetchone()
+    except sqlite3.Error as e:
+        print(f"Database error getting duplicate pair: {e}")
+        return None
+    finally:
+        conn.close()
+
+def _set_status(pair_id, status):
+    conn = get_db_connection()
+    if conn is None:
+        return False
+    try:
+        updated = conn.execute("UPDATE DuplicatePairs SET status = ? WHERE pair_id = ?", (status, pair_id)).rowcount
+        conn.commit()
+        return updated > 0
+    except sqlite3.Error as e:
+        print(f"Database error updating duplicate pair: {e}")
+        return False
+    finally:
+        conn.close()
+
+def dismiss_pair(pair_id):
+    """Mark a pair as not a duplicate so later scans do not propose it again."""
+    return _set_status(pair_id, 'dismissed')
+
+def merge_pair(pair_id, keep_id=None):
+    """
+    Merge the two records of a pair.
+
+    Args:
+        pair_id (int): The pair to merge
+        keep_id (int, optional): The record that remains (default: the older one)
+
+    Returns:
+        bool: True if merged
+    """
+    pair = get_pair(pair_id)
+    if pair is None:
+        print(f"Error: Duplicate pair {pair_id} not found.")
+        return False
+    if pair['status'] != 'pending':
+        print(f"Error: Duplicate pair {pair_id} is already {pair['status']}.")
+        return False
+    ids = (pair['record_id_a'], pair['record_id_b'])
+    keep_id = ids[0] if keep_id is None else keep_id
+    if keep_id not in ids:
+        print(f"Error: Record {keep_id} is not part of pair {pair_id} ({ids[0]}, {ids[1]}).")
+        return False
+    remove_id = ids[1] if keep_id == ids[0] else ids[0]
+    spec = next(spec for spec in ENTITIES.values() if spec.name == pair['entity'])
+    if not spec.merge(keep_id, remove_id):
+        return False
+
+    conn = get_db_connection()
+    if conn is None:
+        return True
+    try:
+        conn.execute("UPDATE DuplicatePairs SET status = 'merged' WHERE pair_id = ?", (pair_id,))
+        # Other pending pairs of the removed record now point at a record that is gone
+        conn.execute("""
+            DELETE FROM DuplicatePairs
+            WHERE entity = ? AND status = 'pending' AND ? IN (record_id_a, record_id_b)
+        """, (pair['entity'], remove_id))
+        conn.commit()
+    except sqlite3.Error as e:
+        print(f"Database error updating duplicate pairs: {e}")
+    finally:
+        conn.close()
+    print(f"Merged {pair['entity']} {remove_id} into {keep_id}.")
+    return True
+
+def _describe(entity, record_id):
+    if entity == 'contact':
+        row = crm_dal.get_contact(record_id)
+        return f"{row['first_name']} {row['last_name']} <{row['email']}>" if row else "(deleted)"
+    row = crm_dal.get_account(record_id)
+    return f"{row['name']} ({row['website'] or 'no website'})" if row else "(deleted)"
+
+def print_pairs(pairs):
+    for pair in pairs:
+        print(f"#{pair['pair_id']} {pair['entity']} score {pair['score']:.2f} ({pair['reasons']})")
+        print(f"    {pair['record_id_a']}: {_describe(pair['entity'], pair['record_id_a'])}")
+        print(f"    {pair['record_id_b']}: {_describe(pair['entity'], pair['record_id_b'])}")
+
+if __name__ == '__main__':
+    import argparse
+    from .database import initialize_database
+    parser = argparse.ArgumentParser(description="Find, review and merge duplicate contacts and accounts")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    scan_parser = subparsers.add_parser('scan', help='Find likely duplicates and store them for review')
+    scan_parser.add_argument('entity', choices=list(ENTITIES))
+    scan_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    scan_parser.add_argument('--max-block-size', type=int, default=DEFAULT_MAX_BLOCK_SIZE)
+    scan_parser.add_argument('--window', type=int, default=DEFAULT_WINDOW)
+    list_parser = subparsers.add_parser('list', help='Show stored pairs, highest score first')
+    list_parser.add_argument('--entity', choices=list(ENTITIES))
+    list_parser.add_argument('--status', choices=['pending', 'merged', 'dismissed'], default='pending')
+    list_parser.add_argument('--limit', type=int, default=20)
+    merge_parser = subparsers.add_parser('merge', help='Merge the two records of a pair')
+    merge_parser.add_argument('pair_id', type=int)
+    merge_parser.add_argument('--keep', type=int, help='Record ID to keep (default: the older record)')
+    dismiss_parser = subparsers.add_parser('dismiss', help='Mark a pair as not a duplicate')
+    dismiss_parser.add_argument('pair_id', type=int)
+    args = parser.parse_args()
+
+    initialize_database()
+    if args.command == 'scan':
+        sys.exit(0 if find_duplicates(args.entity, args.threshold, args.max_block_size, args.window) is not None else 1)
+    elif args.command == 'list':
+        print_pairs(list_pairs(args.entity, args.status, args.limit))
+    elif args.command == 'merge':
+        sys.exit(0 if merge_pair(args.pair_id, args.keep) else 1)
+    else:
+        sys.exit(0 if dismiss_pair(args.pair_id) else 1)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+In-Memory Sessions for CRM Application
+
+`python -m src.main --in-memory` copies crm.db into a :memory: database with
+the SQLite backup API when the session starts, and binds that copy to the
+session, so every DAL read (lists, searches, the summary, exports) is served
+from RAM instead of the file.
+
+Writes made during the session change only the copy in memory. They are
+written back to crm.db (again with the backup API):
+
+- on demand, from Admin > Save In-Memory Session to Disk;
+- on exit, automatically with --write-back, otherwise after asking.
+
+Saving would overwrite whatever other sessions wrote to crm.db since the copy
+was loaded, so it is refused if the file changed in the meantime (detected
+with PRAGMA data_version on a connection kept open to the file).
+"""
+
+import sqlite3
+from time import perf_counter
+
+from . import database
+
+_session = None
+
+class InMemorySession:
+    """A :memory: copy of a database file, bound to the current thread."""
+
+    def __init__(self, path):
+        self.path = path
+        # Kept open for the whole session: data_version on it reveals commits by others
+        self.disk = sqlite3.connect(path, timeout=database.BUSY_TIMEOUT_MS / 1000)
+        self.memory = sqlite3.connect(':memory:')
+        started = perf_counter()
+        self.disk.backup(self.memory)
+        self.load_seconds = perf_counter() - started
+        self.size_bytes = (self.memory.execute("PRAGMA page_count").fetchone()[0]
+                           * self.memory.execute("PRAGMA page_size").fetchone()[0])
+        self._disk_version = self._data_version()
+        self._saved_changes = self.memory.total_changes
+        database.bind_thread_connection(self.memory)
+
+    def _data_version(self):
+        return self.disk.execute("PRAGMA data_version").fetchone()[0]
+
+    def has_unsaved_changes(self):
+        """
+        True if anything was written in memory since the last save. (total_changes
+        also counts rows written by triggers, such as the change log, so it is not
+        a count of edited records.)
+        """
+        return self.memory.total_changes != self._saved_changes
+
+    def disk_changed(self):
+        """True if another connection committed to the file since it was loaded or saved."""
+        return self._data_version() != self._disk_version
+
+    def save(self, force=False):
+        """
+        Write the in-memory database back to the file.
+
+        Args:
+            force (bool): Save even if the file was changed by someone else meanwhile
+
+        Returns:
+            bool: True if saved
+        """
+        if self.disk_changed() and not force:
+            print(f"Not saved: {self.path} was changed by another session since it was loaded, "
+                  "and saving would overwrite those changes.")
+            return False
+        if self.memory.in_transaction:
+            self.memory.commit()
+        started = perf_counter()
+        try:
+            self.memory.backup(self.disk)
+        except sqlite3.Error as e:
+            print(f"Error saving the in-memory database: {e}")
+            return False
+        self._disk_version = self._data_version()
+        self._saved_changes = self.memory.total_changes
+        print(f"Saved the in-memory database to {self.path} in {perf_counter() - started:.2f} s.")
+        return True
+
+    def close(self):
+        if database.get_bound_connection() is not None and database.get_bound_connection()._conn is self.memory:
+            database.unbind_thread_connection()
+        self.memory.close()
+        self.disk.close()
+
+def start_session(path=None):
+    """
+    Load the database into memory and bind the copy to the current thread.
+
+    Returns:
+        InMemorySession: The session, or None if the file could not be loaded
+    """
+    global _session
+    end_session(save=False)
+    try:
+        _session = InMemorySession(path or database.DATABASE_NAME)
+    except sqlite3.Error as e:
+        print(f"Could not load the database into memory: {e}")
+        return None
+    print(f"Loaded {_session.size_bytes / 1024 / 1024:.1f} MiB into memory in {_session.load_seconds:.2f} s. "
+          "Changes stay in memory until saved.")
+    return _session
+
+def get_session():
+    """Return the active in-memory session, or None."""
+    return _session
+
+def is_active():
+    return _session is not None
+
+def end_session(save=None):
+    """
+    End the in-memory session.
+
+    Args:
+        save (bool, optional): True saves unsaved changes, False discards them,
+                               None asks (and discards if there is no one to ask)
+    """
+    global _session
+    if _session is None:
+        return
+    session, _session = _session, None
+    try:
+        changes = session.has_unsaved_changes()
+        if changes and save is None:
+            try:
+                answer = input(f"Save the unsaved in-memory changes to {session.path}? (yes/no): ")
+                save = answer.strip().lower() in ('y', 'yes')
+            except (KeyboardInterrupt, EOFError):
+                save = False
+        if changes and save:
+            session.save()
+        elif changes:
+            print("Discarded the unsaved in-memory changes.")
+    finally:
+        session.close()
+
+def handle_save_menu_option():
+    """Admin menu: write the in-memory session back to disk."""
+    print("\n--- Save In-Memory Session ---")
+    if _session is None:
+        print("This session reads and writes crm.db directly (start with --in-memory to work in memory).")
+        return
+    if not _session.has_unsaved_changes():
+        print("No unsaved changes.")
+        return
+    if _session.disk_changed():
+        print(f"{_session.path} was changed by another session since it was loaded.")
+        confirm = input("Overwrite those changes with this session's data? (yes/no): ").strip().lower()
+        if confirm not in ('y', 'yes'):
+            print("Not saved.")
+            return
+        _session.save(force=True)
+    else:
+        _session.save()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Load Test for the CRM HTTP API
+
+This script fires concurrent requests at a running API server (see api_server.py)
+and reports throughput and latency percentiles.
+
+The default mix is mostly reads (record lookups, paginated lists, searches and
+conditional GETs) with a small share of updates, similar to tools polling the CRM.
+
+Usage:
+    python -m src.main --serve 8080 &
+    python -m src.loadtest --url http://127.0.0.1:8080 --clients 16 --requests 5000
+"""
+
+import json
+import random
+import threading
+import statistics
+import urllib.request
+import urllib.error
+from time import perf_counter
+
+def _percentile(values, fraction):
+    """Nearest-rank percentile of a sorted list of numbers."""
+    rank = max(0, min(len(values) - 1, int(round(fraction * len(values) + 0.5)) - 1))
+    return values[rank]
+
+def _request(url, method='GET', body=None, headers=None):
+    """
+    Send one request and return (HTTP status, ETag). 304 and 4xx are not
+    exceptions here; a request that gets no response returns ('error', None).
+    """
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    req = urllib.request.Request(url, data=data, method=method, headers=headers or {})
+    if data is not None:
+        req.add_header('Content-Type', 'application/json')
+    try:
+        with urllib.request.urlopen(req, timeout=30) as response:
+            response.read()
+            return response.status, response.headers.get('ETag')
+    except urllib.error.HTTPError as e:
+        e.read()
+        return e.code, None
+    except (urllib.error.URLError, OSError):
+        # Refused, reset or timed out; URLError covers the errors urlopen wraps
+        return 'error', None
+
+def _discover_max_ids(base_url):
+    """Find the highest account and contact IDs so lookups hit existing records."""
+    max_ids = {}
+    for collection, key in (('accounts', 'account_id'), ('contacts', 'contact_id')):
+        with urllib.request.urlopen(f"{base_url}/{collection}?limit=1000") as response:
+            items = json.loads(response.read())['items']
+        max_ids[collection] = max((item[key] for item in items), default=1)
+    return max_ids
+
+def run_load_test(base_url, clients=8, requests_per_client=500, write_ratio=0.05, random_seed=1):
+    """
+    Run the load test.
+
+    Args:
+        base_url (str): Base URL of the API server
+        clients (int): Number of concurrent client threads
+        requests_per_client (int): Requests sent by each client
+        write_ratio (float): Fraction of requests that are PATCH updates
+
+    Returns:
+        dict: Totals, requests per second and latency percentiles in milliseconds
+    """
+    max_ids = _discover_max_ids(base_url)
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def client(client_number):
+        rng = random.Random(random_seed + client_number)
+        etags = {}
+        local_latencies = []
+        local_statuses = {}
+        for _ in range(requests_per_client):
+            roll = rng.random()
+            account_id = rng.randint(1, max_ids['accounts'])
+            headers = {}
+            if roll < write_ratio:
+                method, url, body = 'PATCH', f"{base_url}/accounts/{account_id}", {'city': rng.choice(['Austin', 'Boston', 'Denver'])}
+            elif roll < 0.45:
+                method, url, body = 'GET', f"{base_url}/accounts/{account_id}", None
+            elif roll < 0.65:
+                contact_id = rng.randint(1, max_ids['contacts'])
+                method, url, body = 'GET', f"{base_url}/contacts/{contact_id}", None
+                if url in etags:
+                    headers['If-None-Match'] = etags[url]
+            elif roll < 0.85:
+                offset = rng.randint(0, 20) * 50
+                method, url, body = 'GET', f"{base_url}/contacts?limit=50&offset={offset}", None
+            else:
+                method, url, body = 'GET', f"{base_url}/accounts/{account_id}/opportunities", None
+
+            started = perf_counter()
+            status, etag = _request(url, method, body, headers)
+            local_statuses[status] = local_statuses.get(status, 0) + 1
+            if status == 'error':
+                continue  # failures are counted, but kept out of the latency figures
+            local_latencies.append((perf_counter() - started) * 1000)
+            if etag:
+                etags[url] = etag
+
+        with lock:
+            latencies.extend(local_latencies)
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    threads = [threading.Thread(target=client, args=(number,)) for number in range(clients)]
+    started = perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'failures': statuses.pop('error', 0),
+        'seconds': elapsed,
+        'requests_per_second': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': statistics.median(latencies) if latencies else 0.0,
+        'p95_ms': _percentile(latencies, 0.95) if latencies else 0.0,
+        'p99_ms': _percentile(latencies, 0.99) if latencies else 0.0,
+        'max_ms': latencies[-1] if latencies else 0.0,
+        'statuses': statuses,
+    }
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Load test a running CRM API server")
+    parser.add_argument('--url', default='http://127.0.0.1:8080', help="Base URL of the API server")
+    parser.add_argument('--clients', type=int, default=8, help="Concurrent clients (default: 8)")
+    parser.add_argument('--requests', type=int, default=4000, help="Total requests (default: 4000)")
+    parser.add_argument('--write-ratio', type=float, default=0.05, help="Fraction of PATCH requests (default: 0.05)")
+    args = parser.parse_args()
+
+    results = run_load_test(args.url.rstrip('/'), args.clients,
+                            max(1, args.requests // args.clients), args.write_ratio)
+    print(f"Requests      : {results['requests']} in {results['seconds']:.2f} s")
+    if results['failures']:
+        print(f"Failures      : {results['failures']} requests got no response (not in the figures below)")
+    print(f"Throughput    : {results['requests_per_second']:.1f} requests/second")
+    print(f"Latency p50   : {results['p50_ms']:.2f} ms")
+    print(f"Latency p95   : {results['p95_ms']:.2f} ms")
+    print(f"Latency p99   : {results['p99_ms']:.2f} ms")
+    print(f"Latency max   : {results['max_ms']:.2f} ms")
+    print(f"Status codes  : {', '.join(f'{code}: {count}' for code, count in sorted(results['statuses'].items()))}")
@@ -1,9 +1,13 @@
 import sys
 import csv
 import os
-from datetime import datetime, timezone # Added timezone
+import contextlib
+from datetime import datetime
 # Update imports to use relative paths within the src directory
 from .database import initialize_database
+from .completion import completing
+from .timestamps import local_time, format_created_at
+from .replica import reporting
 
 def truncate_text(text, max_length=30):
     """
@@ -25,10 +29,10 @@ def truncate_text(text, max_length=30):
     
     return text[:max_length-3] + '...'
 from .crm_dal import (
-    create_account, get_account, list_accounts, update_account, delete_account, search_accounts,
-    create_contact, get_contact, list_contacts, update_contact, delete_contact, search_contacts,
-    create_opportunity, get_opportunity, list_opportunities, update_opportunity, delete_opportunity, search_opportunities,
-    get_contacts_by_account, get_opportunities_by_account
+    create_account, get_account, list_accounts, update_account, delete_account, search_accounts, count_account_matches,
+    create_contact, get_contact, list_contacts, update_contact, delete_contact, search_contacts, count_contact_matches,
+    create_opportunity, get_opportunity, list_opportunities, update_opportunity, delete_opportunity, search_opportunities, count_opportunity_matches,
+    get_contacts_by_account, get_opportunities_by_account, search_mode
 )
 
 def truncate_text(text, max_length=30):
@@ -51,23 +55,8 @@ def truncate_text(text, max_length=30):
         return text_single_line[:max_length-3] + "..."
 
 def convert_utc_to_local_display(utc_dt_str):
-    """Converts a UTC datetime string to a local datetime string for display."""
-    if not utc_dt_str:
-        return "N/A"
-    try:
-        # Try parsing with microseconds
-        dt_utc = datetime.strptime(utc_dt_str, "%Y-%m-%d %H:%M:%S.%f")
-    except ValueError:
-        try:
-            # Try parsing without microseconds
-            dt_utc = datetime.strptime(utc_dt_str, "%Y-%m-%d %H:%M:%S")
-        except ValueError:
-            # If parsing fails, return the original string
-            return utc_dt_str
-
-    dt_utc = dt_utc.replace(tzinfo=timezone.utc)
-    dt_local = dt_utc.astimezone() # Converts to local timezone
-    return dt_local.strftime("%Y-%m-%d %H:%M:%S")
+    """Converts a UTC datetime string (or epoch seconds) to a local datetime string for display."""
+    return local_time.format(utc_dt_str)
 
 def display_main_menu():
     """Displays the main menu options."""
@@ -119,7 +108,8 @@ def display_export_menu():
     print("\n--- Export Options ---")
     print("1. Export Contacts")
     print("2. Export Opportunities")
-    print("3. Back to Main Menu")
+    print("3. Export Changes Since Last Export (accounts, contacts, opportunities)")
+    print("4. Back to Main Menu")
     print("--------------------")
 
 def graceful_exit():
@@ -198,6 +188,92 @@ def get_multiline_input(prompt):
     return result
 
 
+# Search results shown per page at the "select by search" prompts
+SEARCH_PAGE_SIZE = 20
+
+def search_first_page(search_func, query):
+    """
+    Returns (first page of results, mode) for a search at a "select by search" prompt.
+
+    The search runs in prefix mode unless the query has a '*' or '%' wildcard.
+    When nothing starts with the query, similar names are looked up (fuzzy
+    mode, which also catches misspellings), and when there are none either,
+    the query is retried as a substring search, which reads the whole table.
+    """
+    mode = search_mode(query)
+    rows = search_func(query, SEARCH_PAGE_SIZE, mode=mode)
+    if not rows and mode == 'prefix':
+        mode = 'fuzzy'
+        rows = search_func(query, SEARCH_PAGE_SIZE, mode=mode)
+        if rows:
+            print(f"Nothing starts with '{query}'; showing similar names, most similar first.")
+        else:
+            mode = 'substring'
+            rows = search_func(query, SEARCH_PAGE_SIZE, mode=mode)
+            if rows:
+                print(f"Nothing starts with '{query}'; showing results containing it.")
+    return rows, mode
+
+def choose_from_search(query, first_page, search_func, count_func, noun, describe, mode=None):
+    """
+    Shows ranked search results a page at a time and asks for the ID to select.
+
+    Args:
+        query (str): The search text
+        first_page (list): The first SEARCH_PAGE_SIZE results of search_func(query)
+        search_func: search_accounts/search_contacts/search_opportunities
+        count_func: The matching count_*_matches function
+        noun (tuple): (singular, plural) name of the entity
+        describe: Returns the display line of one row
+        mode (str, optional): The search mode first_page was fetched with
+
+    Returns the entered ID or 'back'.
+    """
+    singular, plural = noun
+    rows = first_page
+    offset = 0
+    if len(rows) < SEARCH_PAGE_SIZE:
+        total, estimated = len(rows), False
+    else:
+        total, estimated = count_func(query, mode=mode)
+    while True:
+        if offset == 0 and len(rows) == total and not estimated:
+            print(f"Found {total} matching {plural}:")
+        else:
+            total = max(total, offset + len(rows))
+            print(f"Showing {offset + 1}-{offset + len(rows)} of {'~' if estimated else ''}{total:,} "
+                  f"matching {plural}, best matches first:")
+        for row in rows:
+            print(f"  {describe(row)}")
+        has_more = len(rows) == SEARCH_PAGE_SIZE
+        more_hint = ", 'more' for the next page" if has_more else ""
+        choice = input(f"Enter the ID of the {singular} to select{more_hint} (or 'back'): ").strip().lower()
+        if choice == 'back':
+            return 'back'
+        if choice == 'more' and has_more:
+            next_rows = search_func(query, SEARCH_PAGE_SIZE, offset + SEARCH_PAGE_SIZE, mode)
+            if next_rows:
+                offset += SEARCH_PAGE_SIZE
+                rows = next_rows
+            else:
+                print(f"No more matching {plural}.")
+            continue
+        try:
+            return int(choice)
+        except ValueError:
+            print("Invalid input. Please enter an integer" + (", 'more'" if has_more else "") + " or 'back'.")
+
+def describe_account(acc):
+    """One-line description of an account for search results."""
+    from .picklist import get_picklist_value_by_id
+    industry_display = "N/A"
+    if acc['industry_id']:
+        industry_value = get_picklist_value_by_id(acc['industry_id'])
+        if industry_value:
+            industry_display = industry_value
+    return f"ID: {acc['account_id']}, Name: {acc['name']}, Industry: {industry_display}"
+
+
 def select_account_by_search(prompt="Enter Account Name or ID (or 'back'): "):
     """
     Prompts user to search for an account by name or enter an ID,
@@ -206,7 +282,8 @@ def select_account_by_search(prompt="Enter Account Name or ID (or 'back'): "):
     """
     while True:
         try:
-            query = input(prompt).strip()
+            with completing('account'):
+                query = input(prompt).strip()
             if query.lower() == 'back':
                 return 'back'
             if not query:
@@ -226,7 +303,7 @@ def select_account_by_search(prompt="Enter Account Name or ID (or 'back'): "):
                     continue # Ask again
             except ValueError:
                 # Input is not an integer, perform search
-                accounts = search_accounts(query)
+                accounts, mode = search_first_page(search_accounts, query)
                 if not accounts:
                     print(f"No accounts found matching '{query}'.")
                     continue # Ask again
@@ -241,17 +318,8 @@ def select_account_by_search(prompt="Enter Account Name or ID (or 'back'): "):
                     else:
                         continue # Ask again
                 else:
-                    print(f"Found {len(accounts)} matching accounts:")
-                    for acc in accounts:
-                        # Get industry value from picklist
-                        from .picklist import get_picklist_value_by_id
-                        industry_display = "N/A"
-                        if acc['industry_id']:  # Using direct access instead of .get()
-                            industry_value = get_picklist_value_by_id(acc['industry_id'])
-                            if industry_value:
-                                industry_display = industry_value
-                        print(f"  ID: {acc['account_id']}, Name: {acc['name']}, Industry: {industry_display}")
-                    select_id_input = get_integer_input("Enter the ID of the account to select (or 'back'): ")
+                    select_id_input = choose_from_search(query, accounts, search_accounts, count_account_matches,
+                                                         ('account', 'accounts'), describe_account, mode)
                     if select_id_input == 'back':
                         return 'back'
                     selected_account = get_account(select_id_input)
@@ -272,7 +340,8 @@ def select_contact_by_search(prompt="Enter Contact Name, Email, or ID (or 'back'
     """
     while True:
         try:
-            query = input(prompt).strip()
+            with completing('contact'):
+                query = input(prompt).strip()
             if query.lower() == 'back':
                 return 'back'
             if not query:
@@ -292,7 +361,7 @@ def select_contact_by_search(prompt="Enter Contact Name, Email, or ID (or 'back'
                     continue # Ask again
             except ValueError:
                 # Input is not an integer, perform search
-                contacts = search_contacts(query)
+                contacts, mode = search_first_page(search_contacts, query)
                 if not contacts:
                     print(f"No contacts found matching '{query}'.")
                     continue # Ask again
@@ -307,10 +376,10 @@ def select_contact_by_search(prompt="Enter Contact Name, Email, or ID (or 'back'
                     else:
                         continue # Ask again
                 else:
-                    print(f"Found {len(contacts)} matching contacts:")
-                    for con in contacts:
-                        print(f"  ID: {con['contact_id']}, Name: {con['first_name']} {con['last_name']}, Email: {con['email']}")
-                    select_id_input = get_integer_input("Enter the ID of the contact to select (or 'back'): ")
+                    select_id_input = choose_from_search(
+                        query, contacts, search_contacts, count_contact_matches, ('contact', 'contacts'),
+                        lambda con: f"ID: {con['contact_id']}, Name: {con['first_name']} {con['last_name']}, Email: {con['email']}",
+                        mode)
                     if select_id_input == 'back':
                         return 'back'
                     selected_contact = get_contact(select_id_input)
@@ -331,7 +400,8 @@ def select_opportunity_by_search(prompt="Enter Opportunity Name, Description, or
     """
     while True:
         try:
-            query = input(prompt).strip()
+            with completing('opportunity'):
+                query = input(prompt).strip()
             if query.lower() == 'back':
                 return 'back'
             if not query:
@@ -351,7 +421,7 @@ def select_opportunity_by_search(prompt="Enter Opportunity Name, Description, or
                     continue # Ask again
             except ValueError:
                 # Input is not an integer, perform search
-                opportunities = search_opportunities(query)
+                opportunities, mode = search_first_page(search_opportunities, query)
                 if not opportunities:
                     print(f"No opportunities found matching '{query}'.")
                     continue # Ask again
@@ -366,10 +436,11 @@ def select_opportunity_by_search(prompt="Enter Opportunity Name, Description, or
                     else:
                         continue # Ask again
                 else:
-                    print(f"Found {len(opportunities)} matching opportunities:")
-                    for opp in opportunities:
-                        print(f"  ID: {opp['opportunity_id']}, Name: {opp['name']}, Amount: {opp['amount']}")
-                    select_id_input = get_integer_input("Enter the ID of the opportunity to select (or 'back'): ")
+                    select_id_input = choose_from_search(
+                        query, opportunities, search_opportunities, count_opportunity_matches,
+                        ('opportunity', 'opportunities'),
+                        lambda opp: f"ID: {opp['opportunity_id']}, Name: {opp['name']}, Amount: {opp['amount']}",
+                        mode)
                     if select_id_input == 'back':
                         return 'back'
                     selected_opportunity = get_opportunity(select_id_input)
@@ -616,7 +687,7 @@ def handle_accounts_menu():
                             location_parts.append(account['country'])
                         location_display = ", ".join(location_parts) if location_parts else "N/A"
                         
-                        created_at_display = convert_utc_to_local_display(account['created_at'])
+                        created_at_display = format_created_at(account)
                         print(f"{str(account['account_id']):<{id_col_width}} | {account['name']:<{name_col_width}} | {industry_display:<{industry_col_width}} | {description_display:<{description_col_width}} | {website_display:<{website_col_width}} | {location_display:<{location_col_width}} | {created_at_display:<{created_at_col_width}}")
                     print("-" * len(header))
                 else:
@@ -653,7 +724,7 @@ def handle_accounts_menu():
                     print(f"  State      : {account['state'] or 'N/A'}")
                     print(f"  Zip        : {account['zip'] or 'N/A'}")
                     print(f"  Country    : {account['country'] or 'N/A'}")
-                    print(f"  Created At : {convert_utc_to_local_display(account['created_at'])}")
+                    print(f"  Created At : {format_created_at(account)}")
                     
                     # Display linked contacts
                     contacts = get_contacts_by_account(account['account_id'])
@@ -885,7 +956,7 @@ def handle_contacts_menu():
                                 account_display = f"Unknown Account ({contact_item['account_id']})"
                         max_account_len = max(max_account_len, len(account_display))
                         
-                        created_at_display = convert_utc_to_local_display(contact_item['created_at'])
+                        created_at_display = format_created_at(contact_item)
                         max_created_at_len = max(max_created_at_len, len(str(created_at_display)))
 
                         # Format title
@@ -986,7 +1057,7 @@ def handle_contacts_menu():
                         else:
                             account_display_details = f"Unknown Account (ID: {contact_details['account_id']})"
                     print(f"  Account      : {account_display_details}")
-                    print(f"  Created At   : {convert_utc_to_local_display(contact_details['created_at'])}")
+                    print(f"  Created At   : {format_created_at(contact_details)}")
                     print("-----------------------")
                 else:
                     print(f"Contact with ID {contact_id_selection} not found.")
@@ -1254,7 +1325,7 @@ def handle_opportunities_menu():
                             value_str = str(opp['amount']) if opp['amount'] is not None else "N/A"
                             
                             # Convert 'created_at' to local timezone display
-                            created_at_display = convert_utc_to_local_display(opp['created_at']) if opp['created_at'] else "N/A"
+                            created_at_display = format_created_at(opp)
                             
                             # Get stage from picklist
                             from .picklist import get_picklist_value_by_id
@@ -1353,7 +1424,7 @@ def handle_opportunities_menu():
                         else:
                             contact_display_details = f"Unknown Contact (ID: {opportunity_details['contact_id']})"
                     print(f"  Contact      : {contact_display_details}")
-                    print(f"  Created At   : {convert_utc_to_local_display(opportunity_details['created_at'])}")
+                    print(f"  Created At   : {format_created_at(opportunity_details)}")
                     print("-------------------------")
                 else:
                     print(f"Opportunity with ID {opportunity_id_selection} not found.")
@@ -1522,18 +1593,22 @@ def handle_opportunities_menu():
 
 
 def export_contacts_to_csv():
-    """Export contacts with account names to a CSV file."""
+    """
+    Export contacts with account names to a CSV file.
+    Returns the path of the written file, or None if nothing was exported.
+    """
     contacts = list_contacts()
     
     if not contacts:
         print("No contacts to export.")
-        return
+        return None
     
     # Create data directory if it doesn't exist
-    os.makedirs('data', exist_ok=True)
+    from . import database
+    os.makedirs(database.DATA_DIR, exist_ok=True)
     
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"data/contacts_export_{timestamp}.csv"
+    filename = os.path.join(database.DATA_DIR, f"contacts_export_{timestamp}.csv")
     
     try:
         with open(filename, 'w', newline='') as csvfile:
@@ -1568,22 +1643,28 @@ def export_contacts_to_csv():
                 })
         
         print(f"SUCCESS: Contacts exported to {filename}")
+        return filename
     except Exception as e:
         print(f"ERROR: Failed to export contacts: {e}")
+        return None
 
 def export_opportunities_to_csv():
-    """Export opportunities with account names and contact details to a CSV file."""
+    """
+    Export opportunities with account names and contact details to a CSV file.
+    Returns the path of the written file, or None if nothing was exported.
+    """
     opportunities = list_opportunities()
     
     if not opportunities:
         print("No opportunities to export.")
-        return
+        return None
     
     # Create data directory if it doesn't exist
-    os.makedirs('data', exist_ok=True)
+    from . import database
+    os.makedirs(database.DATA_DIR, exist_ok=True)
     
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"data/opportunities_export_{timestamp}.csv"
+    filename = os.path.join(database.DATA_DIR, f"opportunities_export_{timestamp}.csv")
     
     try:
         with open(filename, 'w', newline='') as csvfile:
@@ -1617,12 +1698,14 @@ def export_opportunities_to_csv():
                     'Account Name': account_name,
                     'Contact Name': contact_name,
                     'Contact Email': contact_email,
-                    'Created At': convert_utc_to_local_display(opp['created_at'])
+                    'Created At': format_created_at(opp)
                 })
         
         print(f"SUCCESS: Opportunities exported to {filename}")
+        return filename
     except Exception as e:
         print(f"ERROR: Failed to export opportunities: {e}")
+        return None
 
 def handle_export_menu():
     """Handles the export menu options."""
@@ -1632,10 +1715,15 @@ def handle_export_menu():
             choice = input("Enter your choice: ").strip()
             
             if choice == '1':  # Export Contacts
-                export_contacts_to_csv()
+                with reporting():
+                    export_contacts_to_csv()
             elif choice == '2':  # Export Opportunities
-                export_opportunities_to_csv()
-            elif choice == '3':  # Back to Main Menu
+                with reporting():
+                    export_opportunities_to_csv()
+            elif choice == '3':  # Export Changes Since Last Export
+                from .changelog import handle_delta_export_menu_option
+                handle_delta_export_menu_option()
+            elif choice == '4':  # Back to Main Menu
                 break
             else:
                 print("Invalid choice. Please try again.")
@@ -1643,10 +1731,13 @@ def handle_export_menu():
             graceful_exit()
 
 
-def main():
+def main(in_memory=False):
     """
     Main function for the CRM CLI application.
     Displays menus and handles user interaction.
+
+    Args:
+        in_memory (bool): Work on an in-memory copy of the database (see in_memory.py)
     """
     # Ensure database tables exist and are properly migrated
     initialize_database()
@@ -1677,6 +1768,16 @@ def main():
             cursor.close()
             conn.close()
 
+    if in_memory:
+        # Reads are served from RAM; no entity cache needed
+        from .in_memory import start_session
+        if start_session() is None:
+            return
+    else:
+        # Keep one connection for the session and cache entity lookups on it
+        from .crm_dal import enable_entity_cache
+        enable_entity_cache()
+
     print("Welcome to the Simple CRM CLI Application!")
 
     while True:
@@ -1691,7 +1792,8 @@ def main():
             elif choice == '3':
                 handle_opportunities_menu()
             elif choice == '4': # Handle Summary
-                handle_summary_menu()
+                with reporting():
+                    handle_summary_menu()
             elif choice == '5': # Handle Export
                 handle_export_menu()
             elif choice == '6': # Handle Admin
@@ -1707,9 +1809,127 @@ def main():
             graceful_exit()
 
 
+def build_arg_parser():
+    """Builds the command-line argument parser for the application."""
+    import argparse
+    from .profiling import PROFILE_MODES
+    parser = argparse.ArgumentParser(
+        prog="python -m src.main",
+        description="Simple CRM CLI Application"
+    )
+    parser.add_argument(
+        "--profile", choices=PROFILE_MODES, default=None,
+        help="Profile the whole session with cProfile ('cpu'), tracemalloc ('memory') or both. "
+             "Reports are written to data/profiles/ on exit. Can also be set with CRM_PROFILE."
+    )
+    parser.add_argument(
+        "--batch", nargs="?", const="-", default=None, metavar="FILE",
+        help="Run JSON Lines commands from FILE (or stdin if omitted) instead of the menus, "
+             "writing one JSON result per line to stdout."
+    )
+    parser.add_argument(
+        "--group-size", type=int, default=1, metavar="N",
+        help="In batch mode, commit every N commands in one transaction (default: 1)."
+    )
+    parser.add_argument(
+        "--serve", type=int, nargs="?", const=8080, default=None, metavar="PORT",
+        help="Serve the CRM data as a local JSON HTTP API on PORT (default: 8080) instead of the menus."
+    )
+    parser.add_argument(
+        "--host", default="127.0.0.1",
+        help="Interface the HTTP API binds to (default: 127.0.0.1)."
+    )
+    parser.add_argument(
+        "--backup", nargs="?", const="gzip", default=None, choices=["gzip", "zstd", "none"],
+        help="Make an online backup of the database into data/backups/ and exit "
+             "(compression: gzip (default), zstd or none)."
+    )
+    parser.add_argument(
+        "--restore", default=None, metavar="BACKUP_FILE",
+        help="Verify BACKUP_FILE and restore the database from it, then exit."
+    )
+    parser.add_argument(
+        "--in-memory", action="store_true",
+        help="Load the whole database into memory at startup and work on that copy. "
+             "Changes are saved to disk from the Admin menu or on exit."
+    )
+    parser.add_argument(
+        "--write-back", action="store_true",
+        help="With --in-memory, save changes to disk on exit without asking."
+    )
+    parser.add_argument(
+        "--tenant", default=None, metavar="TENANT_ID",
+        help="Use the tenant's own database, data/tenants/TENANT_ID/crm.db (created on first use). "
+             "Applies to the menus, --batch, --serve, --backup and --restore."
+    )
+    return parser
+
+
+def run(argv=None):
+    """
+    Entry point used by `python -m src.main`.
+    Parses command-line options and runs the interactive session.
+    """
+    from .profiling import resolve_profile_mode, run_profiled
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if args.group_size < 1:
+        parser.error("--group-size must be at least 1")
+    profile_mode = resolve_profile_mode(args.profile)
+    if args.in_memory and (args.batch is not None or args.serve is not None
+                           or args.backup is not None or args.restore is not None):
+        parser.error("--in-memory only applies to the interactive menus")
+    if args.write_back and not args.in_memory:
+        parser.error("--write-back requires --in-memory")
+
+    if args.tenant is not None:
+        from .tenants import TenantError, select_tenant
+        try:
+            select_tenant(args.tenant)
+        except TenantError as e:
+            parser.error(str(e))
+
+    if args.backup is not None or args.restore is not None:
+        from . import backup
+        if args.restore is not None:
+            success = run_profiled(backup.restore_backup, profile_mode, args.restore)
+        else:
+            success = run_profiled(backup.create_backup, profile_mode, args.backup)
+        sys.exit(0 if success else 1)
+
+    from .maintenance import run_exit_maintenance
+
+    if args.batch is not None:
+        from . import batch
+        success = run_profiled(batch.main, profile_mode, args.batch, args.group_size)
+        # stdout carries only the JSONL results
+        with contextlib.redirect_stdout(sys.stderr):
+            run_exit_maintenance()
+        sys.exit(0 if success else 1)
+
+    if args.serve is not None:
+        from .api_server import serve
+        try:
+            run_profiled(serve, profile_mode, args.host, args.serve)
+        finally:
+            with contextlib.redirect_stdout(sys.stderr):
+                run_exit_maintenance()
+        return
+
+    from .crm_dal import disable_entity_cache, get_session_connection
+    from .in_memory import end_session
+    try:
+        run_profiled(main, profile_mode, args.in_memory)
+    finally:
+        end_session(save=True if args.write_back else None)
+        # Prefer the session connection: PRAGMA optimize uses what it has queried
+        run_exit_maintenance(get_session_connection())
+        disable_entity_cache()
+
+
 if __name__ == "__main__":
     try:
-        main()
+        run()
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
         sys.exit(1)
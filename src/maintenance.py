@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Database Maintenance for CRM Application
+
+Keeps the query planner's statistics current and returns free pages to the
+file system:
+
+- On exit the interactive session runs PRAGMA optimize on its long-lived
+  connection, which re-analyzes only the tables whose statistics are stale,
+  and, if more than FREELIST_THRESHOLD of the file is free pages, runs
+  incremental_vacuum in steps of VACUUM_STEP_PAGES for at most
+  EXIT_VACUUM_SECONDS.
+- Migration 7 switches databases to auto_vacuum=INCREMENTAL, which is what
+  lets free pages be released a few at a time instead of by a full VACUUM.
+- "Optimize Database Now" in the Admin menu (or `python -m src.maintenance
+  optimize`) runs a full ANALYZE and releases every free page, and prints
+  file size and timings of a few typical queries before and after.
+"""
+
+import os
+import sqlite3
+from time import perf_counter
+
+from . import database
+from .retry import run_with_retry
+
+# Rows sampled per index by ANALYZE on exit; keeps PRAGMA optimize fast on big tables
+ANALYSIS_LIMIT = int(os.environ.get('CRM_ANALYSIS_LIMIT', 400))
+
+# Pages released per incremental_vacuum step (each step is its own short transaction)
+VACUUM_STEP_PAGES = int(os.environ.get('CRM_VACUUM_STEP_PAGES', 1000))
+
+# Fraction of the file that has to be free pages before vacuuming on exit
+FREELIST_THRESHOLD = float(os.environ.get('CRM_FREELIST_THRESHOLD', 0.10))
+
+# Time budget for vacuuming on exit
+EXIT_VACUUM_SECONDS = float(os.environ.get('CRM_EXIT_VACUUM_SECONDS', 1.0))
+
+AUTO_VACUUM_MODES = {0: 'none', 1: 'full', 2: 'incremental'}
+
+# Queries timed before and after "optimize now"
+_PROBE_QUERIES = [
+    ('Count contacts', "SELECT COUNT(*) FROM Contacts"),
+    ('Contacts of one account',
+     "SELECT * FROM Contacts WHERE account_id = (SELECT MAX(account_id) FROM Accounts)"),
+    ('Opportunities of one account',
+     "SELECT * FROM Opportunities WHERE account_id = (SELECT MAX(account_id) FROM Accounts)"),
+    ('Contacts by last name prefix', "SELECT COUNT(*) FROM Contacts WHERE last_name LIKE 'Smi%'"),
+    ('Opportunity totals by stage', "SELECT stage_id, COUNT(*), SUM(amount) FROM Opportunities GROUP BY stage_id"),
+]
+
+def _connect():
+    """Open an autocommit connection to the current database."""
+    return sqlite3.connect(database.DATABASE_NAME, isolation_level=None,
+                           timeout=database.BUSY_TIMEOUT_MS / 1000)
+
+def get_storage_stats(conn):
+    """
+    Return page and file statistics of a database.
+
+    Returns:
+        dict: page_size, page_count, freelist_count, free_ratio, auto_vacuum, file_bytes
+    """
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist_count = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    return {
+        'page_size': page_size,
+        'page_count': page_count,
+        'freelist_count': freelist_count,
+        'free_ratio': freelist_count / page_count if page_count else 0.0,
+        'auto_vacuum': AUTO_VACUUM_MODES.get(mode, str(mode)),
+        'file_bytes': page_size * page_count,
+    }
+
+def has_statistics(conn):
+    """True if ANALYZE has ever been run on the database."""
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone() is not None
+
+def optimize(conn, analysis_limit=ANALYSIS_LIMIT):
+    """
+    Run PRAGMA optimize on a connection, with ANALYZE sampling capped at analysis_limit rows.
+
+    Before SQLite 3.46, optimize only looks at tables the connection has
+    queried, so a database that was never analyzed gets one (sampled) ANALYZE.
+    """
+    conn.execute(f"PRAGMA analysis_limit = {int(analysis_limit)}")
+    if not has_statistics(conn):
+        conn.execute("ANALYZE")
+    elif sqlite3.sqlite_version_info >= (3, 46, 0):
+        # 0x10000: check every table, not just the ones this connection used
+        conn.execute("PRAGMA optimize = 0x10002")
+    else:
+        conn.execute("PRAGMA optimize")
+
+def incremental_vacuum(conn, max_seconds=None, step_pages=VACUUM_STEP_PAGES, threshold=0.0):
+    """
+    Release free pages in steps of step_pages, each step its own transaction.
+
+    Does nothing unless the database uses auto_vacuum=INCREMENTAL (migration 7).
+
+    Args:
+        conn (sqlite3.Connection): Autocommit connection
+        max_seconds (float, optional): Stop starting new steps after this long
+        step_pages (int): Pages released per step
+        threshold (float): Only start if at least this fraction of pages is free
+
+    Returns:
+        int: Number of pages released
+    """
+    stats = get_storage_stats(conn)
+    if stats['auto_vacuum'] != 'incremental' or not stats['freelist_count'] or stats['free_ratio'] < threshold:
+        return 0
+    started = perf_counter()
+    released = 0
+    free = stats['freelist_count']
+    while free:
+        run_with_retry(lambda: conn.execute(f"PRAGMA incremental_vacuum({int(step_pages)})").fetchall())
+        remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        released += free - remaining
+        if remaining >= free or (max_seconds is not None and perf_counter() - started >= max_seconds):
+            break
+        free = remaining
+    return released
+
+def run_exit_maintenance(conn=None):
+    """
+    Quick maintenance when the application exits: PRAGMA optimize, then a
+    time-boxed incremental vacuum if the freelist is large. Errors are reported
+    but never stop the exit.
+
+    Args:
+        conn: The session's long-lived connection (its query history tells
+              PRAGMA optimize which tables matter); a new one is opened if None
+    """
+    own_connection = conn is None
+    try:
+        if own_connection:
+            conn = _connect()
+        elif conn.in_transaction:
+            return  # someone else's transaction; leave it alone
+        optimize(conn)
+        released = incremental_vacuum(conn, EXIT_VACUUM_SECONDS, threshold=FREELIST_THRESHOLD)
+        if released:
+            print(f"Released {released} free database pages.")
+    except sqlite3.Error as e:
+        print(f"Database maintenance skipped: {e}")
+    finally:
+        if own_connection and conn is not None:
+            conn.close()
+
+def time_probe_queries(conn, repeat=3):
+    """Return [(label, best milliseconds)] for the probe queries."""
+    timings = []
+    for label, sql in _PROBE_QUERIES:
+        best = None
+        for _ in range(repeat):
+            started = perf_counter()
+            try:
+                conn.execute(sql).fetchall()
+            except sqlite3.Error:
+                break
+            elapsed = (perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        timings.append((label, best))
+    return timings
+
+def optimize_now(show_progress=True):
+    """
+    Full maintenance: ANALYZE every table, PRAGMA optimize, then release all free
+    pages (incremental_vacuum, or VACUUM if the database is not in incremental mode).
+
+    Returns:
+        dict: 'before' and 'after' storage stats and probe timings, and 'steps'
+              with the seconds each step took; None on failure
+    """
+    if not os.path.exists(database.DATABASE_NAME):
+        print(f"Database file {database.DATABASE_NAME} does not exist.")
+        return None
+    conn = _connect()
+    try:
+        before = get_storage_stats(conn)
+        before_timings = time_probe_queries(conn)
+        steps = []
+
+        started = perf_counter()
+        conn.execute("PRAGMA analysis_limit = 0")
+        run_with_retry(lambda: conn.execute("ANALYZE"))
+        conn.execute("PRAGMA optimize")
+        steps.append(('ANALYZE + optimize', perf_counter() - started))
+
+        started = perf_counter()
+        if before['auto_vacuum'] == 'incremental':
+            incremental_vacuum(conn)
+            steps.append(('Incremental vacuum', perf_counter() - started))
+        elif before['freelist_count']:
+            run_with_retry(lambda: conn.execute("VACUUM"))
+            steps.append(('VACUUM', perf_counter() - started))
+
+        after = get_storage_stats(conn)
+        after_timings = time_probe_queries(conn)
+    except sqlite3.Error as e:
+        print(f"Error optimizing database: {e}")
+        return None
+    finally:
+        conn.close()
+
+    result = {'before': before, 'after': after, 'steps': steps,
+              'timings': [(label, first, second) for (label, first), (_, second) in zip(before_timings, after_timings)]}
+    if show_progress:
+        print_report(result)
+    return result
+
+def _ms(value):
+    return f"{value:.2f} ms" if value is not None else "n/a"
+
+def print_report(result):
+    before, after = result['before'], result['after']
+    print(f"File size : {before['file_bytes'] / 1024 / 1024:.1f} MiB -> {after['file_bytes'] / 1024 / 1024:.1f} MiB")
+    print(f"Free pages: {before['freelist_count']} -> {after['freelist_count']} "
+          f"(auto_vacuum={after['auto_vacuum']})")
+    for label, seconds in result['steps']:
+        print(f"{label}: {seconds:.2f} s")
+    print(f"{'Query':<32} {'Before':>12} {'After':>12}")
+    for label, first, second in result['timings']:
+        print(f"{label:<32} {_ms(first):>12} {_ms(second):>12}")
+
+def print_status():
+    conn = _connect()
+    try:
+        stats = get_storage_stats(conn)
+        analyzed = has_statistics(conn)
+    finally:
+        conn.close()
+    print(f"File size      : {stats['file_bytes'] / 1024 / 1024:.1f} MiB ({stats['page_count']} pages of {stats['page_size']} bytes)")
+    print(f"Free pages     : {stats['freelist_count']} ({stats['free_ratio']:.1%})")
+    print(f"auto_vacuum    : {stats['auto_vacuum']}")
+    print(f"Statistics     : {'present' if analyzed else 'never analyzed'}")
+
+def handle_optimize_menu_option():
+    """Admin menu: run full maintenance and show the before/after report."""
+    print("\n--- Optimize Database ---")
+    print("Analyzing tables and releasing free space. Other sessions may wait briefly.")
+    optimize_now()
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+    parser = argparse.ArgumentParser(description="Analyze and vacuum the CRM database")
+    parser.add_argument('command', choices=['status', 'optimize', 'vacuum'],
+                        help="'vacuum' releases free pages only (incremental mode)")
+    args = parser.parse_args()
+    if args.command == 'status':
+        print_status()
+    elif args.command == 'optimize':
+        sys.exit(0 if optimize_now() else 1)
+    else:
+        conn = _connect()
+        try:
+            print(f"Released {incremental_vacuum(conn)} free pages.")
+        finally:
+            conn.close()
@@ -0,0 +1,801 @@
+#!/usr/bin/env python3
+"""
+Versioned Schema Migrations for CRM Application
+
+Schema changes are numbered steps listed in MIGRATIONS. Applied steps are
+recorded in the schema_migrations ledger together with how long they took, so
+each step runs once per database and new steps are picked up automatically.
+
+Every step is written to be safe on databases created by older versions of the
+application (which have no ledger): it checks the current schema and only does
+what is missing.
+
+Large table rebuilds (see rebuild_table) do not copy the whole table in one
+transaction. Rows are copied in primary-key ranges, each range in its own short
+transaction, so other connections can keep reading and writing in between.
+Triggers keep already-copied rows in step with writes made during the copy.
+The position reached is saved in migration_progress after every batch, so an
+interrupted rebuild continues where it stopped the next time migrations run.
+
+Usage:
+    python -m src.migrations status
+    python -m src.migrations up [--batch-size N]
+    python -m src.migrations compact [--batch-size N]
+"""
+
+import os
+import sys
+import sqlite3
+from collections import namedtuple
+from contextlib import contextmanager
+from time import perf_counter
+
+from . import database
+from .retry import run_with_retry
+
+# Rows copied per transaction by rebuild_table()
+DEFAULT_BATCH_SIZE = int(os.environ.get('CRM_MIGRATION_BATCH_SIZE', 10000))
+
+# A numbered schema change. apply(conn, run) receives an autocommit connection;
+# steps that are not batched run inside one transaction opened by the engine.
+Migration = namedtuple('Migration', ['version', 'name', 'apply', 'batched'])
+
+# Per-run settings handed to each step
+MigrationRun = namedtuple('MigrationRun', ['version', 'batch_size', 'show_progress'])
+
+class MigrationError(Exception):
+    """A migration step found the database in a state it cannot safely migrate."""
+
+def _connect(path=None):
+    """Open an autocommit connection; the engine manages transactions itself."""
+    conn = sqlite3.connect(path or database.DATABASE_NAME, isolation_level=None,
+                           timeout=database.BUSY_TIMEOUT_MS / 1000)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+@contextmanager
+def _transaction(conn):
+    """Run the block in a write transaction, waiting out other writers first."""
+    run_with_retry(lambda: conn.execute("BEGIN IMMEDIATE"))
+    try:
+        yield
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+
+def get_table_columns(conn, table_name):
+    """Return the column names of a table (empty if the table does not exist)."""
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table_name})").fetchall()]
+
+def table_exists(conn, table_name):
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)).fetchone()
+    return row is not None
+
+def ensure_ledger(conn):
+    """Create the migration ledger and progress tables if needed."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            duration_ms REAL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS migration_progress (
+            version INTEGER NOT NULL,
+            task TEXT NOT NULL,
+            last_key INTEGER,
+            rows_copied INTEGER DEFAULT 0,
+            PRIMARY KEY (version, task)
+        )
+    """)
+
+def get_applied_migrations(conn):
+    """Return {version: row} for every step recorded in the ledger."""
+    if not table_exists(conn, 'schema_migrations'):
+        return {}
+    rows = conn.execute("SELECT version, name, applied_at, duration_ms FROM schema_migrations").fetchall()
+    return {row['version']: row for row in rows}
+
+def pending_migrations(path=None):
+    """
+    Return the steps not yet applied to a database, in order.
+
+    Args:
+        path (str, optional): Database file; defaults to database.DATABASE_NAME
+    """
+    path = path or database.DATABASE_NAME
+    if not os.path.exists(path):
+        return list(MIGRATIONS)
+    conn = _connect(path)
+    try:
+        applied = get_applied_migrations(conn)
+    finally:
+        conn.close()
+    return [step for step in MIGRATIONS if step.version not in applied]
+
+def run_migrations(path=None, batch_size=None, show_progress=True, compact=False):
+    """
+    Apply all pending migration steps in order.
+
+    Args:
+        path (str, optional): Database file; defaults to database.DATABASE_NAME
+        batch_size (int, optional): Rows per transaction for table rebuilds
+        show_progress (bool): Print progress of each step
+        compact (bool): Also convert the database to the opt-in compact layout
+                        (see COMPACT_LAYOUT)
+
+    Returns:
+        bool: True if the database is now up to date, False if a step failed
+    """
+    path = path or database.DATABASE_NAME
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    conn = _connect(path)
+    try:
+        ensure_ledger(conn)
+        applied = get_applied_migrations(conn)
+        for step in MIGRATIONS + ([COMPACT_LAYOUT] if compact else []):
+            if step.version in applied:
+                continue
+            run = MigrationRun(step.version, batch_size or DEFAULT_BATCH_SIZE, show_progress)
+            if show_progress:
+                print(f"Applying migration {step.version:03d} ({step.name})...")
+            started = perf_counter()
+            try:
+                if step.batched:
+                    step.apply(conn, run)
+                    with _transaction(conn):
+                        _record(conn, step, started)
+                else:
+                    with _transaction(conn):
+                        step.apply(conn, run)
+                        _record(conn, step, started)
+            except (sqlite3.Error, MigrationError) as e:
+                print(f"Migration {step.version:03d} ({step.name}) failed: {e}")
+                return False
+            if show_progress:
+                print(f"Migration {step.version:03d} done in {perf_counter() - started:.2f} s")
+        return True
+    finally:
+        conn.close()
+
+def _record(conn, step, started):
+    conn.execute(
+        "INSERT OR REPLACE INTO schema_migrations (version, name, duration_ms) VALUES (?, ?, ?)",
+        (step.version, step.name, (perf_counter() - started) * 1000)
+    )
+
+# --- Batched table rebuilds ---
+
+def _sync_triggers(table, new_table, columns, expressions, key):
+    """Triggers that mirror writes on the source table into the table being built."""
+    column_list = ', '.join(columns)
+    select = f"SELECT {', '.join(expressions)} FROM {table} WHERE {key} = NEW.{key}"
+    return {
+        f"_migrate_{table}_insert": f"""
+            CREATE TRIGGER IF NOT EXISTS _migrate_{table}_insert AFTER INSERT ON {table} BEGIN
+                INSERT OR REPLACE INTO {new_table} ({column_list}) {select};
+            END""",
+        f"_migrate_{table}_update": f"""
+            CREATE TRIGGER IF NOT EXISTS _migrate_{table}_update AFTER UPDATE ON {table} BEGIN
+                DELETE FROM {new_table} WHERE {key} = OLD.{key};
+                INSERT OR REPLACE INTO {new_table} ({column_list}) {select};
+            END""",
+        f"_migrate_{table}_delete": f"""
+            CREATE TRIGGER IF NOT EXISTS _migrate_{table}_delete AFTER DELETE ON {table} BEGIN
+                DELETE FROM {new_table} WHERE {key} = OLD.{key};
+            END""",
+    }
+
+def rebuild_table(conn, run, table, create_sql, columns, expressions=None, key=None, index_sql=None):
+    """
+    Rebuild a table with a new definition, copying its rows in key-range batches.
+
+    Safe to call again after an interruption: the copy resumes from the last
+    committed batch.
+
+    Args:
+        conn (sqlite3.Connection): Autocommit connection from the engine
+        run (MigrationRun): The running step
+        table (str): Table to rebuild
+        create_sql (str): CREATE TABLE IF NOT EXISTS statement with a {table} placeholder
+        columns (list): Columns of the new table to fill
+        expressions (list, optional): SQL expressions over the old table for each column;
+                                      defaults to the column names
+        key (str, optional): Integer primary key; defaults to the first column
+        index_sql (list, optional): Indexes to create on the new table; defaults to
+                                    re-creating the old table's indexes
+    """
+    new_table = f"{table}_new"
+    expressions = expressions or columns
+    key = key or columns[0]
+    triggers = _sync_triggers(table, new_table, columns, expressions, key)
+
+    with _transaction(conn):
+        conn.execute(create_sql.format(table=new_table))
+        for trigger_sql in triggers.values():
+            conn.execute(trigger_sql)
+        conn.execute(
+            f"INSERT OR IGNORE INTO migration_progress (version, task, last_key) "
+            f"SELECT ?, ?, COALESCE(MIN({key}), 0) - 1 FROM {table}",
+            (run.version, table)
+        )
+
+    progress = conn.execute("SELECT last_key, rows_copied FROM migration_progress WHERE version = ? AND task = ?",
+                            (run.version, table)).fetchone()
+    last_key, copied = progress['last_key'], progress['rows_copied']
+    max_key = conn.execute(f"SELECT MAX({key}) FROM {table}").fetchone()[0]
+    total = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    if run.show_progress and copied:
+        print(f"  Resuming {table} rebuild after {copied} rows")
+
+    insert = (f"INSERT OR REPLACE INTO {new_table} ({', '.join(columns)}) "
+              f"SELECT {', '.join(expressions)} FROM {table} WHERE {key} > ? AND {key} <= ?")
+    started = last_report = perf_counter()
+    copied_this_run = 0
+    while max_key is not None and last_key < max_key:
+        upper = last_key + run.batch_size
+        with _transaction(conn):
+            rows = conn.execute(insert, (last_key, upper)).rowcount
+            conn.execute(
+                "UPDATE migration_progress SET last_key = ?, rows_copied = rows_copied + ? WHERE version = ? AND task = ?",
+                (upper, rows, run.version, table)
+            )
+        last_key = upper
+        copied += rows
+        copied_this_run += rows
+        now = perf_counter()
+        if run.show_progress and total and (now - last_report >= 0.5 or last_key >= max_key):
+            last_report = now
+            rate = copied_this_run / max(now - started, 1e-6)
+            print(f"\r  Copying {table}: {min(copied, total)}/{total} rows "
+                  f"({min(copied, total) * 100 // total}%), {rate:,.0f} rows/s", end='', flush=True)
+    if run.show_progress and total:
+        print()
+
+    # Swap the tables in one short transaction
+    with _transaction(conn):
+        if index_sql is None:
+            index_sql = [row[0] for row in conn.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+                (table,)).fetchall()]
+        trigger_sql = [row[0] for row in conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = ? AND name NOT LIKE '\\_migrate\\_%' ESCAPE '\\'",
+            (table,)).fetchall()]
+        for trigger_name in triggers:
+            conn.execute(f"DROP TRIGGER IF EXISTS {trigger_name}")
+        conn.execute(f"DROP TABLE {table}")
+        conn.execute(f"ALTER TABLE {new_table} RENAME TO {table}")
+        for sql in list(index_sql) + trigger_sql:
+            conn.execute(sql)
+        conn.execute("DELETE FROM migration_progress WHERE version = ? AND task = ?", (run.version, table))
+
+# --- Migration steps ---
+
+def _create_base_tables(conn, run):
+    """Create any missing tables with the current definitions."""
+    with database.bind_connection(conn, defer_commit=True):
+        database.create_tables()
+    for table in ('PicklistType', 'PicklistValue', 'Accounts', 'Contacts', 'Opportunities'):
+        if not table_exists(conn, table):
+            raise MigrationError(f"table {table} could not be created")
+
+# Columns added after the first release of each table
+_ADDED_COLUMNS = {
+    'Accounts': {
+        'description': 'TEXT',
+        'website': 'TEXT',
+        'street': 'TEXT',
+        'city': 'TEXT',
+        'state': 'TEXT',
+        'zip': 'TEXT',
+        'country': 'TEXT',
+        'industry_id': 'INTEGER',
+    },
+    'Contacts': {
+        'title': 'TEXT',
+        'description': 'TEXT',
+        'website': 'TEXT',
+        'street': 'TEXT',
+        'city': 'TEXT',
+        'state': 'TEXT',
+        'zip': 'TEXT',
+        'country': 'TEXT',
+    },
+    'Opportunities': {
+        'stage_id': 'INTEGER',
+    },
+}
+
+def _add_missing_columns(conn, run):
+    for table, required in _ADDED_COLUMNS.items():
+        existing = get_table_columns(conn, table)
+        for column, data_type in required.items():
+            if column not in existing:
+                print(f"Adding column '{column}' to {table} table")
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {data_type}")
+
+def _migrate_picklist_values(conn, run):
+    """Move legacy free-text industry and stage values into the picklists."""
+    has_industry = 'industry' in get_table_columns(conn, 'Accounts')
+    has_stage = 'stage' in get_table_columns(conn, 'Opportunities')
+    if not (has_industry or has_stage):
+        return
+    from .picklist import create_picklist_type, migrate_existing_data
+    with database.bind_connection(conn, defer_commit=True):
+        # The legacy values need somewhere to go even if no picklists were imported yet
+        if has_industry:
+            create_picklist_type('industry', 'account', 'Industry categories')
+        if has_stage:
+            create_picklist_type('stage', 'opportunity', 'Opportunity stages')
+        if not migrate_existing_data():
+            raise MigrationError("legacy industry/stage values could not be moved to picklists")
+
+_ACCOUNTS_DEFINITION = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        account_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        industry_id INTEGER,
+        description TEXT,
+        website TEXT,
+        street TEXT,
+        city TEXT,
+        state TEXT,
+        zip TEXT,
+        country TEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (industry_id) REFERENCES PicklistValue(picklist_value_id)
+    )
+"""
+
+def _drop_legacy_account_industry(conn, run):
+    """Rebuild Accounts without the legacy free-text industry column."""
+    if 'industry' not in get_table_columns(conn, 'Accounts'):
+        return
+    unmigrated = conn.execute(
+        "SELECT COUNT(*) FROM Accounts WHERE industry IS NOT NULL AND industry != '' AND industry_id IS NULL"
+    ).fetchone()[0]
+    if unmigrated:
+        raise MigrationError(f"{unmigrated} accounts have an industry that was not moved to the picklist; "
+                             "refusing to drop the industry column")
+    columns = ['account_id', 'name', 'industry_id', 'description', 'website', 'street', 'city',
+               'state', 'zip', 'country', 'created_at']
+    rebuild_table(conn, run, 'Accounts', _ACCOUNTS_DEFINITION, columns)
+
+def _create_duplicate_pairs(conn, run):
+    """Create the review table written by the duplicate detection job (dedupe.py)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS DuplicatePairs (
+            pair_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            entity TEXT NOT NULL,
+            record_id_a INTEGER NOT NULL,
+            record_id_b INTEGER NOT NULL,
+            score REAL NOT NULL,
+            reasons TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            detected_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (entity, record_id_a, record_id_b)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_duplicate_pairs_review ON DuplicatePairs (entity, status, score)")
+
+# (table, generated column, source column, index) for integer epoch copies of timestamp columns
+_EPOCH_COLUMNS = [
+    ('Accounts', 'created_epoch', 'created_at', 'idx_accounts_created_epoch'),
+    ('Contacts', 'created_epoch', 'created_at', 'idx_contacts_created_epoch'),
+    ('Opportunities', 'created_epoch', 'created_at', 'idx_opportunities_created_epoch'),
+    ('Opportunities', 'close_epoch', 'close_date', 'idx_opportunities_close_epoch'),
+]
+
+def _add_epoch_columns(conn, run):
+    """
+    Add indexed integer epoch columns generated from the text timestamps.
+
+    The columns are VIRTUAL, so existing rows are not rewritten; only the
+    indexes store the values. Text that is not a valid date gives NULL.
+    """
+    for table, column, source, index in _EPOCH_COLUMNS:
+        # table_info hides generated columns; table_xinfo lists them
+        existing = [row[1] for row in conn.execute(f"PRAGMA table_xinfo({table})").fetchall()]
+        if column not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER "
+                         f"GENERATED ALWAYS AS (CAST(strftime('%s', {source}) AS INTEGER)) VIRTUAL")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {table} ({column})")
+
+def _enable_incremental_auto_vacuum(conn, run):
+    """
+    Switch the file to auto_vacuum=INCREMENTAL so that maintenance.py can
+    release free pages in small steps. Changing the mode of an existing
+    database takes one full VACUUM, which cannot run inside a transaction.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    run_with_retry(lambda: conn.execute("VACUUM"))
+
+def _create_stats_history(conn, run):
+    """Create the table where db_stats.py records size and row-count snapshots."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS DatabaseStatsHistory (
+            snapshot_id INTEGER NOT NULL,
+            recorded_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            object_name TEXT NOT NULL,
+            object_type TEXT NOT NULL,
+            row_count INTEGER,
+            size_bytes INTEGER,
+            PRIMARY KEY (snapshot_id, object_name)
+        )
+    """)
+
+# (table, key column) of the tables whose writes are recorded in ChangeLog
+_CHANGE_LOGGED_TABLES = [
+    ('Accounts', 'account_id'),
+    ('Contacts', 'contact_id'),
+    ('Opportunities', 'opportunity_id'),
+]
+
+def _create_change_log(conn, run):
+    """
+    Record every insert, update and delete on the entity tables in ChangeLog,
+    for incremental exports (see changelog.py). rebuild_table() carries the
+    triggers over when a table is rebuilt.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ChangeLog (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            entity TEXT NOT NULL,
+            record_id INTEGER NOT NULL,
+            operation TEXT NOT NULL CHECK (operation IN ('insert', 'update', 'delete')),
+            changed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_change_log_record ON ChangeLog (entity, record_id, seq)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ExportWatermark (
+            consumer TEXT NOT NULL,
+            entity TEXT NOT NULL,
+            last_seq INTEGER NOT NULL,
+            exported_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (consumer, entity)
+        )
+    """)
+    for table, key in _CHANGE_LOGGED_TABLES:
+        for operation, row in (('insert', 'NEW'), ('update', 'NEW'), ('delete', 'OLD')):
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS changelog_{table.lower()}_{operation}
+                AFTER {operation.upper()} ON {table}
+                BEGIN
+                    INSERT INTO ChangeLog (entity, record_id, operation) VALUES ('{table}', {row}.{key}, '{operation}');
+                END
+            """)
+
+# (index, table, indexed expression) for the prefix searches of crm_dal._PREFIX_FIELDS
+_PREFIX_SEARCH_INDEXES = [
+    ('idx_accounts_name_nocase', 'Accounts', 'name'),
+    ('idx_contacts_full_name_nocase', 'Contacts', "(first_name || ' ' || last_name)"),
+    ('idx_contacts_last_name_nocase', 'Contacts', 'last_name'),
+    ('idx_contacts_email_nocase', 'Contacts', 'email'),
+    ('idx_opportunities_name_nocase', 'Opportunities', 'name'),
+]
+
+def _create_prefix_search_indexes(conn, run):
+    """
+    Index the prefix-searched columns (and the contact full name expression)
+    with NOCASE collation, so a case-insensitive prefix search is a range scan.
+    """
+    for index, table, expression in _PREFIX_SEARCH_INDEXES:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {table} ({expression} COLLATE NOCASE)")
+
+# (table, trigram index of its terms, source columns, {field: expression over {row}})
+# for crm_dal fuzzy search
+_FUZZY_FIELDS = [
+    ('Accounts', 'AccountTermTrigrams', ('name',), {'name': '{row}.name'}),
+    ('Contacts', 'ContactTermTrigrams', ('first_name', 'last_name', 'email'),
+     {'full_name': "{row}.first_name || ' ' || {row}.last_name", 'email': '{row}.email'}),
+    ('Opportunities', 'OpportunityTermTrigrams', ('name',), {'name': '{row}.name'}),
+]
+
+# Text indexed for a term: separators become spaces and the ends are padded, so
+# the first and last letters of every word are part of a trigram (" sm", "th ")
+_PADDED_TERM = "' ' || replace(replace(replace(replace({term}, '.', ' '), '@', ' '), '_', ' '), '-', ' ') || ' '"
+
+def _term_statements(table, fields, row, change):
+    """Trigger statements adding (change=1) or releasing (change=-1) the terms of a row."""
+    statements = []
+    for field, expression in fields.items():
+        value = expression.format(row=row)
+        if change > 0:
+            statements.append(f"""
+                INSERT INTO FuzzyTerms (entity, field, term, refs)
+                SELECT '{table}', '{field}', {value}, 1 WHERE {value} <> ''
+                ON CONFLICT (entity, field, term) DO UPDATE SET refs = refs + 1;""")
+        else:
+            where = f"entity = '{table}' AND field = '{field}' AND term = {value}"
+            statements.append(f"UPDATE FuzzyTerms SET refs = refs - 1 WHERE {where};")
+            statements.append(f"DELETE FROM FuzzyTerms WHERE {where} AND refs <= 0;")
+    return '\n'.join(statements)
+
+def _create_fuzzy_search_index(conn, run):
+    """
+    Create the trigram index used by fuzzy search.
+
+    FuzzyTerms holds each distinct name (and contact email) once, with the
+    number of records using it; triggers on the entity tables keep the counts
+    current. An FTS5 trigram table per entity, with a column per field, indexes
+    the terms, so a fuzzy search ranks distinct names rather than millions of
+    rows sharing them.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS FuzzyTerms (
+            term_id INTEGER PRIMARY KEY,
+            entity TEXT NOT NULL,
+            field TEXT NOT NULL,
+            term TEXT NOT NULL COLLATE NOCASE,
+            refs INTEGER NOT NULL,
+            UNIQUE (entity, field, term)
+        )
+    """)
+    for table, index, sources, fields in _FUZZY_FIELDS:
+        # One column per field, so each field's candidates are ranked separately
+        conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5({', '.join(fields)}, tokenize = 'trigram')")
+        for field in fields:
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS fuzzy_terms_{table.lower()}_{field}_insert
+                AFTER INSERT ON FuzzyTerms WHEN NEW.entity = '{table}' AND NEW.field = '{field}'
+                BEGIN
+                    INSERT INTO {index} (rowid, {field}) VALUES (NEW.term_id, {_PADDED_TERM.format(term='NEW.term')});
+                END
+            """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS fuzzy_terms_{table.lower()}_delete
+            AFTER DELETE ON FuzzyTerms WHEN OLD.entity = '{table}'
+            BEGIN
+                DELETE FROM {index} WHERE rowid = OLD.term_id;
+            END
+        """)
+        if not conn.execute("SELECT 1 FROM FuzzyTerms WHERE entity = ? LIMIT 1", (table,)).fetchone():
+            for field, expression in fields.items():
+                value = expression.format(row=table)
+                conn.execute(f"""
+                    INSERT INTO FuzzyTerms (entity, field, term, refs)
+                    SELECT '{table}', '{field}', {value}, COUNT(*) FROM {table}
+                    WHERE {value} <> '' GROUP BY {value} COLLATE NOCASE
+                """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS fuzzy_{table.lower()}_insert AFTER INSERT ON {table}
+            BEGIN
+                {_term_statements(table, fields, 'NEW', 1)}
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS fuzzy_{table.lower()}_update AFTER UPDATE OF {', '.join(sources)} ON {table}
+            BEGIN
+                {_term_statements(table, fields, 'OLD', -1)}
+                {_term_statements(table, fields, 'NEW', 1)}
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS fuzzy_{table.lower()}_delete AFTER DELETE ON {table}
+            BEGIN
+                {_term_statements(table, fields, 'OLD', -1)}
+            END
+        """)
+
+MIGRATIONS = [
+    Migration(1, 'create_base_tables', _create_base_tables, False),
+    Migration(2, 'add_missing_columns', _add_missing_columns, False),
+    Migration(3, 'migrate_picklist_values', _migrate_picklist_values, False),
+    Migration(4, 'drop_legacy_account_industry', _drop_legacy_account_industry, True),
+    Migration(5, 'create_duplicate_pairs', _create_duplicate_pairs, False),
+    Migration(6, 'add_epoch_columns', _add_epoch_columns, False),
+    Migration(7, 'enable_incremental_auto_vacuum', _enable_incremental_auto_vacuum, True),
+    Migration(8, 'create_stats_history', _create_stats_history, False),
+    Migration(9, 'create_change_log', _create_change_log, False),
+    Migration(10, 'create_prefix_search_indexes', _create_prefix_search_indexes, False),
+    Migration(11, 'create_fuzzy_search_index', _create_fuzzy_search_index, False),
+]
+
+# --- Opt-in compact layout ---
+#
+# STRICT tables, so every value has the declared type. The stored columns are
+# integers where the legacy layout kept text or REAL: Opportunities.amount as
+# amount_cents (exact sums), close_date as close_day (days since 1970-01-01) and
+# created_at as created_epoch (seconds). The legacy names remain as VIRTUAL
+# generated columns, so reads (SELECT *) see the same values as before; crm_dal
+# writes the integer columns when it finds this layout.
+#
+# The picklist tables keep their rowid clustering: their IDs are what every
+# other table references, they are looked up by ID on every list row, and they
+# fit in a few pages, so clustering them on (type, value) would only add a
+# secondary-index hop to the hot lookup.
+
+_CREATED_EPOCH = ("created_epoch INTEGER DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),\n"
+                  "        created_at TEXT GENERATED ALWAYS AS (datetime(created_epoch, 'unixepoch')) VIRTUAL")
+_CREATED_EPOCH_FROM_TEXT = "CAST(strftime('%s', created_at) AS INTEGER)"
+
+# A value that is neither NULL nor an integer; STRICT INTEGER columns would reject it
+def _not_integer(column):
+    return f"{column} IS NOT NULL AND typeof({column}) != 'integer'"
+
+def _bad_timestamp(column):
+    return f"{column} IS NOT NULL AND strftime('%s', {column}) IS NULL"
+
+# table -> (definition, columns, expressions over the legacy table, {description: bad-row condition})
+_COMPACT_TABLES = {
+    'PicklistType': (
+        """
+    CREATE TABLE IF NOT EXISTS {table} (
+        picklist_type_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE,
+        description TEXT,
+        entity_type TEXT NOT NULL,
+        """ + _CREATED_EPOCH + """
+    ) STRICT
+""",
+        ['picklist_type_id', 'name', 'description', 'entity_type', 'created_epoch'],
+        ['picklist_type_id', 'name', 'description', 'entity_type', _CREATED_EPOCH_FROM_TEXT],
+        {'unreadable created_at': _bad_timestamp('created_at')},
+    ),
+    'PicklistValue': (
+        """
+    CREATE TABLE IF NOT EXISTS {table} (
+        picklist_value_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        picklist_type_id INTEGER NOT NULL,
+        value TEXT NOT NULL,
+        display_order INTEGER DEFAULT 0,
+        is_default INTEGER NOT NULL DEFAULT 0 CHECK (is_default IN (0, 1)),
+        is_active INTEGER NOT NULL DEFAULT 1 CHECK (is_active IN (0, 1)),
+        """ + _CREATED_EPOCH + """,
+        FOREIGN KEY (picklist_type_id) REFERENCES PicklistType(picklist_type_id),
+        UNIQUE (picklist_type_id, value)
+    ) STRICT
+""",
+        ['picklist_value_id', 'picklist_type_id', 'value', 'display_order', 'is_default', 'is_active', 'created_epoch'],
+        ['picklist_value_id', 'picklist_type_id', 'value', 'display_order',
+         'CASE WHEN is_default THEN 1 ELSE 0 END', 'CASE WHEN is_active OR is_active IS NULL THEN 1 ELSE 0 END',
+         _CREATED_EPOCH_FROM_TEXT],
+        {'non-integer display_order': _not_integer('display_order'),
+         'unreadable created_at': _bad_timestamp('created_at')},
+    ),
+    'Accounts': (
+        """
+    CREATE TABLE IF NOT EXISTS {table} (
+        account_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        industry_id INTEGER,
+        description TEXT,
+        website TEXT,
+        street TEXT,
+        city TEXT,
+        state TEXT,
+        zip TEXT,
+        country TEXT,
+        """ + _CREATED_EPOCH + """,
+        FOREIGN KEY (industry_id) REFERENCES PicklistValue(picklist_value_id)
+    ) STRICT
+""",
+        ['account_id', 'name', 'industry_id', 'description', 'website', 'street', 'city', 'state', 'zip',
+         'country', 'created_epoch'],
+        ['account_id', 'name', 'industry_id', 'description', 'website', 'street', 'city', 'state', 'zip',
+         'country', _CREATED_EPOCH_FROM_TEXT],
+        {'non-integer industry_id': _not_integer('industry_id'),
+         'unreadable created_at': _bad_timestamp('created_at')},
+    ),
+    'Contacts': (
+        """
+    CREATE TABLE IF NOT EXISTS {table} (
+        contact_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        first_name TEXT NOT NULL,
+        last_name TEXT NOT NULL,
+        title TEXT,
+        email TEXT UNIQUE NOT NULL,
+        phone TEXT,
+        description TEXT,
+        website TEXT,
+        street TEXT,
+        city TEXT,
+        state TEXT,
+        zip TEXT,
+        country TEXT,
+        account_id INTEGER,
+        """ + _CREATED_EPOCH + """,
+        FOREIGN KEY (account_id) REFERENCES Accounts (account_id)
+    ) STRICT
+""",
+        ['contact_id', 'first_name', 'last_name', 'title', 'email', 'phone', 'description', 'website', 'street',
+         'city', 'state', 'zip', 'country', 'account_id', 'created_epoch'],
+        ['contact_id', 'first_name', 'last_name', 'title', 'email', 'phone', 'description', 'website', 'street',
+         'city', 'state', 'zip', 'country', 'account_id', _CREATED_EPOCH_FROM_TEXT],
+        {'non-integer account_id': _not_integer('account_id'),
+         'unreadable created_at': _bad_timestamp('created_at')},
+    ),
+    'Opportunities': (
+        """
+    CREATE TABLE IF NOT EXISTS {table} (
+        opportunity_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        description TEXT,
+        amount_cents INTEGER,
+        close_day INTEGER,
+        account_id INTEGER,
+        contact_id INTEGER,
+        stage_id INTEGER,
+        """ + _CREATED_EPOCH + """,
+        amount REAL GENERATED ALWAYS AS (amount_cents / 100.0) VIRTUAL,
+        close_date TEXT GENERATED ALWAYS AS (date(close_day * 86400, 'unixepoch')) VIRTUAL,
+        close_epoch INTEGER GENERATED ALWAYS AS (close_day * 86400) VIRTUAL,
+        FOREIGN KEY (account_id) REFERENCES Accounts (account_id),
+        FOREIGN KEY (contact_id) REFERENCES Contacts (contact_id),
+        FOREIGN KEY (stage_id) REFERENCES PicklistValue(picklist_value_id)
+    ) STRICT
+""",
+        ['opportunity_id', 'name', 'description', 'amount_cents', 'close_day', 'account_id', 'contact_id',
+         'stage_id', 'created_epoch'],
+        ['opportunity_id', 'name', 'description',
+         # Round to cents first so binary fractions like 0.285 land on the right cent
+         'CAST(round(round(amount, 2) * 100) AS INTEGER)',
+         "CAST(julianday(date(close_date)) - 2440587.5 AS INTEGER)",
+         'account_id', 'contact_id', 'stage_id', _CREATED_EPOCH_FROM_TEXT],
+        {'non-numeric amount': "amount IS NOT NULL AND typeof(amount) NOT IN ('integer', 'real')",
+         'close_date that is not a date': "close_date IS NOT NULL AND close_date != '' AND date(close_date) IS NULL",
+         'non-integer account_id/contact_id/stage_id':
+             f"({_not_integer('account_id')}) OR ({_not_integer('contact_id')}) OR ({_not_integer('stage_id')})",
+         'unreadable created_at': _bad_timestamp('created_at')},
+    ),
+}
+
+def _compact_layout(conn, run):
+    """Rebuild the CRM tables in the compact STRICT layout (see _COMPACT_TABLES)."""
+    for table, (definition, columns, expressions, checks) in _COMPACT_TABLES.items():
+        if conn.execute(f"PRAGMA table_list({table})").fetchone()['strict']:
+            continue  # already converted (e.g. resuming after an interruption)
+        # Refuse up front rather than failing halfway through a copy
+        for description, condition in checks.items():
+            bad = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {condition}").fetchone()[0]
+            if bad:
+                raise MigrationError(f"{bad} rows in {table} have a {description}; fix them before compacting")
+        rebuild_table(conn, run, table, definition, columns, expressions)
+    from .crm_dal import clear_layout_cache
+    clear_layout_cache()
+
+# Not part of MIGRATIONS: applied only when asked for (migrations.py compact)
+COMPACT_LAYOUT = Migration(100, 'compact_layout', _compact_layout, True)
+
+def print_status(path=None):
+    """Print applied and pending migrations with their durations."""
+    path = path or database.DATABASE_NAME
+    applied = {}
+    if os.path.exists(path):
+        conn = _connect(path)
+        try:
+            applied = get_applied_migrations(conn)
+        finally:
+            conn.close()
+    for step in MIGRATIONS + [COMPACT_LAYOUT]:
+        row = applied.get(step.version)
+        if row:
+            print(f"{step.version:03d} {step.name:<35} applied {row['applied_at']} ({row['duration_ms']:.0f} ms)")
+        elif step is COMPACT_LAYOUT:
+            print(f"{step.version:03d} {step.name:<35} not applied (opt-in: migrations compact)")
+        else:
+            print(f"{step.version:03d} {step.name:<35} pending")
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Apply or inspect CRM schema migrations")
+    parser.add_argument('command', choices=['status', 'up', 'compact'],
+                        help="'compact' applies pending steps and converts to the compact layout")
+    parser.add_argument('--database', default=None, help="Database file (default: data/crm.db)")
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help=f"Rows per transaction for table rebuilds (default: {DEFAULT_BATCH_SIZE})")
+    args = parser.parse_args()
+    if args.database:
+        database.set_database_path(args.database)
+    if args.command == 'status':
+        print_status()
+    else:
+        from .migrate_db import migrate_database
+        sys.exit(0 if migrate_database(args.batch_size, compact=args.command == 'compact') else 1)
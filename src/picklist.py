@@ -437,10 +437,77 @@ def initialize_default_picklists():
     print("NOTE: Default picklists initialization skipped - use Admin menu to manage picklists")
     return create_picklist_tables()
 
+def _migrate_text_column(cursor, table, text_column, id_column, picklist_name, match_case):
+    """
+    Point id_column at the picklist value matching text_column, for every row.
+
+    Missing values are added to the picklist with one INSERT ... SELECT, then
+    every row is updated with one UPDATE ... FROM join. Values are matched
+    exactly; with match_case=False a value that only differs in case is used
+    when there is no exact match, and new values are added once per spelling
+    ignoring case.
+
+    Returns:
+        tuple: (picklist values added, rows updated), or None if the picklist type is missing
+    """
+    cursor.execute("SELECT picklist_type_id FROM PicklistType WHERE name = ?", (picklist_name,))
+    picklist_type = cursor.fetchone()
+    if not picklist_type:
+        return None
+    type_id = picklist_type[0]
+
+    legacy_values = (f"SELECT DISTINCT {text_column} AS value FROM {table} "
+                     f"WHERE {text_column} IS NOT NULL AND {text_column} != ''")
+    if match_case:
+        cursor.execute(f"""
+            INSERT INTO PicklistValue (picklist_type_id, value)
+            SELECT ?, legacy.value FROM ({legacy_values}) legacy
+            WHERE NOT EXISTS (
+                SELECT 1 FROM PicklistValue pv
+                WHERE pv.picklist_type_id = ? AND pv.value = legacy.value
+            )
+        """, (type_id, type_id))
+    else:
+        cursor.execute(f"""
+            INSERT INTO PicklistValue (picklist_type_id, value)
+            SELECT ?, MIN(legacy.value) FROM ({legacy_values}) legacy
+            WHERE NOT EXISTS (
+                SELECT 1 FROM PicklistValue pv
+                WHERE pv.picklist_type_id = ? AND lower(pv.value) = lower(legacy.value)
+            )
+            GROUP BY lower(legacy.value)
+        """, (type_id, type_id))
+    added = cursor.rowcount
+
+    # Resolve each distinct legacy value once, then join it back onto the table
+    resolved = ("(SELECT pv.picklist_value_id FROM PicklistValue pv "
+                "WHERE pv.picklist_type_id = :type_id AND pv.value = legacy.value)")
+    if not match_case:
+        resolved = (f"COALESCE({resolved}, "
+                    "(SELECT MIN(pv.picklist_value_id) FROM PicklistValue pv "
+                    "WHERE pv.picklist_type_id = :type_id AND lower(pv.value) = lower(legacy.value)))")
+    changes_before = cursor.connection.total_changes
+    cursor.execute(f"""
+        WITH mapping AS MATERIALIZED (
+            SELECT legacy.value, {resolved} AS picklist_value_id
+            FROM ({legacy_values}) legacy
+        )
+        UPDATE {table} SET {id_column} = mapping.picklist_value_id
+        FROM mapping
+        WHERE {table}.{text_column} = mapping.value
+          AND {table}.{id_column} IS NOT mapping.picklist_value_id
+    """, {'type_id': type_id})
+    # rowcount is not reported for statements starting with WITH
+    return added, cursor.connection.total_changes - changes_before
+
 def migrate_existing_data():
     """
     Migrate existing data to use picklists for industry field and stage field.
-    
+
+    Both conversions run as set-based SQL in a single transaction: each legacy
+    value is resolved once, and each table is updated by one statement instead
+    of one per distinct value.
+
     Returns:
         bool: True on success, False on failure
     """
@@ -450,96 +517,38 @@ def migrate_existing_data():
 
     cursor = conn.cursor()
     try:
+        cursor.execute("PRAGMA table_info(Accounts)")
+        account_columns = [row[1] for row in cursor.fetchall()]
+        cursor.execute("PRAGMA table_info(Opportunities)")
+        opp_columns = [row[1] for row in cursor.fetchall()]
+
         # --- Migrate account industry values ---
-        print("Migrating account industry values to picklists...")
-        
-        # Get all distinct industry values from Accounts table
-        cursor.execute("SELECT DISTINCT industry FROM Accounts WHERE industry IS NOT NULL AND industry != ''")
-        industries = [row['industry'] for row in cursor.fetchall()]
-        
-        # Add each industry to the picklist if it doesn't already exist
-        industry_mappings = {}  # Store mappings of industry text to picklist IDs
-        for industry in industries:
-            industry_id = get_picklist_id_by_value('industry', industry)
-            if not industry_id:
-                # Get the picklist type ID for 'industry'
-                cursor.execute("SELECT picklist_type_id FROM PicklistType WHERE name = 'industry'")
-                picklist_type = cursor.fetchone()
-                if not picklist_type:
-                    print("Industry picklist type not found")
-                    continue
-                
-                # Add the industry value
-                industry_id = add_picklist_value(picklist_type['picklist_type_id'], industry)
-            
-            if industry_id:
-                industry_mappings[industry] = industry_id
-        
-        # Update the industry_id field in the Accounts table
-        for industry_text, industry_id in industry_mappings.items():
-            print(f"Updating accounts with industry '{industry_text}' to use picklist ID {industry_id}")
-            cursor.execute(
-                "UPDATE Accounts SET industry_id = ? WHERE industry = ?", 
-                (industry_id, industry_text)
-            )
-        
+        if "industry" in account_columns and "industry_id" in account_columns:
+            print("Migrating account industry values to picklists...")
+            counts = _migrate_text_column(cursor, 'Accounts', 'industry', 'industry_id', 'industry', match_case=True)
+            if counts is None:
+                print("Industry picklist type not found")
+            else:
+                print(f"Added {counts[0]} industry values to the picklist; updated {counts[1]} accounts")
+
         # --- Migrate opportunity stage values ---
         # Check if the Opportunities table has stage text field (older schema)
-        cursor.execute("PRAGMA table_info(Opportunities)")
-        opp_columns = [row[1] for row in cursor.fetchall()]
-        
         if "stage" in opp_columns and "stage_id" in opp_columns:
             print("Migrating opportunity stage values to picklists...")
-            
-            # Get all distinct stage values
-            cursor.execute("SELECT DISTINCT stage FROM Opportunities WHERE stage IS NOT NULL AND stage != ''")
-            stages = [row['stage'] for row in cursor.fetchall()]
-            
-            # Map each stage to a picklist ID
-            stage_mappings = {}
-            for stage in stages:
-                stage_id = get_picklist_id_by_value('stage', stage)
-                if not stage_id:
-                    # Check if there's a similar stage name in the picklist
-                    cursor.execute("""
-                        SELECT pv.picklist_value_id, pv.value 
-                        FROM PicklistValue pv
-                        JOIN PicklistType pt ON pv.picklist_type_id = pt.picklist_type_id
-                        WHERE pt.name = 'stage'
-                    """)
-                    picklist_stages = {row['value'].lower(): row['picklist_value_id'] for row in cursor.fetchall()}
-                    
-                    # Try to find a case-insensitive match
-                    stage_lower = stage.lower()
-                    if stage_lower in picklist_stages:
-                        stage_id = picklist_stages[stage_lower]
-                    else:
-                        # Get the picklist type ID for 'stage'
-                        cursor.execute("SELECT picklist_type_id FROM PicklistType WHERE name = 'stage'")
-                        picklist_type = cursor.fetchone()
-                        if not picklist_type:
-                            print("Stage picklist type not found")
-                            continue
-                        
-                        # Add the stage value
-                        stage_id = add_picklist_value(picklist_type['picklist_type_id'], stage)
-                
-                if stage_id:
-                    stage_mappings[stage] = stage_id
-            
-            # Update the stage_id field in the Opportunities table
-            for stage_text, stage_id in stage_mappings.items():
-                print(f"Updating opportunities with stage '{stage_text}' to use picklist ID {stage_id}")
-                cursor.execute(
-                    "UPDATE Opportunities SET stage_id = ? WHERE stage = ?", 
-                    (stage_id, stage_text)
-                )
-        
+            counts = _migrate_text_column(cursor, 'Opportunities', 'stage', 'stage_id', 'stage', match_case=False)
+            if counts is None:
+                print("Stage picklist type not found")
+            else:
+                print(f"Added {counts[0]} stage values to the picklist; updated {counts[1]} opportunities")
+
         conn.commit()
         print("Data migration to picklists completed successfully")
         return True
     except sqlite3.Error as e:
         print(f"Error migrating existing data: {e}")
+        # Leave a transaction owned by the migration engine for it to roll back
+        if not getattr(conn, 'defer_commit', False) and conn.in_transaction:
+            conn.rollback()
         return False
     finally:
         cursor.close()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Session Profiling for CRM Application
+
+This module wraps a whole CLI session in cProfile and/or tracemalloc so users
+can send us a profile of their real workload without a custom build.
+
+On exit the following files are written to data/profiles/:
+- crm_<timestamp>.pstats      raw cProfile statistics (load with pstats or snakeviz)
+- crm_<timestamp>.txt         the top functions by cumulative time, as text
+- crm_<timestamp>.collapsed   collapsed stacks for flamegraph.pl / speedscope
+- crm_<timestamp>_memory.txt  the top memory allocators from tracemalloc
+"""
+
+import os
+import sys
+import cProfile
+import pstats
+import tracemalloc
+import datetime
+
+# Define paths
+DATA_DIR = 'data'
+PROFILE_DIR = os.path.join(DATA_DIR, 'profiles')
+
+# Environment variable checked when no --profile switch is given
+PROFILE_ENV_VAR = 'CRM_PROFILE'
+
+PROFILE_MODES = ('cpu', 'memory', 'both')
+
+# How many entries to keep in the text reports
+TOP_FUNCTIONS = 40
+TOP_ALLOCATORS = 25
+
+def resolve_profile_mode(cli_value=None):
+    """
+    Work out which profiling mode was requested.
+
+    The command-line value wins over the CRM_PROFILE environment variable.
+    Returns one of PROFILE_MODES, or None if profiling is off.
+    """
+    value = cli_value or os.environ.get(PROFILE_ENV_VAR, '')
+    value = value.strip().lower()
+    if not value or value in ('0', 'off', 'false', 'no'):
+        return None
+    if value in ('1', 'on', 'true', 'yes'):
+        return 'cpu'
+    if value == 'mem':
+        return 'memory'
+    if value not in PROFILE_MODES:
+        print(f"Warning: Unknown profile mode '{value}'. Valid modes: {', '.join(PROFILE_MODES)}", file=sys.stderr)
+        return None
+    return value
+
+def _function_label(func_key):
+    """Format a pstats function key (filename, line, name) for a collapsed stack."""
+    filename, line, name = func_key
+    if filename == '~':
+        # Built-in functions have no file, pstats stores them as '~'
+        return name.replace(';', ':')
+    return f"{name} ({os.path.basename(filename)}:{line})".replace(';', ':')
+
+def write_collapsed_stacks(stats, filepath):
+    """
+    Write cProfile data in the collapsed-stack format used by flamegraph tools.
+
+    cProfile only records caller -> callee edges, not full stacks, so each
+    function's own time is attributed along its heaviest caller chain back
+    to a root. That is the usual approximation for turning cProfile output
+    into a flame graph and is good enough to see where a session's time went.
+    """
+    raw = stats.stats  # {func: (cc, nc, tt, ct, callers)}
+
+    def heaviest_caller(func):
+        callers = raw[func][4]
+        best, best_time = None, -1.0
+        for caller, caller_stats in callers.items():
+            # caller_stats is (cc, nc, tt, ct) for this edge
+            edge_time = caller_stats[3] if isinstance(caller_stats, tuple) else 0
+            if caller in raw and edge_time > best_time:
+                best, best_time = caller, edge_time
+        return best
+
+    lines = []
+    for func, (cc, nc, tt, ct, callers) in raw.items():
+        # Collapsed stacks use integer sample counts; use microseconds of own time
+        weight = int(tt * 1_000_000)
+        if weight <= 0:
+            continue
+        chain = [func]
+        seen = {func}
+        caller = heaviest_caller(func)
+        while caller is not None and caller not in seen:
+            chain.append(caller)
+            seen.add(caller)
+            caller = heaviest_caller(caller)
+        stack = ';'.join(_function_label(f) for f in reversed(chain))
+        lines.append(f"{stack} {weight}")
+
+    with open(filepath, 'w') as f:
+        f.write('\n'.join(sorted(lines)))
+        f.write('\n')
+
+def write_memory_report(snapshot, filepath, peak=None):
+    """Write the top memory allocators from a tracemalloc snapshot."""
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, tracemalloc.__file__),
+    ))
+    top_stats = snapshot.statistics('lineno')
+    total = sum(stat.size for stat in top_stats)
+
+    with open(filepath, 'w') as f:
+        f.write(f"Total allocated at exit: {total / 1024:.1f} KiB\n")
+        if peak is not None:
+            f.write(f"Peak traced memory: {peak / 1024:.1f} KiB\n")
+        f.write(f"\nTop {TOP_ALLOCATORS} allocators by size:\n")
+        for index, stat in enumerate(top_stats[:TOP_ALLOCATORS], 1):
+            frame = stat.traceback[0]
+            f.write(f"#{index}: {frame.filename}:{frame.lineno}: "
+                    f"{stat.size / 1024:.1f} KiB in {stat.count} blocks\n")
+
+def run_profiled(func, mode, *args, **kwargs):
+    """
+    Run func(*args, **kwargs) under the requested profiling mode and write the
+    reports to data/profiles/ when it returns, raises, or calls sys.exit().
+
+    Args:
+        func (callable): The session entry point, normally main()
+        mode (str): One of PROFILE_MODES, or None to run without profiling
+
+    Returns:
+        The return value of func.
+    """
+    if mode is None:
+        return func(*args, **kwargs)
+
+    profiler = cProfile.Profile() if mode in ('cpu', 'both') else None
+    trace_memory = mode in ('memory', 'both')
+
+    if trace_memory:
+        tracemalloc.start(25)
+    if profiler:
+        profiler.enable()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        if profiler:
+            profiler.disable()
+        snapshot = None
+        peak = None
+        if trace_memory:
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        _write_reports(profiler, snapshot, peak)
+
+def _write_reports(profiler, snapshot, peak):
+    """Write whatever profiling data was collected to PROFILE_DIR."""
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        base = os.path.join(PROFILE_DIR, f"crm_{timestamp}")
+        written = []
+
+        if profiler:
+            profiler.dump_stats(f"{base}.pstats")
+            written.append(f"{base}.pstats")
+
+            with open(f"{base}.txt", 'w') as f:
+                stats = pstats.Stats(profiler, stream=f)
+                stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+            written.append(f"{base}.txt")
+
+            write_collapsed_stacks(pstats.Stats(profiler), f"{base}.collapsed")
+            written.append(f"{base}.collapsed")
+
+        if snapshot is not None:
+            write_memory_report(snapshot, f"{base}_memory.txt", peak)
+            written.append(f"{base}_memory.txt")
+
+        print("\nProfile written to:", file=sys.stderr)
+        for path in written:
+            print(f"  - {path}", file=sys.stderr)
+    except (OSError, TypeError) as e:
+        print(f"Error writing profile output: {e}", file=sys.stderr)
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Scripted Session Replay for CRM Application
+
+This module replays recorded input scripts through main() and times every
+prompt-to-prompt step, so real user journeys (e.g. searching for an account
+and drilling into its opportunities) can be benchmarked end to end.
+
+Script format: a plain text file with one answer per line, exactly as it would
+be typed at the prompts. Lines starting with '#' are comments and are skipped;
+empty lines are replayed as pressing Enter. When the script runs out of input
+the session ends as if the user pressed Ctrl-D.
+
+Usage:
+    python -m src.replay data/replay/account_drilldown.txt --runs 20 --accounts 5000
+"""
+
+import os
+import io
+import json
+import shutil
+import builtins
+import tempfile
+import statistics
+import contextlib
+from time import perf_counter
+
+from . import database
+from .seed import seed_database
+
+def load_script(filepath):
+    """
+    Load a replay script.
+
+    Returns:
+        list: The input lines to feed to the session, in order
+    """
+    with open(filepath, 'r') as f:
+        lines = f.read().splitlines()
+    return [line for line in lines if not line.startswith('#')]
+
+class _ScriptedInput:
+    """
+    Replacement for builtins.input that feeds a script and records when each
+    prompt is shown, so the time between two prompts can be attributed to the
+    answer that was given in between.
+    """
+
+    def __init__(self, lines):
+        self.lines = list(lines)
+        self.position = 0
+        self.prompts = []     # prompt text for each input() call
+        self.shown_at = []    # perf_counter() when each prompt was shown
+        self.answered_at = [] # perf_counter() when each answer was returned
+
+    def __call__(self, prompt=''):
+        self.prompts.append(str(prompt))
+        self.shown_at.append(perf_counter())
+        if self.position >= len(self.lines):
+            raise EOFError
+        line = self.lines[self.position]
+        self.position += 1
+        self.answered_at.append(perf_counter())
+        return line
+
+def replay_once(lines):
+    """
+    Run one session of main() fed by the given script lines.
+
+    Returns:
+        list: One dict per step with 'prompt', 'answer' and 'seconds' (time from
+              answering the prompt until the next prompt appeared). Step 0 is
+              the start-up time until the first prompt.
+    """
+    # Imported lazily so loading this module does not pull in the whole CLI
+    from . import main as main_module
+
+    scripted = _ScriptedInput(lines)
+    original_input = builtins.input
+    builtins.input = scripted
+    started = perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            try:
+                main_module.main()
+            except SystemExit:
+                pass
+    finally:
+        builtins.input = original_input
+        from .crm_dal import disable_entity_cache
+        disable_entity_cache()
+    finished = perf_counter()
+
+    steps = []
+    first_prompt = scripted.shown_at[0] if scripted.shown_at else finished
+    steps.append({'prompt': '<startup>', 'answer': '', 'seconds': first_prompt - started})
+    for index, answered in enumerate(scripted.answered_at):
+        next_shown = scripted.shown_at[index + 1] if index + 1 < len(scripted.shown_at) else finished
+        steps.append({
+            'prompt': scripted.prompts[index].strip(),
+            'answer': lines[index],
+            'seconds': next_shown - answered,
+        })
+    return steps
+
+def _percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers."""
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+def summarize_runs(runs):
+    """
+    Aggregate per-step latencies across runs.
+
+    Args:
+        runs (list): The step lists returned by replay_once
+
+    Returns:
+        list: One dict per step with prompt, answer and min/mean/p50/p95/max in milliseconds
+    """
+    summary = []
+    step_count = min(len(steps) for steps in runs) if runs else 0
+    for index in range(step_count):
+        samples = [steps[index]['seconds'] * 1000 for steps in runs]
+        summary.append({
+            'step': index,
+            'prompt': runs[0][index]['prompt'],
+            'answer': runs[0][index]['answer'],
+            'runs': len(samples),
+            'min_ms': min(samples),
+            'mean_ms': statistics.fmean(samples),
+            'p50_ms': statistics.median(samples),
+            'p95_ms': _percentile(samples, 0.95),
+            'max_ms': max(samples),
+        })
+    return summary
+
+def print_summary(summary, totals):
+    """Print the per-step latency table."""
+    header = f"{'Step':>4}  {'Answer':<20}  {'p50 ms':>9}  {'p95 ms':>9}  {'max ms':>9}  Prompt"
+    print(header)
+    print("-" * len(header))
+    for row in summary:
+        answer = row['answer'] if len(row['answer']) <= 20 else row['answer'][:17] + '...'
+        prompt = row['prompt'] if len(row['prompt']) <= 50 else row['prompt'][:47] + '...'
+        print(f"{row['step']:>4}  {answer:<20}  {row['p50_ms']:>9.2f}  {row['p95_ms']:>9.2f}  {row['max_ms']:>9.2f}  {prompt}")
+    print("-" * len(header))
+    print(f"Session total over {len(totals)} runs: "
+          f"p50 {statistics.median(totals):.2f} ms, max {max(totals):.2f} ms")
+
+def run_replay(script_path, runs=10, seed_db=None, accounts=1000, contacts_per_account=5,
+               opportunities_per_account=3):
+    """
+    Replay a script several times against a freshly seeded database.
+
+    Every run starts from an identical copy of the seeded database, so writes
+    made by one run do not affect the next. The application's real database
+    is never touched.
+
+    Args:
+        script_path (str): Path to the input script
+        runs (int): Number of replays
+        seed_db (str, optional): Existing database to copy for each run instead of generating one
+        accounts, contacts_per_account, opportunities_per_account: Size of the generated database
+
+    Returns:
+        tuple: (summary rows, list of per-run session totals in milliseconds)
+    """
+    lines = load_script(script_path)
+    previous_path = database.DATABASE_NAME
+    workdir = tempfile.mkdtemp(prefix='crm_replay_')
+    try:
+        template = os.path.join(workdir, 'template.db')
+        if seed_db:
+            shutil.copy2(seed_db, template)
+        else:
+            seed_database(template, accounts, contacts_per_account, opportunities_per_account)
+
+        run_db = os.path.join(workdir, 'crm.db')
+        results = []
+        for _ in range(runs):
+            shutil.copy2(template, run_db)
+            database.set_database_path(run_db)
+            results.append(replay_once(lines))
+            database.set_database_path(previous_path)
+
+        totals = [sum(step['seconds'] for step in steps) * 1000 for steps in results]
+        return summarize_runs(results), totals
+    finally:
+        database.set_database_path(previous_path)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Replay scripted CRM sessions and time each step")
+    parser.add_argument('script', help="Input script to replay")
+    parser.add_argument('--runs', type=int, default=10, help="Number of replays (default: 10)")
+    parser.add_argument('--seed-db', help="Copy this database for each run instead of generating one")
+    parser.add_argument('--accounts', type=int, default=1000, help="Accounts in the generated database")
+    parser.add_argument('--contacts-per-account', type=int, default=5)
+    parser.add_argument('--opportunities-per-account', type=int, default=3)
+    parser.add_argument('--json', dest='json_path', help="Also write the summary as JSON to this file")
+    args = parser.parse_args()
+
+    summary, totals = run_replay(args.script, args.runs, args.seed_db, args.accounts,
+                                 args.contacts_per_account, args.opportunities_per_account)
+    print_summary(summary, totals)
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({'steps': summary, 'session_totals_ms': totals}, f, indent=2)
+        print(f"Summary written to {args.json_path}")
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Reporting Replica for CRM Application
+
+A read-only copy of crm.db for reports, kept in sync by shipping the change
+log (see changelog.py), so long full-table reads never hold locks on the
+primary that interactive users are writing to.
+
+The replica is two files, REPLICA_DIR/crm-a.db and crm-b.db, and a CURRENT
+file naming the one readers use. A sync brings the other file up to date and
+then switches CURRENT to it:
+
+- Normally the sync ATTACHes the primary read-only and re-copies only the
+  records that ChangeLog lists as changed since that file was last synced
+  (picklists are small and are copied whole).
+- If the file does not exist yet, the primary's schema changed (a migration
+  ran), or the change log no longer reaches back far enough, the file is
+  rebuilt with SQLite's online backup instead.
+
+Readers open the current file with immutable=1 (no locking at all) and a large
+mmap. A sync only writes to a file that stopped being current at least
+READER_GRACE_SECONDS ago, so reports shorter than that never see a file change
+underneath them. The replica registers itself as the change log consumer
+'replica', which keeps the entries it still needs from being compacted away.
+"""
+
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from urllib.parse import quote
+
+from . import database
+from .changelog import ENTITY_TABLES, compact_change_log, get_watermark, save_watermarks
+
+CONSUMER = 'replica'
+
+# Tables that are copied whole on every sync (they are small and have no change log)
+FULL_COPY_TABLES = ['PicklistType', 'PicklistValue']
+
+# A replica file is only rewritten this long after readers were switched away from it
+READER_GRACE_SECONDS = float(os.environ.get('CRM_REPLICA_GRACE_SECONDS', 60))
+
+# Reports fall back to the primary if the replica is older than this
+MAX_LAG_SECONDS = float(os.environ.get('CRM_REPLICA_MAX_LAG_SECONDS', 3600))
+
+# Memory-mapped I/O for replica readers
+MMAP_BYTES = int(os.environ.get('CRM_REPLICA_MMAP_BYTES', 1 << 30))
+
+GENERATIONS = ('a', 'b')
+
+def replica_dir():
+    return os.environ.get('CRM_REPLICA_DIR') or os.path.join(database.DATA_DIR, 'replica')
+
+def _generation_path(generation):
+    return os.path.join(replica_dir(), f"crm-{generation}.db")
+
+def _uri(path, **options):
+    query = '&'.join(f"{key}={value}" for key, value in options.items())
+    return f"file:{quote(os.path.abspath(path))}?{query}"
+
+def _read_current():
+    """Return (current generation, switched_at epoch), or (None, 0) if there is no replica."""
+    try:
+        with open(os.path.join(replica_dir(), 'CURRENT')) as f:
+            generation, switched_at = f.read().split()
+        return (generation, float(switched_at)) if generation in GENERATIONS else (None, 0)
+    except (OSError, ValueError):
+        return None, 0
+
+def _write_current(generation):
+    path = os.path.join(replica_dir(), 'CURRENT')
+    with open(path + '.tmp', 'w') as f:
+        f.write(f"{generation} {time.time()}\n")
+    os.replace(path + '.tmp', path)
+
+def _read_state(path):
+    """Return the ReplicaState row of a replica file, or None if it has none."""
+    if not os.path.exists(path):
+        return None
+    conn = sqlite3.connect(_uri(path, mode='ro'), uri=True)
+    conn.row_factory = sqlite3.Row
+    try:
+        return conn.execute("SELECT * FROM ReplicaState").fetchone()
+    except sqlite3.Error:
+        return None
+    finally:
+        conn.close()
+
+def _schema_version(conn, schema='main'):
+    return conn.execute(f"SELECT MAX(version) FROM {schema}.schema_migrations").fetchone()[0]
+
+def _change_seq(conn, schema='main'):
+    """Latest sequence number ever given out by the change log (survives compaction)."""
+    row = conn.execute(f"SELECT seq FROM {schema}.sqlite_sequence WHERE name = 'ChangeLog'").fetchone()
+    return row[0] if row else 0
+
+def _stored_columns(conn, table):
+    """Columns that hold data (generated columns are computed by the replica itself)."""
+    return [row[1] for row in conn.execute(f"PRAGMA main.table_xinfo({table})") if row[6] == 0]
+
+# --- Sync ---
+
+def _rebuild(path, primary_path):
+    """Build a replica file from an online backup of the primary. Returns its change log position."""
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    source = sqlite3.connect(_uri(primary_path, mode='ro'), uri=True)
+    target = sqlite3.connect(tmp_path, isolation_level=None)
+    try:
+        source.backup(target)
+        # Changes reach the replica from the primary's log; the copy needs no log of its own
+        for (trigger,) in target.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'changelog\\_%' ESCAPE '\\'").fetchall():
+            target.execute(f"DROP TRIGGER {trigger}")
+        target.execute("DELETE FROM ChangeLog")
+        target.execute("DELETE FROM ExportWatermark")
+        last_seq = _change_seq(target)
+        target.execute("CREATE TABLE ReplicaState (last_seq INTEGER NOT NULL, schema_version INTEGER, "
+                       "synced_at REAL NOT NULL, rebuilt_at REAL NOT NULL)")
+        now = time.time()
+        target.execute("INSERT INTO ReplicaState VALUES (?, ?, ?, ?)", (last_seq, _schema_version(target), now, now))
+    finally:
+        target.close()
+        source.close()
+    os.replace(tmp_path, path)
+    return last_seq
+
+def _apply_changes(path, primary_path, last_seq):
+    """Re-copy the records changed on the primary since last_seq. Returns (new position, records copied)."""
+    # Opened as a URI so that the ATTACH below understands mode=ro
+    conn = sqlite3.connect(_uri(path, mode='rw'), uri=True, isolation_level=None,
+                           timeout=database.BUSY_TIMEOUT_MS / 1000)
+    try:
+        conn.execute("ATTACH DATABASE ? AS primary_db", (_uri(primary_path, mode='ro'),))
+        conn.execute("CREATE TEMP TABLE changed (record_id INTEGER PRIMARY KEY)")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            up_to_seq = _change_seq(conn, 'primary_db')
+            copied = 0
+            for table, key in ENTITY_TABLES.values():
+                columns = ', '.join(_stored_columns(conn, table))
+                conn.execute("DELETE FROM temp.changed")
+                conn.execute("INSERT OR IGNORE INTO temp.changed SELECT record_id FROM primary_db.ChangeLog "
+                             "WHERE seq > ? AND seq <= ? AND entity = ?", (last_seq, up_to_seq, table))
+                conn.execute(f"DELETE FROM main.{table} WHERE {key} IN (SELECT record_id FROM temp.changed)")
+                copied += conn.execute(f"INSERT INTO main.{table} ({columns}) SELECT {columns} FROM primary_db.{table} "
+                                       f"WHERE {key} IN (SELECT record_id FROM temp.changed)").rowcount
+            for table in FULL_COPY_TABLES:
+                columns = ', '.join(_stored_columns(conn, table))
+                conn.execute(f"DELETE FROM main.{table}")
+                conn.execute(f"INSERT INTO main.{table} ({columns}) SELECT {columns} FROM primary_db.{table}")
+            conn.execute("UPDATE ReplicaState SET last_seq = ?, synced_at = ?", (up_to_seq, time.time()))
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        return up_to_seq, copied
+    finally:
+        conn.close()
+
+def _needs_rebuild(path, primary_conn):
+    """Return why a replica file has to be rebuilt, or None if the change log can bring it up to date."""
+    state = _read_state(path)
+    if state is None:
+        return "no replica yet"
+    if state['schema_version'] != _schema_version(primary_conn):
+        return "the primary's schema changed"
+    kept_from = [get_watermark(primary_conn, CONSUMER, table) for table, _ in ENTITY_TABLES.values()]
+    if None in kept_from or max(kept_from) > state['last_seq']:
+        return "the change log no longer reaches back to this replica"
+    return None
+
+def sync_replica(full=False, show_progress=True):
+    """
+    Bring the standby replica file up to date and make it the current one.
+
+    Args:
+        full (bool): Rebuild from an online backup even if the change log would do
+
+    Returns:
+        dict: 'generation', 'mode' ('incremental' or 'rebuild'), 'last_seq',
+              'copied' and 'seconds'; None if nothing was synced
+    """
+    primary_path = database.DATABASE_NAME
+    if not os.path.exists(primary_path):
+        print(f"Database file {primary_path} does not exist.")
+        return None
+    os.makedirs(replica_dir(), exist_ok=True)
+    current, switched_at = _read_current()
+    standby = GENERATIONS[1] if current == GENERATIONS[0] else GENERATIONS[0]
+    path = _generation_path(standby)
+    wait = READER_GRACE_SECONDS - (time.time() - switched_at)
+    if current is not None and wait > 0 and not full:
+        if show_progress:
+            print(f"Replica {standby} may still be in use by readers; next sync possible in {wait:.0f} s.")
+        return None
+
+    started = time.perf_counter()
+    primary = sqlite3.connect(primary_path, isolation_level=None, timeout=database.BUSY_TIMEOUT_MS / 1000)
+    primary.row_factory = sqlite3.Row
+    try:
+        reason = "requested" if full else _needs_rebuild(path, primary)
+        if reason:
+            if show_progress:
+                print(f"Rebuilding replica {standby} from an online backup ({reason})...")
+            last_seq, copied, mode = _rebuild(path, primary_path), None, 'rebuild'
+        else:
+            last_seq, copied = _apply_changes(path, primary_path, _read_state(path)['last_seq'])
+            mode = 'incremental'
+        _write_current(standby)
+
+        # Keep the log entries the other (now standby) file still needs
+        other = _read_state(_generation_path(current)) if current else None
+        keep_from = min(last_seq, other['last_seq']) if other else last_seq
+        save_watermarks(primary, CONSUMER, [table for table, _ in ENTITY_TABLES.values()], keep_from)
+        compact_change_log()
+    except (sqlite3.Error, OSError) as e:
+        print(f"Error syncing replica: {e}")
+        return None
+    finally:
+        primary.close()
+
+    result = {'generation': standby, 'mode': mode, 'last_seq': last_seq, 'copied': copied,
+              'seconds': time.perf_counter() - started}
+    if show_progress:
+        detail = f", {copied:,} changed records copied" if copied is not None else ""
+        print(f"Replica {standby} is current: {mode} sync to change {last_seq}{detail} "
+              f"in {result['seconds']:.2f} s.")
+    return result
+
+# --- Readers ---
+
+def current_replica_path():
+    """Return the file readers should use, or None if there is no replica."""
+    current, _ = _read_current()
+    if current is None:
+        return None
+    path = _generation_path(current)
+    return path if os.path.exists(path) else None
+
+def open_replica():
+    """
+    Open the current replica for reading: read-only, immutable (no locks), with
+    a large mmap. Returns None if there is no replica.
+    """
+    path = current_replica_path()
+    if path is None:
+        return None
+    try:
+        conn = sqlite3.connect(_uri(path, mode='ro', immutable=1), uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA mmap_size = {MMAP_BYTES}")
+        return conn
+    except sqlite3.Error as e:
+        print(f"Could not open the replica: {e}")
+        return None
+
+def replication_lag():
+    """
+    Return how far the current replica is behind the primary.
+
+    Returns:
+        dict: 'path', 'last_seq', 'primary_seq', 'pending' (change log entries
+              not yet applied), 'seconds' (since the last sync); None if there is no replica
+    """
+    path = current_replica_path()
+    state = _read_state(path) if path else None
+    if state is None:
+        return None
+    conn = sqlite3.connect(_uri(database.DATABASE_NAME, mode='ro'), uri=True)
+    try:
+        primary_seq = _change_seq(conn)
+        pending = conn.execute("SELECT COUNT(*) FROM ChangeLog WHERE seq > ?", (state['last_seq'],)).fetchone()[0]
+    except sqlite3.Error:
+        primary_seq, pending = None, None
+    finally:
+        conn.close()
+    return {'path': path, 'last_seq': state['last_seq'], 'primary_seq': primary_seq,
+            'pending': pending, 'seconds': time.time() - state['synced_at']}
+
+def describe_lag(lag):
+    pending = f"{lag['pending']:,} changes behind" if lag['pending'] is not None else "lag unknown"
+    return f"replica synced {lag['seconds']:.0f} s ago, {pending}"
+
+@contextmanager
+def reporting(show_lag=True):
+    """
+    Run DAL reads in the block against the replica, if there is a recent enough
+    one (see MAX_LAG_SECONDS); otherwise against the primary. Set
+    CRM_REPORT_FROM_REPLICA=0 to always use the primary.
+
+    Yields:
+        dict: The replication lag, or None when reading the primary
+    """
+    from .in_memory import is_active
+    if is_active():
+        yield None  # the in-memory copy is faster still, and has this session's changes
+        return
+    lag = replication_lag() if os.environ.get('CRM_REPORT_FROM_REPLICA', '1') != '0' else None
+    if lag is not None and lag['seconds'] > MAX_LAG_SECONDS:
+        if show_lag:
+            print(f"Reading from the primary: {describe_lag(lag)}, more than {MAX_LAG_SECONDS:.0f} s.")
+        lag = None
+    conn = open_replica() if lag is not None else None
+    if conn is None:
+        yield None
+        return
+    if show_lag:
+        print(f"Reading from the reporting replica ({describe_lag(lag)}).")
+    try:
+        with database.bind_connection(conn, path=lag['path']):
+            yield lag
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Maintain the read-only reporting replica of the CRM database")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    sync_parser = subparsers.add_parser('sync', help="Bring the replica up to date")
+    sync_parser.add_argument('--full', action='store_true', help="Rebuild from an online backup")
+    sync_parser.add_argument('--interval', type=float, default=None, metavar='SECONDS',
+                             help="Keep syncing every SECONDS (at least the reader grace period)")
+    subparsers.add_parser('status', help="Show the replication lag")
+    query_parser = subparsers.add_parser('query', help="Run a read-only query on the replica")
+    query_parser.add_argument('sql')
+    args = parser.parse_args()
+
+    if args.command == 'sync':
+        if args.interval is None:
+            sync_replica(args.full)
+        else:
+            interval = max(args.interval, READER_GRACE_SECONDS)
+            try:
+                while True:
+                    sync_replica(args.full)
+                    time.sleep(interval)
+            except KeyboardInterrupt:
+                pass
+    elif args.command == 'status':
+        lag = replication_lag()
+        if lag is None:
+            print("No replica. Create one with: python -m src.replica sync")
+        else:
+            print(f"Current replica: {lag['path']} (change {lag['last_seq']} of {lag['primary_seq']})")
+            print(describe_lag(lag).capitalize())
+    else:
+        conn = open_replica()
+        if conn is None:
+            print("No replica. Create one with: python -m src.replica sync")
+        else:
+            try:
+                for row in conn.execute(args.sql):
+                    print(dict(row))
+            except sqlite3.Error as e:
+                print(f"Query error: {e}")
+            finally:
+                conn.close()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Busy/Locked Retry Policy for CRM Application
+
+SQLite reports SQLITE_BUSY or SQLITE_LOCKED when another connection holds a
+conflicting lock. The busy timeout set on each connection covers most cases,
+but some cannot be waited out inside SQLite (for example a read transaction
+that needs to upgrade to a write while another writer is active). Those
+errors are transient, so DAL writes are retried here with exponential
+backoff and jitter instead of being reported as failures.
+
+Retries and the time spent waiting are counted so contention can be seen.
+
+The policy can be tuned with environment variables:
+    CRM_RETRY_ATTEMPTS        total attempts per write (default: 8)
+    CRM_RETRY_BASE_DELAY_MS   first backoff delay (default: 10)
+    CRM_RETRY_MAX_DELAY_MS    cap on a single backoff delay (default: 1000)
+"""
+
+import os
+import time
+import random
+import sqlite3
+import threading
+
+# Primary result codes; extended codes keep these in the low byte
+SQLITE_BUSY = 5
+SQLITE_LOCKED = 6
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter for busy/locked errors.
+
+    Args:
+        max_attempts (int): Total attempts, including the first one
+        base_delay (float): Delay in seconds before the first retry
+        max_delay (float): Upper bound for any single delay in seconds
+    """
+
+    def __init__(self, max_attempts=8, base_delay=0.01, max_delay=1.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @classmethod
+    def from_environment(cls):
+        """Build a policy from the CRM_RETRY_* environment variables."""
+        return cls(
+            max_attempts=int(os.environ.get('CRM_RETRY_ATTEMPTS', 8)),
+            base_delay=int(os.environ.get('CRM_RETRY_BASE_DELAY_MS', 10)) / 1000,
+            max_delay=int(os.environ.get('CRM_RETRY_MAX_DELAY_MS', 1000)) / 1000,
+        )
+
+    def delay(self, attempt):
+        """Backoff before retry number `attempt` (1-based), with full jitter."""
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+# Policy used by the DAL; replace with configure_retry_policy()
+RETRY_POLICY = RetryPolicy.from_environment()
+
+_stats_lock = threading.Lock()
+_stats = {
+    'busy_errors': 0,       # busy/locked errors seen, including ones that were retried
+    'retries': 0,           # attempts made after a busy/locked error
+    'wait_seconds': 0.0,    # total time slept in backoff
+    'gave_up': 0,           # writes that were still busy after the last attempt
+}
+
+def configure_retry_policy(max_attempts=None, base_delay=None, max_delay=None):
+    """Change the process-wide retry policy. Arguments left as None keep their current value."""
+    global RETRY_POLICY
+    RETRY_POLICY = RetryPolicy(
+        max_attempts if max_attempts is not None else RETRY_POLICY.max_attempts,
+        base_delay if base_delay is not None else RETRY_POLICY.base_delay,
+        max_delay if max_delay is not None else RETRY_POLICY.max_delay,
+    )
+    return RETRY_POLICY
+
+def is_busy_error(error):
+    """Return True if a sqlite3 error is a transient busy/locked error."""
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is not None:
+        return (code & 0xFF) in (SQLITE_BUSY, SQLITE_LOCKED)
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+def _record(**increments):
+    with _stats_lock:
+        for key, value in increments.items():
+            _stats[key] += value
+
+def get_contention_stats():
+    """Return a copy of the busy/locked retry counters."""
+    with _stats_lock:
+        return dict(_stats)
+
+def reset_contention_stats():
+    """Reset the busy/locked retry counters to zero."""
+    with _stats_lock:
+        for key in _stats:
+            _stats[key] = 0 if key != 'wait_seconds' else 0.0
+
+def run_with_retry(operation, policy=None):
+    """
+    Call operation() and retry it while it raises a busy/locked error.
+
+    operation must be safe to repeat: it has to leave the database unchanged
+    when it raises (the DAL rolls back its transaction before re-raising).
+
+    Args:
+        operation (callable): Function taking no arguments
+        policy (RetryPolicy, optional): Defaults to RETRY_POLICY
+
+    Returns:
+        The return value of operation().
+
+    Raises:
+        sqlite3.Error: Non-transient errors immediately, or the last busy error
+                       once all attempts are used up
+    """
+    policy = policy or RETRY_POLICY
+    attempt = 1
+    while True:
+        try:
+            return operation()
+        except sqlite3.Error as e:
+            if not is_busy_error(e):
+                raise
+            _record(busy_errors=1)
+            if attempt >= policy.max_attempts:
+                _record(gave_up=1)
+                raise
+            pause = policy.delay(attempt)
+            _record(retries=1, wait_seconds=pause)
+            time.sleep(pause)
+            attempt += 1
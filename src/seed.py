@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Synthetic Data Seeding for CRM Application
+
+This module fills a database file with generated Accounts, Contacts and
+Opportunities so performance tooling has a realistic workload to run against.
+Data is generated from a fixed random seed, so two databases seeded with the
+same arguments are identical.
+"""
+
+import os
+import random
+import sqlite3
+
+from . import database
+
+INDUSTRIES = ['Technology', 'Healthcare', 'Finance', 'Manufacturing', 'Retail',
+              'Education', 'Energy', 'Transportation', 'Media', 'Hospitality']
+STAGES = ['Discovery', 'Qualification', 'Negotiation', 'Closed Won', 'Closed Lost']
+
+FIRST_NAMES = ['James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda',
+               'William', 'Elizabeth', 'David', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica',
+               'Thomas', 'Sarah', 'Charles', 'Karen', 'Daniel', 'Nancy', 'Matthew', 'Lisa']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis',
+              'Rodriguez', 'Martinez', 'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson',
+              'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin', 'Lee', 'Perez', 'Thompson', 'White']
+COMPANY_WORDS = ['Acme', 'Globex', 'Initech', 'Umbrella', 'Stark', 'Wayne', 'Hooli', 'Vandelay',
+                 'Soylent', 'Cyberdyne', 'Tyrell', 'Wonka', 'Gringotts', 'Oscorp', 'Massive',
+                 'Dynamic', 'Pacific', 'Northern', 'Summit', 'Blue', 'Silver', 'Vertex']
+COMPANY_SUFFIXES = ['Inc', 'LLC', 'Corp', 'Group', 'Labs', 'Systems', 'Partners', 'Holdings']
+CITIES = [('Austin', 'TX'), ('Boston', 'MA'), ('Chicago', 'IL'), ('Denver', 'CO'),
+          ('Seattle', 'WA'), ('Portland', 'OR'), ('Atlanta', 'GA'), ('Phoenix', 'AZ')]
+
+def _seed_picklists(cursor):
+    """Insert the industry and stage picklists, returning their value IDs."""
+    picklist_ids = {}
+    for name, entity_type, values in (('industry', 'account', INDUSTRIES),
+                                      ('stage', 'opportunity', STAGES)):
+        cursor.execute(
+            "INSERT OR IGNORE INTO PicklistType (name, description, entity_type) VALUES (?, ?, ?)",
+            (name, name.capitalize(), entity_type)
+        )
+        cursor.execute("SELECT picklist_type_id FROM PicklistType WHERE name = ?", (name,))
+        type_id = cursor.fetchone()[0]
+        cursor.executemany(
+            "INSERT OR IGNORE INTO PicklistValue (picklist_type_id, value, display_order, is_default) VALUES (?, ?, ?, ?)",
+            [(type_id, value, order, order == 1) for order, value in enumerate(values, 1)]
+        )
+        cursor.execute("SELECT picklist_value_id FROM PicklistValue WHERE picklist_type_id = ?", (type_id,))
+        picklist_ids[name] = [row[0] for row in cursor.fetchall()]
+    return picklist_ids
+
+def seed_database(path, accounts=1000, contacts_per_account=5, opportunities_per_account=3, random_seed=42):
+    """
+    Create (or extend) the database at path with generated data.
+
+    Args:
+        path (str): Database file to seed; created with the current schema if missing
+        accounts (int): Number of accounts to generate
+        contacts_per_account (int): Contacts generated for each account
+        opportunities_per_account (int): Opportunities generated for each account
+        random_seed (int): Seed for the random generator, for reproducible data
+
+    Returns:
+        dict: Row counts inserted per table
+    """
+    previous_path = database.DATABASE_NAME
+    database.set_database_path(path)
+    try:
+        database.initialize_database()
+    finally:
+        database.set_database_path(previous_path)
+
+    rng = random.Random(random_seed)
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    try:
+        picklist_ids = _seed_picklists(cursor)
+        cursor.execute("SELECT COALESCE(MAX(account_id), 0), (SELECT COALESCE(MAX(contact_id), 0) FROM Contacts) FROM Accounts")
+        first_account_id, first_contact_id = cursor.fetchone()
+
+        account_rows = []
+        contact_rows = []
+        opportunity_rows = []
+        contact_id = first_contact_id
+        for offset in range(1, accounts + 1):
+            account_id = first_account_id + offset
+            company = f"{rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_SUFFIXES)}"
+            domain = f"{company.split()[0].lower()}{account_id}.example.com"
+            city, state = rng.choice(CITIES)
+            account_rows.append((
+                account_id, company, rng.choice(picklist_ids['industry']),
+                f"Generated account {account_id}", f"https://www.{domain}",
+                f"{rng.randint(1, 9999)} Main St", city, state, f"{rng.randint(10000, 99999)}", 'USA'
+            ))
+
+            account_contacts = []
+            for _ in range(contacts_per_account):
+                contact_id += 1
+                first = rng.choice(FIRST_NAMES)
+                last = rng.choice(LAST_NAMES)
+                account_contacts.append(contact_id)
+                contact_rows.append((
+                    contact_id, first, last, rng.choice(['CEO', 'CTO', 'VP Sales', 'Engineer', 'Buyer']),
+                    f"{first.lower()}.{last.lower()}.{contact_id}@{domain}",
+                    f"555-{rng.randint(1000, 9999)}", None, None, None, city, state, None, 'USA', account_id
+                ))
+
+            for number in range(1, opportunities_per_account + 1):
+                opportunity_rows.append((
+                    f"{company} deal {number}", f"Generated opportunity for {company}",
+                    round(rng.uniform(1000, 250000), 2),
+                    f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                    account_id, rng.choice(account_contacts) if account_contacts else None,
+                    rng.choice(picklist_ids['stage'])
+                ))
+
+        cursor.executemany(
+            """INSERT INTO Accounts (account_id, name, industry_id, description, website, street, city, state, zip, country)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", account_rows)
+        cursor.executemany(
+            """INSERT INTO Contacts (contact_id, first_name, last_name, title, email, phone, description, website,
+                                     street, city, state, zip, country, account_id)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", contact_rows)
+        cursor.executemany(
+            """INSERT INTO Opportunities (name, description, amount, close_date, account_id, contact_id, stage_id)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""", opportunity_rows)
+        conn.commit()
+        return {
+            'Accounts': len(account_rows),
+            'Contacts': len(contact_rows),
+            'Opportunities': len(opportunity_rows),
+        }
+    except sqlite3.Error as e:
+        print(f"Error seeding database: {e}")
+        conn.rollback()
+        return {}
+    finally:
+        cursor.close()
+        conn.close()
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Seed a CRM database with generated data")
+    parser.add_argument('path', nargs='?', default=database.DATABASE_NAME, help="Database file to seed")
+    parser.add_argument('--accounts', type=int, default=1000)
+    parser.add_argument('--contacts-per-account', type=int, default=5)
+    parser.add_argument('--opportunities-per-account', type=int, default=3)
+    parser.add_argument('--random-seed', type=int, default=42)
+    args = parser.parse_args()
+    os.makedirs(os.path.dirname(args.path) or '.', exist_ok=True)
+    counts = seed_database(args.path, args.accounts, args.contacts_per_account,
+                           args.opportunities_per_account, args.random_seed)
+    for table, count in counts.items():
+        print(f"Inserted {count} rows into {table}")
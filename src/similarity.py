@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+String Similarity for CRM Application
+
+Phonetic codes and fuzzy string scores shared by duplicate detection and
+fuzzy search:
+
+- soundex(): American Soundex, so "Smith" and "Smyth" get the same code.
+- jaro_winkler(): similarity between 0.0 and 1.0 that favours strings with a
+  common prefix, which suits names and typos in them.
+"""
+
+import unicodedata
+
+_SOUNDEX_CODES = {}
+for _letters, _digit in (('bfpv', '1'), ('cgjkqsxz', '2'), ('dt', '3'), ('l', '4'), ('mn', '5'), ('r', '6')):
+    for _letter in _letters:
+        _SOUNDEX_CODES[_letter] = _digit
+
+def fold(text):
+    """Lowercase text and strip accents ("José" -> "jose")."""
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+def soundex(text):
+    """
+    Return the four-character Soundex code of a word, or '' if it has no letters.
+    """
+    letters = [ch for ch in fold(text or '') if 'a' <= ch <= 'z']
+    if not letters:
+        return ''
+    code = letters[0].upper()
+    previous = _SOUNDEX_CODES.get(letters[0], '')
+    for letter in letters[1:]:
+        digit = _SOUNDEX_CODES.get(letter, '')
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        # 'h' and 'w' do not separate letters with the same code; vowels do
+        if letter not in 'hw':
+            previous = digit
+    return code.ljust(4, '0')
+
+def jaro(a, b):
+    """Return the Jaro similarity of two strings (1.0 means identical)."""
+    if a == b:
+        return 1.0
+    len_a, len_b = len(a), len(b)
+    if not len_a or not len_b:
+        return 0.0
+    match_distance = max(len_a, len_b) // 2 - 1
+    a_matched = [False] * len_a
+    b_matched = [False] * len_b
+    matches = 0
+    for i, ch in enumerate(a):
+        start = max(0, i - match_distance)
+        end = min(i + match_distance + 1, len_b)
+        for j in range(start, end):
+            if not b_matched[j] and b[j] == ch:
+                a_matched[i] = b_matched[j] = True
+                matches += 1
+                break
+    if not matches:
+        return 0.0
+    transpositions = 0
+    j = 0
+    for i in range(len_a):
+        if a_matched[i]:
+            while not b_matched[j]:
+                j += 1
+            if a[i] != b[j]:
+                transpositions += 1
+            j += 1
+    return (matches / len_a + matches / len_b + (matches - transpositions / 2) / matches) / 3
+
+def jaro_winkler(a, b, prefix_scale=0.1):
+    """
+    Return the Jaro-Winkler similarity of two strings, between 0.0 and 1.0.
+
+    Strings sharing a prefix (up to four characters) score higher than their
+    plain Jaro similarity.
+    """
+    similarity = jaro(a, b)
+    prefix = 0
+    for ch_a, ch_b in zip(a[:4], b[:4]):
+        if ch_a != ch_b:
+            break
+        prefix += 1
+    return similarity + prefix * prefix_scale * (1 - similarity)
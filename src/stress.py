@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Multi-Process Write Stress Test for CRM Application
+
+This script starts N processes that hammer create_contact and update_opportunity
+on the same database file at the same time, then checks that no write was lost:
+every create must have returned an ID and every update must have reported
+success, and the database must contain exactly what the workers wrote.
+
+A short busy timeout is used by default so that lock contention actually
+reaches the retry policy (see retry.py) instead of being absorbed by SQLite.
+
+Usage:
+    python -m src.stress --processes 8 --writes 200
+Exit status is 0 if no write was lost, 1 otherwise.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import multiprocessing
+
+from . import database
+from .seed import seed_database
+
+def _worker(args):
+    """Run one process's creates and updates. Returns its failures and contention counters."""
+    path, worker_number, writes, busy_timeout_ms = args
+    database.set_database_path(path)
+    database.BUSY_TIMEOUT_MS = busy_timeout_ms
+
+    from . import crm_dal
+    from .retry import get_contention_stats
+
+    failures = []
+    for i in range(writes):
+        email = f"stress.{worker_number}.{i}@example.com"
+        contact_id = crm_dal.create_contact("Stress", f"Worker{worker_number}", email, None, 1,
+                                            title=f"w{worker_number}-{i}")
+        if contact_id is None:
+            failures.append(f"create {email}")
+        # Each worker owns a disjoint set of opportunities, so the last write must win
+        opportunity_id = worker_number * writes + i + 1
+        if not crm_dal.update_opportunity(opportunity_id, amount=float(worker_number * 100000 + i)):
+            failures.append(f"update opportunity {opportunity_id}")
+    return worker_number, failures, get_contention_stats()
+
+def run_stress_test(processes=8, writes=200, busy_timeout_ms=20):
+    """
+    Run the stress test on a temporary seeded database.
+
+    Args:
+        processes (int): Number of concurrent writer processes
+        writes (int): Creates (and updates) performed by each process
+        busy_timeout_ms (int): Busy timeout of each worker's connections
+
+    Returns:
+        bool: True if no write was lost
+    """
+    import sqlite3
+
+    workdir = tempfile.mkdtemp(prefix='crm_stress_')
+    path = os.path.join(workdir, 'crm.db')
+    try:
+        # One opportunity per update, so every worker updates its own rows
+        accounts = max(1, (processes * writes + 2) // 3)
+        seed_database(path, accounts=accounts, contacts_per_account=0, opportunities_per_account=3)
+
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(_worker, [(path, n, writes, busy_timeout_ms) for n in range(processes)])
+
+        lost = []
+        totals = {'busy_errors': 0, 'retries': 0, 'wait_seconds': 0.0, 'gave_up': 0}
+        for worker_number, failures, stats in results:
+            lost.extend(failures)
+            for key in totals:
+                totals[key] += stats[key]
+
+        # Verify what actually reached the database
+        conn = sqlite3.connect(path)
+        try:
+            created = conn.execute("SELECT COUNT(*) FROM Contacts WHERE email LIKE 'stress.%'").fetchone()[0]
+            if created != processes * writes:
+                lost.append(f"expected {processes * writes} contacts, found {created}")
+            for worker_number in range(processes):
+                first = worker_number * writes + 1
+                rows = conn.execute(
+                    "SELECT opportunity_id, amount FROM Opportunities WHERE opportunity_id BETWEEN ? AND ?",
+                    (first, first + writes - 1)).fetchall()
+                for opportunity_id, amount in rows:
+                    expected = float(worker_number * 100000 + (opportunity_id - first))
+                    if amount != expected:
+                        lost.append(f"opportunity {opportunity_id} has amount {amount}, expected {expected}")
+        finally:
+            conn.close()
+
+        print(f"Processes          : {processes}")
+        print(f"Writes per process : {writes} creates + {writes} updates")
+        print(f"Busy/locked errors : {totals['busy_errors']}")
+        print(f"Retries            : {totals['retries']}")
+        print(f"Time in backoff    : {totals['wait_seconds']:.2f} s")
+        print(f"Gave up            : {totals['gave_up']}")
+        if lost:
+            print(f"FAILED: {len(lost)} lost writes, e.g. {lost[:5]}")
+            return False
+        print("PASSED: no writes lost")
+        return True
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Hammer the DAL from several processes and check no write is lost")
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--writes', type=int, default=200, help="Creates and updates per process")
+    parser.add_argument('--busy-timeout-ms', type=int, default=20,
+                        help="Busy timeout per connection; keep it small to exercise the retry policy")
+    args = parser.parse_args()
+    sys.exit(0 if run_stress_test(args.processes, args.writes, args.busy_timeout_ms) else 1)
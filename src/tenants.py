@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Multi-Tenant Storage for CRM Application
+
+Each tenant (business unit) has its own database file,
+TENANT_DIR/<tenant id>/crm.db, with its own backups and exports next to it.
+Small tenants then do not contend for one big file's write lock.
+
+- `python -m src.main --tenant ID` runs the CLI, batch mode or HTTP server
+  against one tenant's file.
+- TenantRouter serves many tenants from one process. It keeps at most
+  max_open connections open (least recently used ones are closed first), and
+  migrates each tenant's file the first time it is used. While a block
+  `with router.use(tenant_id):` runs, the DAL functions in crm_dal work on
+  that tenant's database.
+- consolidated_query() runs one read query against many tenants at once by
+  ATTACHing their files read-only, for reports across business units.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import quote
+
+from . import database
+
+TENANT_DIR = os.environ.get('CRM_TENANT_DIR', os.path.join('data', 'tenants'))
+
+# Tenant connections kept open by a TenantRouter
+MAX_OPEN_TENANTS = int(os.environ.get('CRM_TENANT_MAX_CONNECTIONS', 32))
+
+TENANT_DATABASE = 'crm.db'
+
+_TENANT_ID = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$')
+
+class TenantError(Exception):
+    """Invalid tenant id, or a tenant database that could not be opened or migrated."""
+
+def tenant_database_path(tenant_id, tenant_dir=None):
+    """Return the database file of a tenant. Raises TenantError for an invalid id."""
+    if not isinstance(tenant_id, str) or not _TENANT_ID.match(tenant_id):
+        raise TenantError(f"Invalid tenant id {tenant_id!r}: use up to 64 letters, digits, '-' or '_'")
+    return os.path.join(tenant_dir or TENANT_DIR, tenant_id, TENANT_DATABASE)
+
+def list_tenants(tenant_dir=None):
+    """Return the ids of the tenants that have a database file, sorted."""
+    tenant_dir = tenant_dir or TENANT_DIR
+    if not os.path.isdir(tenant_dir):
+        return []
+    return sorted(name for name in os.listdir(tenant_dir)
+                  if _TENANT_ID.match(name) and os.path.isfile(os.path.join(tenant_dir, name, TENANT_DATABASE)))
+
+def migrate_tenant(tenant_id, tenant_dir=None, show_progress=False):
+    """Create or migrate a tenant's database. Raises TenantError on failure."""
+    from .migrations import run_migrations
+    path = tenant_database_path(tenant_id, tenant_dir)
+    if not run_migrations(path, show_progress=show_progress):
+        raise TenantError(f"Migrating the database of tenant '{tenant_id}' failed")
+    return path
+
+def select_tenant(tenant_id):
+    """Point the whole process at one tenant's database (used by `main --tenant`)."""
+    database.set_database_path(tenant_database_path(tenant_id))
+
+class TenantRouter:
+    """
+    Hands out one connection per tenant, opening and migrating tenant databases
+    on first use and closing the least recently used ones beyond max_open.
+
+    A tenant's connection is used by one thread at a time: use() holds a
+    per-tenant lock, so different tenants are served in parallel while requests
+    for the same tenant queue up (as SQLite writers would anyway).
+    """
+
+    def __init__(self, tenant_dir=None, max_open=MAX_OPEN_TENANTS):
+        self.tenant_dir = tenant_dir or TENANT_DIR
+        self.max_open = max(1, max_open)
+        self._connections = OrderedDict()  # tenant id -> connection, least recently used first
+        self._locks = {}                   # tenant id -> lock held while the connection is in use
+        self._migrated = set()
+        self._lock = threading.Lock()
+        self.stats = {'opens': 0, 'hits': 0, 'evictions': 0}
+
+    def _tenant_lock(self, tenant_id):
+        with self._lock:
+            return self._locks.setdefault(tenant_id, threading.Lock())
+
+    def _connection(self, tenant_id):
+        """Return the open connection of a tenant, opening it if needed. Caller holds the tenant lock."""
+        with self._lock:
+            conn = self._connections.get(tenant_id)
+            if conn is not None:
+                self._connections.move_to_end(tenant_id)
+                self.stats['hits'] += 1
+                return conn
+        path = tenant_database_path(tenant_id, self.tenant_dir)
+        if tenant_id not in self._migrated:
+            migrate_tenant(tenant_id, self.tenant_dir)
+            self._migrated.add(tenant_id)
+        try:
+            conn = sqlite3.connect(path, timeout=database.BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        except sqlite3.Error as e:
+            raise TenantError(f"Could not open the database of tenant '{tenant_id}': {e}") from e
+        conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._connections[tenant_id] = conn
+            self.stats['opens'] += 1
+            self._evict()
+        return conn
+
+    def _evict(self):
+        """Close idle connections beyond max_open, least recently used first. Caller holds self._lock."""
+        for tenant_id in list(self._connections):
+            if len(self._connections) <= self.max_open:
+                break
+            lock = self._locks.get(tenant_id)
+            if lock is not None and not lock.acquire(blocking=False):
+                continue  # in use; it is closed by a later eviction
+            try:
+                self._connections.pop(tenant_id).close()
+                self.stats['evictions'] += 1
+            finally:
+                if lock is not None:
+                    lock.release()
+
+    @contextmanager
+    def use(self, tenant_id, defer_commit=False):
+        """
+        Bind a tenant's connection to the current thread for the block, so the
+        crm_dal functions read and write that tenant's database.
+
+        Yields:
+            SharedConnection: The bound connection (see database.bind_connection)
+        """
+        path = tenant_database_path(tenant_id, self.tenant_dir)
+        with self._tenant_lock(tenant_id):
+            conn = self._connection(tenant_id)
+            with database.bind_connection(conn, defer_commit, path=path) as shared:
+                try:
+                    yield shared
+                finally:
+                    if conn.in_transaction and not defer_commit:
+                        conn.rollback()
+        # Connections that were busy when the pool overflowed can be closed now
+        with self._lock:
+            self._evict()
+
+    def open_tenants(self):
+        """Return the ids of the tenants with an open connection, least recently used first."""
+        with self._lock:
+            return list(self._connections)
+
+    def close(self):
+        """Close every idle tenant connection."""
+        with self._lock:
+            for tenant_id in list(self._connections):
+                lock = self._locks.get(tenant_id)
+                if lock is not None and not lock.acquire(blocking=False):
+                    continue
+                try:
+                    self._connections.pop(tenant_id).close()
+                finally:
+                    if lock is not None:
+                        lock.release()
+
+# --- Cross-tenant reports ---
+
+def consolidated_query(sql, params=(), tenants=None, tenant_dir=None):
+    """
+    Run a read query against several tenants' databases and return all rows.
+
+    The query names tenant tables with a {db} prefix, e.g.
+    "SELECT COUNT(*) AS contacts FROM {db}.Contacts". Tenant files are ATTACHed
+    read-only to one connection, as many at a time as SQLite allows, and the
+    query runs once per tenant in a single UNION ALL, so each batch of tenants
+    is read in one consistent transaction.
+
+    Args:
+        sql (str): SELECT statement with {db} in place of the schema name
+        params (tuple): Parameters of sql (bound once per tenant)
+        tenants (list, optional): Tenant ids (default: all tenants)
+
+    Returns:
+        list: sqlite3.Row results, each with a leading tenant_id column; [] on error
+    """
+    tenant_dir = tenant_dir or TENANT_DIR
+    tenants = list_tenants(tenant_dir) if tenants is None else list(tenants)
+    if not tenants:
+        return []
+    conn = sqlite3.connect(':memory:', uri=True)
+    conn.row_factory = sqlite3.Row
+    try:
+        batch_size = max(1, conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED))
+        results = []
+        for start in range(0, len(tenants), batch_size):
+            batch = tenants[start:start + batch_size]
+            aliases = []
+            try:
+                for index, tenant_id in enumerate(batch):
+                    path = os.path.abspath(tenant_database_path(tenant_id, tenant_dir))
+                    if not os.path.exists(path):
+                        raise TenantError(f"Tenant '{tenant_id}' has no database")
+                    alias = f"tenant_{index}"
+                    conn.execute("ATTACH DATABASE ? AS " + alias, (f"file:{quote(path)}?mode=ro",))
+                    aliases.append(alias)
+                union = " UNION ALL ".join(
+                    f"SELECT ? AS tenant_id, * FROM ({sql.replace('{db}', alias)})" for alias in aliases
+                )
+                bound = [value for tenant_id in batch for value in (tenant_id, *params)]
+                results.extend(conn.execute(union, bound).fetchall())
+            finally:
+                for alias in aliases:
+                    conn.execute("DETACH DATABASE " + alias)
+        return results
+    except (sqlite3.Error, TenantError) as e:
+        print(f"Error running cross-tenant query: {e}")
+        return []
+    finally:
+        conn.close()
+
+_SUMMARY_SQL = """
+    SELECT (SELECT COUNT(*) FROM {db}.Accounts) AS accounts,
+           (SELECT COUNT(*) FROM {db}.Contacts) AS contacts,
+           (SELECT COUNT(*) FROM {db}.Opportunities) AS opportunities,
+           (SELECT COALESCE(SUM(amount), 0) FROM {db}.Opportunities) AS pipeline
+"""
+
+def tenant_summary(tenants=None, tenant_dir=None):
+    """Return per-tenant record counts and opportunity totals."""
+    return consolidated_query(_SUMMARY_SQL, tenants=tenants, tenant_dir=tenant_dir)
+
+def print_summary(rows):
+    print(f"{'Tenant':<24} {'Accounts':>10} {'Contacts':>10} {'Opportunities':>14} {'Pipeline':>16}")
+    totals = [0, 0, 0, 0.0]
+    for row in rows:
+        values = [row['accounts'], row['contacts'], row['opportunities'], row['pipeline']]
+        totals = [total + value for total, value in zip(totals, values)]
+        print(f"{row['tenant_id']:<24} {values[0]:>10,} {values[1]:>10,} {values[2]:>14,} {values[3]:>16,.2f}")
+    if len(rows) > 1:
+        print(f"{'All tenants':<24} {totals[0]:>10,} {totals[1]:>10,} {totals[2]:>14,} {totals[3]:>16,.2f}")
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+    parser = argparse.ArgumentParser(description="Manage per-tenant CRM databases")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list', help="List tenants")
+    create_parser = subparsers.add_parser('create', help="Create (or migrate) a tenant database")
+    create_parser.add_argument('tenant_id')
+    summary_parser = subparsers.add_parser('summary', help="Record counts and pipeline of every tenant")
+    summary_parser.add_argument('tenants', nargs='*', help="Tenant ids (default: all)")
+    query_parser = subparsers.add_parser('query', help="Run a read query on every tenant, e.g. "
+                                                       "\"SELECT COUNT(*) AS n FROM {db}.Contacts\"")
+    query_parser.add_argument('sql')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'list':
+            for tenant_id in list_tenants():
+                print(tenant_id)
+        elif args.command == 'create':
+            print(f"Tenant database ready: {migrate_tenant(args.tenant_id, show_progress=True)}")
+        elif args.command == 'summary':
+            print_summary(tenant_summary(args.tenants or None))
+        else:
+            for row in consolidated_query(args.sql):
+                print(dict(row))
+    except TenantError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Timestamp Formatting for CRM Application
+
+created_at is stored as UTC text ('YYYY-MM-DD HH:MM:SS'), with an integer
+created_epoch generated column next to it (and close_epoch for
+Opportunities.close_date), see migrations.py. Those integer columns are indexed,
+so date-range filters and sorts do not have to parse text.
+
+LocalTimeFormatter turns UTC timestamps into local-time display strings without
+strptime or astimezone per value: the local UTC offset is cached together
+with the interval it holds for (from one DST change to the next), so a list or
+export of many rows pays for the time zone lookups once per DST period it
+spans.
+"""
+
+import calendar
+import time
+from datetime import datetime, timezone
+
+DISPLAY_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Offset intervals kept per formatter (each one usually covers half a year)
+OFFSET_CACHE_SIZE = 8
+
+# How far an offset interval is followed before it is cut off, in days; zones
+# without DST get one interval of this length per lookup
+OFFSET_SEARCH_DAYS = 400
+
+def _offset_at(epoch):
+    """Local UTC offset, in seconds, at an epoch time."""
+    return int(datetime.fromtimestamp(epoch, timezone.utc).astimezone().utcoffset().total_seconds())
+
+def _offset_change(same, changed, offset):
+    """The epoch between same (has offset) and changed (does not) where the offset changes."""
+    while abs(changed - same) > 1:
+        middle = (same + changed) // 2
+        if _offset_at(middle) == offset:
+            same = middle
+        else:
+            changed = middle
+    return same, changed
+
+class LocalTimeFormatter:
+    """Formats UTC timestamps (epoch seconds or text) as local time."""
+
+    def __init__(self, display_format=DISPLAY_FORMAT):
+        self.display_format = display_format
+        # (start, end, offset): the offset holds for epochs in [start, end); most recently used first
+        self._offsets = []
+
+    def utc_offset(self, epoch):
+        """Return the local UTC offset, in seconds, in effect at an epoch time."""
+        for index, (start, end, offset) in enumerate(self._offsets):
+            if start <= epoch < end:
+                if index:
+                    self._offsets.insert(0, self._offsets.pop(index))
+                return offset
+        interval = self._offset_interval(epoch)
+        self._offsets.insert(0, interval)
+        del self._offsets[OFFSET_CACHE_SIZE:]
+        return interval[2]
+
+    @staticmethod
+    def _offset_interval(epoch):
+        """
+        Return (start, end, offset) of the interval around epoch with one offset,
+        found by stepping a day at a time to the nearest offset change on each
+        side (no zone changes offset twice within a day) and bisecting to the second.
+        """
+        offset = _offset_at(epoch)
+        bounds = []
+        for direction in (-1, 1):
+            probe = epoch
+            for _ in range(OFFSET_SEARCH_DAYS):
+                step = probe + direction * 86400
+                if _offset_at(step) != offset:
+                    same, changed = _offset_change(probe, step, offset)
+                    bounds.append(same if direction < 0 else changed)
+                    break
+                probe = step
+            else:
+                bounds.append(probe if direction < 0 else probe + 1)
+        return bounds[0], bounds[1], offset
+
+    def format_epoch(self, epoch):
+        """Format epoch seconds (UTC) as local time, or 'N/A' for None."""
+        if epoch is None:
+            return "N/A"
+        return time.strftime(self.display_format, time.gmtime(epoch + self.utc_offset(epoch)))
+
+    def format_text(self, utc_text):
+        """
+        Format a UTC 'YYYY-MM-DD HH:MM:SS[.ffffff]' string as local time.
+        Text that does not parse is returned unchanged; empty values become 'N/A'.
+        """
+        if not utc_text:
+            return "N/A"
+        epoch = parse_utc(utc_text) if len(utc_text) > 10 else None
+        return utc_text if epoch is None else self.format_epoch(epoch)
+
+    def format(self, value):
+        """Format an epoch (int) or UTC text value."""
+        if isinstance(value, (int, float)):
+            return self.format_epoch(int(value))
+        return self.format_text(value)
+
+    def format_many(self, values):
+        """Format a sequence of epoch or text values."""
+        return [self.format(value) for value in values]
+
+def parse_utc(utc_text):
+    """Return the epoch seconds of a UTC 'YYYY-MM-DD[ HH:MM:SS[.ffffff]]' string, or None."""
+    try:
+        parsed = datetime.fromisoformat(utc_text)
+    except (TypeError, ValueError):
+        return None
+    return calendar.timegm(parsed.utctimetuple()) if parsed.tzinfo else calendar.timegm(parsed.timetuple())
+
+# Shared by the CLI for the life of the process
+local_time = LocalTimeFormatter()
+
+def format_created_at(row):
+    """Local-time display of a row's creation time, preferring the created_epoch column."""
+    keys = row.keys()
+    if 'created_epoch' in keys and row['created_epoch'] is not None:
+        return local_time.format_epoch(row['created_epoch'])
+    return local_time.format_text(row['created_at'] if 'created_at' in keys else None)
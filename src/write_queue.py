@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Group-Commit Write Queue for CRM Application
+
+When many threads write at once, committing every DAL call separately makes
+them fight over the database lock, and the losers see "database is locked".
+This module funnels writes through a single writer thread instead: it drains
+a queue of mutations and commits them in small groups, one transaction per
+group.
+
+Every submitted write returns a concurrent.futures.Future that resolves to a
+WriteResult holding the real lastrowid and rowcount, or raises the real
+sqlite3 error for that write. A failing write is rolled back on its own
+(via a savepoint) without affecting the rest of its group. Once a group is
+committed, the entity cache and the crm_dal write listeners (such as the
+completion indexes) are told about every row it changed, as the DAL functions
+do. AsyncCRM and the HTTP API send their writes through this queue.
+
+Usage:
+    with WriteQueue() as writes:
+        future = writes.create_contact("Ada", "Lovelace", "ada@example.com", None, 1)
+        contact_id = future.result().lastrowid
+"""
+
+import queue
+import sqlite3
+import threading
+from collections import namedtuple
+from concurrent.futures import Future
+
+from . import crm_dal
+from . import database
+from .retry import run_with_retry
+
+WriteResult = namedtuple('WriteResult', ['lastrowid', 'rowcount'])
+
+# Sentinel put on the queue to stop the writer thread
+_STOP = object()
+
+class WriteQueue:
+    """
+    Single writer thread that commits queued mutations in groups.
+
+    Args:
+        database_path (str, optional): Database file; defaults to database.DATABASE_NAME
+        max_group_size (int): Most writes committed in one transaction
+        max_group_delay (float): Seconds the writer waits for more writes to join a group
+        busy_timeout_ms (int, optional): How long the writer waits for other processes' locks;
+                                         defaults to database.BUSY_TIMEOUT_MS
+    """
+
+    def __init__(self, database_path=None, max_group_size=64, max_group_delay=0.002, busy_timeout_ms=None):
+        self.database_path = database_path or database.DATABASE_NAME
+        self.max_group_size = max_group_size
+        self.max_group_delay = max_group_delay
+        self.busy_timeout_ms = busy_timeout_ms if busy_timeout_ms is not None else database.BUSY_TIMEOUT_MS
+        self._queue = queue.Queue()
+        self._thread = None
+        # Simple counters, useful for checking how well writes are being grouped
+        self.groups_committed = 0
+        self.writes_committed = 0
+        self.writes_failed = 0
+
+    # --- Lifecycle ---
+    def start(self):
+        """Start the writer thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='crm-group-writer', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Commit everything already queued, then stop the writer thread."""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    # --- Submitting writes ---
+    def submit(self, sql, params=(), table=None, action=None, key=None):
+        """
+        Queue one write statement.
+
+        Args:
+            sql (str): The statement
+            params (tuple): Its parameters
+            table (str, optional): Table the statement writes; if given, the cache and
+                                   write listeners are notified once it is committed
+            action (str, optional): 'create', 'update' or 'delete'
+            key (int, optional): ID of the row written; for creates, the new lastrowid is used
+
+        Returns:
+            Future: Resolves to a WriteResult, or raises the sqlite3 error for this write
+        """
+        if self._thread is None:
+            raise RuntimeError("WriteQueue is not started; use 'with WriteQueue()' or call start()")
+        future = Future()
+        self._queue.put((sql, params, future, (table, action, key)))
+        return future
+
+    def _submit_statement(self, statement, table, action, key=None):
+        if statement is None:
+            # Nothing to update; resolve immediately like the DAL returning False
+            future = Future()
+            future.set_result(WriteResult(None, 0))
+            return future
+        return self.submit(*statement, table=table, action=action, key=key)
+
+    def create_account(self, *args, **kwargs):
+        return self._submit_statement(crm_dal.build_account_insert(*args, **kwargs), 'Accounts', 'create')
+
+    def update_account(self, account_id, **kwargs):
+        return self._submit_statement(crm_dal.build_account_update(account_id, **kwargs),
+                                      'Accounts', 'update', account_id)
+
+    def delete_account(self, account_id):
+        return self._submit_statement(crm_dal.build_account_delete(account_id), 'Accounts', 'delete', account_id)
+
+    def create_contact(self, *args, **kwargs):
+        return self._submit_statement(crm_dal.build_contact_insert(*args, **kwargs), 'Contacts', 'create')
+
+    def update_contact(self, contact_id, **kwargs):
+        return self._submit_statement(crm_dal.build_contact_update(contact_id, **kwargs),
+                                      'Contacts', 'update', contact_id)
+
+    def delete_contact(self, contact_id):
+        return self._submit_statement(crm_dal.build_contact_delete(contact_id), 'Contacts', 'delete', contact_id)
+
+    def create_opportunity(self, *args, **kwargs):
+        return self._submit_statement(crm_dal.build_opportunity_insert(*args, **kwargs), 'Opportunities', 'create')
+
+    def update_opportunity(self, opportunity_id, **kwargs):
+        return self._submit_statement(crm_dal.build_opportunity_update(opportunity_id, **kwargs),
+                                      'Opportunities', 'update', opportunity_id)
+
+    def delete_opportunity(self, opportunity_id):
+        return self._submit_statement(crm_dal.build_opportunity_delete(opportunity_id),
+                                      'Opportunities', 'delete', opportunity_id)
+
+    # --- Writer thread ---
+    def _next_group(self):
+        """Block for the first write, then gather more for up to max_group_delay."""
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        group = [first]
+        stopping = False
+        while len(group) < self.max_group_size:
+            try:
+                item = self._queue.get(timeout=self.max_group_delay)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                stopping = True
+                break
+            group.append(item)
+        return group, stopping
+
+    def _commit_group(self, conn, group):
+        """Run a group of writes in one transaction and resolve their futures."""
+        # Skip writes whose callers cancelled them while they were queued
+        group = [item for item in group if item[2].set_running_or_notify_cancel()]
+        if not group:
+            return
+
+        outcomes = []
+        try:
+            # Taking the write lock is safe to retry if another process holds it
+            run_with_retry(lambda: conn.execute("BEGIN IMMEDIATE"))
+            for sql, params, future, change in group:
+                conn.execute("SAVEPOINT queued_write")
+                try:
+                    cursor = conn.execute(sql, params)
+                    outcomes.append((future, change, WriteResult(cursor.lastrowid, cursor.rowcount)))
+                    conn.execute("RELEASE queued_write")
+                except sqlite3.Error as e:
+                    conn.execute("ROLLBACK TO queued_write")
+                    conn.execute("RELEASE queued_write")
+                    outcomes.append((future, change, e))
+            # A busy COMMIT leaves the transaction open, so it can be retried too
+            run_with_retry(lambda: conn.execute("COMMIT"))
+        except sqlite3.Error as e:
+            # The group as a whole failed (e.g. the lock could not be taken); fail every write in it
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for sql, params, future, change in group:
+                future.set_exception(e)
+            self.writes_failed += len(group)
+            return
+
+        # Only report success once the group is durably committed
+        self.groups_committed += 1
+        for future, change, outcome in outcomes:
+            if isinstance(outcome, Exception):
+                self.writes_failed += 1
+                future.set_exception(outcome)
+                continue
+            self.writes_committed += 1
+            table, action, key = change
+            if table is not None and outcome.rowcount > 0:
+                crm_dal.after_queued_write(table, outcome.lastrowid if action == 'create' else key, action)
+            future.set_result(outcome)
+
+    def _run(self):
+        conn = sqlite3.connect(self.database_path, isolation_level=None)
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        # Write listeners that read the changed row back do so on this connection
+        database.bind_thread_connection(conn, path=self.database_path)
+        try:
+            stopping = False
+            while not stopping:
+                group, stopping = self._next_group()
+                if group:
+                    self._commit_group(conn, group)
+            # Drain anything queued after the stop request was seen
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not _STOP:
+                    self._commit_group(conn, [item])
+        finally:
+            conn.close()